@@ -0,0 +1,251 @@
+"""
+Conversation-aware prompting for logged-in users.
+
+Each session's context is a window of its most recent turns, bounded by
+CONTEXT_HISTORY_TOKEN_BUDGET, plus a rolling summary of everything older
+(bounded by CONTEXT_SUMMARY_MAX_TOKENS), so the prompt stops growing with the
+conversation. Turns that fall out of the window are folded into the summary by
+a background model call; until it completes they are simply left out.
+
+Contexts are cached per process. On a cache hit only turns stored since the
+last one seen (e.g. by another worker) are read from MongoDB; the full history
+is only read, up to CONTEXT_MAX_LOADED_TURNS, when a session is not cached.
+
+Token counts here are estimates (about 4 characters per token); the counts
+reported to clients come from the model's usage metadata.
+"""
+import asyncio
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Set, Tuple
+
+import xxhash
+from bson import ObjectId
+from cachetools import TTLCache
+
+from app.core.config import settings
+from app.core.metrics import registry
+from app.database.repositories import conversations
+
+if TYPE_CHECKING:
+    from google.genai.types import Content, GenerateContentConfig
+
+_CONTEXT_PROJECTION = {"user_input_text": 1, "ai_response_text": 1, "image_url": 1, "timestamp": 1}
+
+_cache_hits = registry.counter("context_cache_hits_total", "Conversation contexts served from the per-session cache.")
+_cache_misses = registry.counter("context_cache_misses_total", "Conversation contexts rebuilt from MongoDB.")
+_summaries = registry.counter("context_summaries_total", "Rolling summary updates, by outcome.")
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (Gemini averages about 4 characters per token)."""
+    return len(text) // 4 + 1
+
+
+@dataclass
+class Turn:
+    user_text: str
+    ai_text: str
+    tokens: int
+
+
+@dataclass
+class SessionContext:
+    """Rolling summary + recent turns (oldest first) of one session."""
+    user_id: str
+    summary: str = ""
+    turns: List[Turn] = field(default_factory=list)
+    # Newest stored turn reflected here, as (timestamp, _id): the start of the next delta read
+    last_seen: Optional[Tuple[datetime, ObjectId]] = None
+    # Turns evicted from the window and waiting to be folded into the summary
+    pending_fold: List[Turn] = field(default_factory=list)
+    folding: bool = False
+
+    @property
+    def window_tokens(self) -> int:
+        return sum(turn.tokens for turn in self.turns)
+
+    @property
+    def is_empty(self) -> bool:
+        return not self.summary and not self.turns
+
+    def digest(self) -> str:
+        """Content hash of the summary and window (part of the response cache key)."""
+        h = xxhash.xxh3_64(self.summary.encode("utf-8"))
+        for turn in self.turns:
+            h.update(b"\0" + turn.user_text.encode("utf-8") + b"\0" + turn.ai_text.encode("utf-8"))
+        return h.hexdigest()
+
+    def history_contents(self) -> List["Content"]:
+        """The window as alternating user/model Contents, oldest first."""
+        from google.genai.types import Content, Part
+        contents = []
+        for turn in self.turns:
+            contents.append(Content(role="user", parts=[Part.from_text(text=turn.user_text)]))
+            contents.append(Content(role="model", parts=[Part.from_text(text=turn.ai_text)]))
+        return contents
+
+    def generate_config(self) -> Optional["GenerateContentConfig"]:
+        """Model config carrying the rolling summary as a system instruction (None without a summary)."""
+        if not self.summary:
+            return None
+        from google.genai.types import GenerateContentConfig
+        return GenerateContentConfig(
+            system_instruction=f"Summary of the earlier part of this conversation:\n{self.summary}"
+        )
+
+    def prompt_token_estimate(self) -> int:
+        return (estimate_tokens(self.summary) if self.summary else 0) + self.window_tokens
+
+
+# session_id -> SessionContext
+_contexts: TTLCache = TTLCache(maxsize=settings.CONTEXT_CACHE_MAX_SESSIONS, ttl=settings.CONTEXT_CACHE_TTL_SECONDS)
+# Background summary tasks (referenced so they are not garbage-collected mid-flight)
+_fold_tasks: Set["asyncio.Task[None]"] = set()
+
+
+def _make_turn(user_text: str, ai_text: str, has_image: bool = False) -> Turn:
+    user_text = user_text.strip()
+    if has_image:
+        user_text = f"[sent an image] {user_text}".strip()
+    return Turn(user_text=user_text, ai_text=ai_text, tokens=estimate_tokens(user_text) + estimate_tokens(ai_text))
+
+
+def _millisecond_precision(timestamp: datetime) -> datetime:
+    # MongoDB stores datetimes with millisecond precision
+    return timestamp.replace(microsecond=timestamp.microsecond // 1000 * 1000)
+
+
+def _append(context: SessionContext, docs: List[Dict[str, Any]]) -> None:
+    """Adds stored turns (oldest first) to the window."""
+    for doc in docs:
+        context.turns.append(_make_turn(doc.get("user_input_text", ""), doc.get("ai_response_text", ""), bool(doc.get("image_url"))))
+    if docs:
+        context.last_seen = (docs[-1]["timestamp"], docs[-1]["_id"])
+
+
+async def load_context(session_id: str, user_id: str) -> SessionContext:
+    """
+    Returns the session's context, brought up to date with MongoDB.
+
+    Cached contexts only read turns stored after `last_seen`; uncached ones
+    read the latest CONTEXT_MAX_LOADED_TURNS turns.
+    """
+    context = _contexts.get(session_id)
+    if context is not None:
+        _cache_hits.inc()
+        if context.last_seen is not None:
+            docs, _ = await conversations.page_for_user(
+                user_id, settings.CONTEXT_MAX_LOADED_TURNS, after=context.last_seen, projection=_CONTEXT_PROJECTION
+            )
+            _append(context, list(reversed(docs)))
+    else:
+        _cache_misses.inc()
+        context = SessionContext(user_id=user_id)
+        docs = await conversations.recent_for_user(user_id, settings.CONTEXT_MAX_LOADED_TURNS, projection=_CONTEXT_PROJECTION)
+        _append(context, list(reversed(docs)))
+        _contexts[session_id] = context
+
+    _enforce_budget(context)
+    return context
+
+
+def record_turn(
+    session_id: str,
+    context: SessionContext,
+    user_text: str,
+    ai_text: str,
+    has_image: bool = False,
+    turn_id: Optional[str] = None,
+    timestamp: Optional[datetime] = None,
+) -> None:
+    """
+    Appends the turn just answered to the session's context.
+
+    Pass the stored turn's id and timestamp so the next delta read starts after it.
+    """
+    context.turns.append(_make_turn(user_text, ai_text, has_image))
+    if turn_id is not None and timestamp is not None:
+        context.last_seen = (_millisecond_precision(timestamp), ObjectId(turn_id))
+    _contexts[session_id] = context
+    _enforce_budget(context)
+
+
+def _enforce_budget(context: SessionContext) -> None:
+    """Moves the oldest turns out of the window until it fits the budget, and schedules a summary update."""
+    while len(context.turns) > 1 and context.window_tokens > settings.CONTEXT_HISTORY_TOKEN_BUDGET:
+        context.pending_fold.append(context.turns.pop(0))
+    if context.turns and context.window_tokens > settings.CONTEXT_HISTORY_TOKEN_BUDGET:
+        # A single oversized turn: keep its tail only
+        turn = context.turns[0]
+        keep = settings.CONTEXT_HISTORY_TOKEN_BUDGET * 4
+        context.turns[0] = Turn(turn.user_text[-keep // 2:], turn.ai_text[-keep // 2:], settings.CONTEXT_HISTORY_TOKEN_BUDGET)
+
+    if context.pending_fold and not context.folding:
+        context.folding = True
+        try:
+            task = asyncio.get_running_loop().create_task(_fold_pending(context))
+        except RuntimeError:  # No running loop (offline use): fold extractively right away
+            context.summary = _extractive_summary(context.summary, context.pending_fold)
+            context.pending_fold = []
+            context.folding = False
+            return
+        _fold_tasks.add(task)
+        task.add_done_callback(_fold_tasks.discard)
+
+
+def _render_turns(turns: List[Turn]) -> str:
+    return "\n".join(f"User: {turn.user_text}\nAssistant: {turn.ai_text}" for turn in turns)
+
+
+def _trim_summary(summary: str) -> str:
+    limit = settings.CONTEXT_SUMMARY_MAX_TOKENS * 4
+    return summary if len(summary) <= limit else summary[-limit:]
+
+
+def _extractive_summary(summary: str, turns: List[Turn]) -> str:
+    """Fallback when the model is unavailable: keep the beginning of each folded turn."""
+    lines = [f"- User: {turn.user_text[:200]} / Assistant: {turn.ai_text[:200]}" for turn in turns]
+    return _trim_summary("\n".join(filter(None, [summary, *lines])))
+
+
+async def _fold_pending(context: SessionContext) -> None:
+    """Folds `pending_fold` turns into the rolling summary with one model call."""
+    # Imported here: multimodal_agent imports this module
+    from app.agents.model_router import model_router
+    from app.agents.multimodal_agent import generate_content
+    from google.genai.types import GenerateContentConfig
+
+    try:
+        while context.pending_fold:
+            turns, context.pending_fold = context.pending_fold, []
+            prompt = (
+                "Update the running summary of a conversation between a user and an AI assistant. "
+                "Keep names, facts, decisions and open questions; drop small talk. "
+                f"Answer with the updated summary only, at most {settings.CONTEXT_SUMMARY_MAX_TOKENS * 3 // 4} words.\n\n"
+                f"Current summary:\n{context.summary or '(none)'}\n\nNew turns:\n{_render_turns(turns)}"
+            )
+            config = GenerateContentConfig(max_output_tokens=settings.CONTEXT_SUMMARY_MAX_TOKENS)
+            try:
+                response, _ = await model_router.call(
+                    model_router.candidates(prompt_tokens=estimate_tokens(prompt)),
+                    lambda model: generate_content(model=model, contents=[prompt], config=config),
+                )
+                context.summary = _trim_summary(response.text or "")
+                _summaries.inc(outcome="model")
+            except Exception as e:
+                print(f"Context summary failed, keeping an extractive summary: {e}")
+                context.summary = _extractive_summary(context.summary, turns)
+                _summaries.inc(outcome="extractive")
+    finally:
+        context.folding = False
+
+
+def invalidate(session_id: str) -> None:
+    """Drops the cached context of one session."""
+    _contexts.pop(session_id, None)
+
+
+def clear() -> None:
+    """Empties the context cache."""
+    _contexts.clear()
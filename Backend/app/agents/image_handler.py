@@ -1,37 +1,78 @@
-import cloudinary
-import cloudinary.uploader
-from fastapi import UploadFile
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from app.core.config import settings
-from typing import IO
+from typing import Callable, Optional
 
-# Configure Cloudinary
-cloudinary.config(
-    cloud_name=settings.CLOUDINARY_CLOUD_NAME,
-    api_key=settings.CLOUDINARY_API_KEY,
-    api_secret=settings.CLOUDINARY_API_SECRET
-)
+# The Cloudinary SDK is imported and configured on the first upload, not at startup
+_cloudinary_lock = threading.Lock()
+_cloudinary_uploader = None
 
-async def upload_image_to_cloudinary(file: UploadFile) -> str:
+
+def _get_cloudinary_uploader():
+    global _cloudinary_uploader
+    with _cloudinary_lock:
+        if _cloudinary_uploader is None:
+            import cloudinary
+            import cloudinary.uploader
+
+            # Configure Cloudinary
+            cloudinary.config(
+                cloud_name=settings.CLOUDINARY_CLOUD_NAME,
+                api_key=settings.CLOUDINARY_API_KEY,
+                api_secret=settings.CLOUDINARY_API_SECRET,
+                **({"upload_prefix": settings.CLOUDINARY_UPLOAD_PREFIX} if settings.CLOUDINARY_UPLOAD_PREFIX else {})
+            )
+            _cloudinary_uploader = cloudinary.uploader
+    return _cloudinary_uploader
+
+# The Cloudinary SDK is blocking, so uploads run on their own small thread pool
+_upload_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _get_upload_executor() -> ThreadPoolExecutor:
+    global _upload_executor
+    if _upload_executor is None:
+        _upload_executor = ThreadPoolExecutor(
+            max_workers=settings.IMAGE_UPLOAD_WORKERS, thread_name_prefix="cloudinary-upload"
+        )
+    return _upload_executor
+
+
+def _cloudinary_upload(file_content: bytes) -> dict:
+    """Blocking Cloudinary upload of raw image bytes; returns the SDK's result dict."""
+    return _get_cloudinary_uploader().upload(
+        file=file_content,
+        folder="ai_agent_uploads", # Optional: Organize uploads in a folder
+        resource_type="image"
+    )
+
+
+# Callable(bytes) -> dict with a "secure_url" key. Swappable for local stand-ins.
+_uploader: Callable[[bytes], dict] = _cloudinary_upload
+
+
+def set_image_uploader(uploader: Optional[Callable[[bytes], dict]]) -> None:
+    """Replaces the blocking upload function (None restores the Cloudinary uploader)."""
+    global _uploader
+    _uploader = uploader or _cloudinary_upload
+
+
+async def upload_image_to_cloudinary(image_bytes: bytes) -> str:
     """
-    Uploads the image file to Cloudinary and returns the secure URL.
-    
+    Uploads the image bytes to Cloudinary and returns the secure URL.
+
+    The blocking SDK call runs on a worker thread, so the event loop (and a
+    concurrently running model call) keeps making progress during the upload.
+
     Args:
-        file: The UploadFile object from the FastAPI request.
-        
+        image_bytes: The image content, as read once by the ingestion stage.
+
     Returns:
         The secure URL of the uploaded image.
     """
-    
-    # Read file content into memory stream (Cloudinary SDK expects a stream/path)
-    # Note: For very large files, this should be chunked, but this works for typical uploads.
-    file_content = await file.read()
-    
-    # Use cloudinary.uploader.upload_resource to upload the raw binary data
-    upload_result = cloudinary.uploader.upload(
-        file=file_content,
-        folder="ai_agent_uploads", # Optional: Organize uploads in a folder
-        resource_type="image"
-    )
-    
+    loop = asyncio.get_running_loop()
+    upload_result = await loop.run_in_executor(_get_upload_executor(), _uploader, image_bytes)
+
     # Return the secure URL provided by Cloudinary
-    return upload_result.get("secure_url")
\ No newline at end of file
+    return upload_result.get("secure_url")
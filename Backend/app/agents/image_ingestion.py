@@ -0,0 +1,113 @@
+import filetype
+from dataclasses import dataclass
+from fastapi import UploadFile
+from typing import List
+
+from app.core.config import settings
+
+# Image formats accepted by Gemini; anything else is rejected before it reaches the model
+SUPPORTED_IMAGE_MIME_TYPES = {"image/jpeg", "image/png", "image/webp", "image/heic", "image/heif"}
+
+# filetype only needs the first few hundred bytes to identify a format
+_SNIFF_BYTES = 261
+
+
+class ImageTooLargeError(ValueError):
+    """The upload exceeds MAX_IMAGE_UPLOAD_BYTES."""
+
+
+class UnsupportedImageError(ValueError):
+    """The upload is not an image format the model accepts."""
+
+
+@dataclass(frozen=True)
+class IngestedImage:
+    """
+    An uploaded image read exactly once.
+
+    `data` is the single in-memory copy of the file; the model request and the
+    uploader both receive this same object, so no further copies are made.
+    """
+    data: bytes
+    mime_type: str
+    filename: str
+
+    @property
+    def size(self) -> int:
+        return len(self.data)
+
+
+async def _read_capped(file: UploadFile, max_bytes: int) -> bytes:
+    """Reads a stream of unknown length in chunks, stopping as soon as it passes the cap."""
+    chunks: List[bytes] = []
+    total = 0
+    while True:
+        chunk = await file.read(settings.IMAGE_READ_CHUNK_BYTES)
+        if not chunk:
+            break
+        total += len(chunk)
+        if total > max_bytes:
+            raise ImageTooLargeError(f"Image exceeds the limit of {max_bytes} bytes.")
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+async def ingest_image_upload(file: UploadFile) -> IngestedImage:
+    """
+    Reads an uploaded image exactly once, enforcing the size cap on the file itself.
+
+    By now the multipart body has been received and spooled; oversized requests
+    are rejected earlier, before their body is read, by ChatAdmissionMiddleware
+    (see app/core/rate_limit.py). This check catches an image over the limit in
+    a request that fits the whole-body cap.
+
+    The MIME type is sniffed from the file's magic bytes; the client-supplied
+    `content_type` is ignored.
+
+    Args:
+        file: The UploadFile object from the FastAPI request.
+
+    Returns:
+        The ingested image.
+
+    Raises:
+        ImageTooLargeError: The file is larger than MAX_IMAGE_UPLOAD_BYTES.
+        UnsupportedImageError: The file is not a supported image format.
+    """
+    max_bytes = settings.MAX_IMAGE_UPLOAD_BYTES
+
+    if file.size is not None:
+        # The multipart parser already knows the size: reject without reading the spooled file,
+        # otherwise a single exact-size read is the only allocation
+        if file.size > max_bytes:
+            raise ImageTooLargeError(f"Image is {file.size} bytes; the limit is {max_bytes} bytes.")
+        data = await file.read(file.size + 1)
+        if len(data) > max_bytes:
+            raise ImageTooLargeError(f"Image exceeds the limit of {max_bytes} bytes.")
+    else:
+        data = await _read_capped(file, max_bytes)
+
+    return IngestedImage(data=data, mime_type=_sniff_mime_type(data), filename=file.filename or "")
+
+
+def ingest_image_bytes(data: bytes, filename: str = "") -> IngestedImage:
+    """
+    Checks an image received in one piece (a WebSocket binary frame) like an upload.
+
+    Raises:
+        ImageTooLargeError: The image is larger than MAX_IMAGE_UPLOAD_BYTES.
+        UnsupportedImageError: The image is not a supported format.
+    """
+    if len(data) > settings.MAX_IMAGE_UPLOAD_BYTES:
+        raise ImageTooLargeError(f"Image is {len(data)} bytes; the limit is {settings.MAX_IMAGE_UPLOAD_BYTES} bytes.")
+    return IngestedImage(data=data, mime_type=_sniff_mime_type(data), filename=filename)
+
+
+def _sniff_mime_type(data: bytes) -> str:
+    kind = filetype.guess(data[:_SNIFF_BYTES])
+    if kind is None or kind.mime not in SUPPORTED_IMAGE_MIME_TYPES:
+        detected = kind.mime if kind else "unknown"
+        raise UnsupportedImageError(
+            f"Unsupported image type ({detected}). Supported: {', '.join(sorted(SUPPORTED_IMAGE_MIME_TYPES))}."
+        )
+    return kind.mime
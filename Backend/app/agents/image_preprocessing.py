@@ -0,0 +1,145 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from io import BytesIO
+from typing import Optional
+
+from PIL import Image, ImageOps
+
+from app.core.config import settings
+from app.core.metrics import registry
+
+# Pillow releases the GIL while decoding, resizing and encoding, so threads scale here
+_preprocess_executor: Optional[ThreadPoolExecutor] = None
+
+_bytes_in = registry.counter("image_preprocess_bytes_in_total", "Image bytes received before preprocessing.")
+_bytes_out = registry.counter("image_preprocess_bytes_out_total", "Image bytes sent to the model after preprocessing.")
+_duration = registry.histogram("image_preprocess_seconds", "Time spent downscaling and re-encoding images.")
+_images = registry.counter(
+    "image_preprocess_images_total", "Images preprocessed, by outcome (resized, reencoded, kept, skipped)."
+)
+
+_OUTPUT_MIME_TYPES = {"WEBP": "image/webp", "JPEG": "image/jpeg", "PNG": "image/png"}
+# Sources whose pixels are exact (screenshots, diagrams) and outputs that are not
+_LOSSLESS_SOURCES = {"PNG", "GIF", "BMP", "TIFF"}
+_LOSSY_OUTPUTS = {"JPEG", "WEBP"}
+
+
+@dataclass(frozen=True)
+class PreprocessedImage:
+    """The model-ready image plus the byte counts before and after preprocessing."""
+    data: bytes
+    mime_type: str
+    original_bytes: int
+    width: int = 0
+    height: int = 0
+    outcome: str = "kept" # resized, reencoded, kept (original bytes) or skipped (not decodable)
+
+    @property
+    def processed_bytes(self) -> int:
+        return len(self.data)
+
+
+def _get_preprocess_executor() -> ThreadPoolExecutor:
+    global _preprocess_executor
+    if _preprocess_executor is None:
+        _preprocess_executor = ThreadPoolExecutor(
+            max_workers=settings.IMAGE_PREPROCESS_WORKERS, thread_name_prefix="image-preprocess"
+        )
+    return _preprocess_executor
+
+
+def downscale_and_reencode(
+    image_bytes: bytes, mime_type: str, max_edge: int, output_format: str, quality: int
+) -> PreprocessedImage:
+    """
+    Resizes an image so its longest edge is at most `max_edge` and re-encodes it.
+
+    EXIF orientation is applied to the pixels first; the output carries no
+    EXIF or other metadata. An image already within `max_edge` is kept as it
+    is (bytes and `mime_type`) unless re-encoding saves at least
+    IMAGE_REENCODE_MIN_SAVING of its size, and a lossless one (PNG screenshots,
+    diagrams) is never turned into a lossy format. Runs synchronously (call it
+    from a worker thread).
+    """
+    output_format = output_format.upper()
+    with Image.open(BytesIO(image_bytes)) as img:
+        within_edge = max(img.size) <= max_edge
+        if within_edge and img.format in _LOSSLESS_SOURCES and output_format in _LOSSY_OUTPUTS:
+            width, height = img.size
+            if img.getexif().get(0x0112) in (5, 6, 7, 8): # Orientations that swap the edges
+                width, height = height, width
+            return PreprocessedImage(
+                data=image_bytes, mime_type=mime_type, original_bytes=len(image_bytes), width=width, height=height
+            )
+        # JPEG can decode straight at a reduced scale, which is much cheaper than a full decode
+        img.draft("RGB", (max_edge, max_edge))
+        img = ImageOps.exif_transpose(img)
+        img.thumbnail((max_edge, max_edge), Image.Resampling.LANCZOS)
+
+        if output_format == "JPEG" and img.mode != "RGB":
+            # JPEG has no alpha channel: flatten transparent areas onto white
+            rgba = img.convert("RGBA")
+            img = Image.new("RGB", rgba.size, (255, 255, 255))
+            img.paste(rgba, mask=rgba.getchannel("A"))
+        elif img.mode not in ("RGB", "RGBA", "L", "LA"):
+            img = img.convert("RGBA" if "A" in img.getbands() else "RGB")
+
+        out = BytesIO()
+        img.save(out, format=output_format, quality=quality, optimize=True)
+        width, height = img.size
+
+    if within_edge and out.tell() > len(image_bytes) * (1 - settings.IMAGE_REENCODE_MIN_SAVING):
+        return PreprocessedImage(
+            data=image_bytes, mime_type=mime_type, original_bytes=len(image_bytes), width=width, height=height
+        )
+    return PreprocessedImage(
+        data=out.getvalue(),
+        mime_type=_OUTPUT_MIME_TYPES.get(output_format, f"image/{output_format.lower()}"),
+        original_bytes=len(image_bytes),
+        width=width,
+        height=height,
+        outcome="reencoded" if within_edge else "resized",
+    )
+
+
+async def preprocess_image_for_model(image_bytes: bytes, mime_type: str) -> PreprocessedImage:
+    """
+    Downscales and re-encodes an image on the preprocessing pool before it is sent to Gemini.
+
+    Images within IMAGE_MAX_EDGE are passed through unless re-encoding clearly
+    shrinks them, and so are images Pillow cannot decode (e.g. HEIC without a plugin).
+
+    Args:
+        image_bytes: The original upload.
+        mime_type: The sniffed MIME type of the original upload.
+
+    Returns:
+        The image to send to the model, with before/after byte counts.
+    """
+    if not settings.IMAGE_PREPROCESS_ENABLED:
+        return PreprocessedImage(data=image_bytes, mime_type=mime_type, original_bytes=len(image_bytes))
+
+    start = time.perf_counter()
+    loop = asyncio.get_running_loop()
+    try:
+        result = await loop.run_in_executor(
+            _get_preprocess_executor(),
+            downscale_and_reencode,
+            image_bytes,
+            mime_type,
+            settings.IMAGE_MAX_EDGE,
+            settings.IMAGE_OUTPUT_FORMAT,
+            settings.IMAGE_OUTPUT_QUALITY,
+        )
+    except Exception:
+        result = PreprocessedImage(
+            data=image_bytes, mime_type=mime_type, original_bytes=len(image_bytes), outcome="skipped"
+        )
+    _duration.observe(time.perf_counter() - start)
+    _images.inc(outcome=result.outcome)
+
+    _bytes_in.inc(result.original_bytes)
+    _bytes_out.inc(result.processed_bytes)
+    return result
@@ -0,0 +1,147 @@
+"""
+Content-addressed store of uploaded images.
+
+Every image is identified by the SHA-256 digest of its bytes (a cryptographic
+hash: a crafted upload cannot take over the URL of someone else's image). Before
+uploading, the digest is looked up in:
+
+- a per-process LRU of digest -> URL (IMAGE_STORE_CACHE_MAX_ENTRIES): a repeated
+  image costs no network I/O at all;
+- the `image_assets` collection, shared by all workers. Hits are promoted to the LRU.
+
+Only unknown images are uploaded to Cloudinary; identical uploads arriving while
+the first is still in progress wait for it instead of uploading again.
+ConversationHistory stores the digest next to the URL (`image_digest`).
+
+Lookups are counted by where they were answered (image_store_lookups_total) and
+the running dedup hit rate is exported as image_store_hit_ratio. MongoDB errors
+never fail a request: the image is uploaded as if it were new.
+"""
+import asyncio
+import hashlib
+from typing import Dict, NamedTuple, Optional
+
+from cachetools import LRUCache
+
+from app.agents.image_handler import upload_image_to_cloudinary
+from app.core.config import settings
+from app.core.metrics import registry
+from app.database.repositories import image_assets
+
+_lookups = registry.counter("image_store_lookups_total", "Image store lookups by source (memory/mongo/pending/upload).")
+_hit_ratio = registry.gauge("image_store_hit_ratio", "Share of stored images that did not need an upload.")
+
+# Hashing larger images runs on a thread (hashlib releases the GIL)
+_THREAD_DIGEST_BYTES = 256 * 1024
+
+
+class StoredImage(NamedTuple):
+    digest: str
+    url: Optional[str]
+    source: str # Where the URL came from: memory, mongo, pending (joined an upload in progress) or upload
+
+
+_memory: LRUCache = LRUCache(maxsize=settings.IMAGE_STORE_CACHE_MAX_ENTRIES)
+
+# Digests being uploaded -> future resolved with the URL
+_pending: Dict[str, asyncio.Future] = {}
+
+_counts: Dict[str, int] = {"memory": 0, "mongo": 0, "pending": 0, "upload": 0}
+
+
+def image_digest(image_bytes: bytes) -> str:
+    """The content address of an image: SHA-256 hex of its bytes."""
+    return hashlib.sha256(image_bytes).hexdigest()
+
+
+def _count(source: str) -> None:
+    _lookups.inc(source=source)
+    _counts[source] += 1
+    _hit_ratio.set(hit_rate())
+
+
+def hit_rate() -> float:
+    """Share of stored images answered without an upload since startup (or the last clear())."""
+    total = sum(_counts.values())
+    return (total - _counts["upload"]) / total if total else 0.0
+
+
+def stats() -> Dict[str, float]:
+    """Lookup counts by source, plus the hit rate."""
+    return {**_counts, "hit_rate": hit_rate()}
+
+
+async def _lookup(digest: str) -> Optional[str]:
+    try:
+        return await image_assets.get_url(digest)
+    except Exception as e:
+        print(f"Image store lookup failed, uploading: {e}")
+        return None
+
+
+async def _upload(digest: str, image_bytes: bytes, mime_type: Optional[str]) -> Optional[str]:
+    url = await upload_image_to_cloudinary(image_bytes)
+    if url is None:
+        return None
+    try:
+        # Another worker may have stored the same image meanwhile: everyone uses the first URL
+        url = await image_assets.put(digest, url, mime_type, len(image_bytes))
+    except Exception as e:
+        print(f"Image store write failed for {digest}: {e}")
+    return url
+
+
+async def store(image_bytes: bytes, mime_type: Optional[str] = None) -> StoredImage:
+    """
+    Returns the URL of this image, uploading it only if no identical image was stored before.
+
+    Raises:
+        Whatever the upload raised, when a new image could not be uploaded.
+    """
+    if len(image_bytes) >= _THREAD_DIGEST_BYTES:
+        digest = await asyncio.to_thread(image_digest, image_bytes)
+    else:
+        digest = image_digest(image_bytes)
+
+    if not settings.IMAGE_STORE_ENABLED:
+        return StoredImage(digest, await upload_image_to_cloudinary(image_bytes), "upload")
+
+    url = _memory.get(digest)
+    if url is not None:
+        _count("memory")
+        return StoredImage(digest, url, "memory")
+
+    pending = _pending.get(digest)
+    if pending is not None:
+        url = await asyncio.shield(pending)
+        _count("pending")
+        return StoredImage(digest, url, "pending")
+
+    future = asyncio.get_running_loop().create_future()
+    _pending[digest] = future
+    try:
+        url = await _lookup(digest)
+        source = "mongo"
+        if url is None:
+            url = await _upload(digest, image_bytes, mime_type)
+            source = "upload"
+    except BaseException as e:
+        # Waiters get the same error; nothing is cached, so the next upload tries again
+        future.set_exception(e if isinstance(e, Exception) else RuntimeError("Image upload was cancelled"))
+        future.exception() # Mark retrieved: there may be no waiter
+        raise
+    finally:
+        _pending.pop(digest, None)
+    if url is not None:
+        _memory[digest] = url
+    future.set_result(url)
+    _count(source)
+    return StoredImage(digest, url, source)
+
+
+def clear() -> None:
+    """Empties the per-process LRU and resets the counters (MongoDB is left as is)."""
+    _memory.clear()
+    for source in _counts:
+        _counts[source] = 0
+    _hit_ratio.set(0.0)
@@ -1,13 +1,118 @@
 # app/agents/llm_clients.py
-from langchain_google_genai import ChatGoogleGenerativeAI
+"""
+Lazily created model clients, shared by the whole process.
+
+Nothing is built at import time: the Gemini SDK (whose `google.genai.types`
+module alone takes about half a second to import) and LangChain are imported
+on first use. main.py's lifespan calls `preload()` on a worker thread right
+after startup, so the worker answers health checks immediately and the first
+chat finds the client ready; `close()` releases the pooled connections on
+shutdown.
+
+The Gemini client shares one httpx connection pool (MODEL_HTTP_* settings,
+capped at this worker's share of MODEL_HTTP_MAX_CONNECTIONS_TOTAL) across all
+async calls. Clients are per process: one inherited through fork (gunicorn's
+preload_app) is dropped in the child and rebuilt on first use.
+"""
+import os
+import threading
+from typing import Any, Optional
+
 from app.core.config import settings
+from app.core.serving import per_worker
+
+_lock = threading.Lock()
+_genai_client: Any = None
+_genai_failed = False
+_http_client: Any = None
+_gemini_model: Any = None
+
+
+def _forget_after_fork() -> None:
+    # The parent's clients hold its sockets (and possibly a held lock); the child builds its own
+    global _lock, _genai_client, _genai_failed, _http_client, _gemini_model
+    _lock = threading.Lock()
+    _genai_client, _genai_failed, _http_client, _gemini_model = None, False, None, None
+
+
+if hasattr(os, "register_at_fork"): # POSIX only
+    os.register_at_fork(after_in_child=_forget_after_fork)
+
+
+def get_genai_client() -> Optional[Any]:
+    """
+    Returns the process-wide `google.genai.Client`, creating it on first use.
+
+    Returns:
+        The client, or None if it could not be created (e.g. missing API key).
+    """
+    global _genai_client, _genai_failed, _http_client
+    if _genai_client is not None or _genai_failed:
+        return _genai_client
+    with _lock:
+        if _genai_client is None and not _genai_failed:
+            try:
+                import httpx
+                from google import genai
+                from google.genai import types
+
+                max_connections = per_worker(settings.MODEL_HTTP_MAX_CONNECTIONS, settings.MODEL_HTTP_MAX_CONNECTIONS_TOTAL)
+                _http_client = httpx.AsyncClient(
+                    limits=httpx.Limits(
+                        max_connections=max_connections,
+                        max_keepalive_connections=min(settings.MODEL_HTTP_MAX_KEEPALIVE_CONNECTIONS, max_connections),
+                        keepalive_expiry=settings.MODEL_HTTP_KEEPALIVE_EXPIRY_SECONDS,
+                    ),
+                    timeout=settings.MODEL_CALL_TIMEOUT_SECONDS,
+                )
+                _genai_client = genai.Client(
+                    api_key=settings.GEMINI_API_KEY,
+                    http_options=types.HttpOptions(
+                        base_url=settings.MODEL_API_BASE_URL or None, httpx_async_client=_http_client
+                    ),
+                )
+            except Exception as e:
+                # Handle the case where the API key is missing or the client fails to initialize
+                print(f"Error initializing GenAI Client: {e}")
+                _genai_failed = True
+    return _genai_client
+
+
+def get_gemini_model() -> Any:
+    """LangChain chat model on the preferred text model (LangChain is only imported here)."""
+    global _gemini_model
+    with _lock:
+        if _gemini_model is None:
+            from langchain_google_genai import ChatGoogleGenerativeAI
+            from app.agents.model_router import primary_model
+
+            _gemini_model = ChatGoogleGenerativeAI(
+                model=primary_model(),
+                temperature=0.5,
+                google_api_key=settings.GEMINI_API_KEY
+            )
+    return _gemini_model
+
+
+def __getattr__(name: str) -> Any:
+    # `from app.agents.llm_clients import gemini_model` keeps working, built on first access
+    if name == "gemini_model":
+        return get_gemini_model()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def preload() -> None:
+    """Imports the Gemini SDK and builds its client (blocking; run it on a worker thread)."""
+    if get_genai_client() is not None:
+        print("✅ Gemini client ready.")
 
-# Initialize the Gemini Model (using 2.5 Flash for speed and multimodal)
-gemini_model = ChatGoogleGenerativeAI(
-    model="gemini-2.5-flash", 
-    temperature=0.5,
-    google_api_key=settings.GEMINI_API_KEY
-)
 
-# You can initialize other Gemini models here if needed, 
-# but we will use the one above for the multimodal agent.
\ No newline at end of file
+async def close() -> None:
+    """Closes the Gemini client's pooled connections (call on shutdown)."""
+    global _genai_client, _http_client
+    client, http_client = _genai_client, _http_client
+    _genai_client, _http_client = None, None
+    if client is not None:
+        await client.aio.aclose()
+    if http_client is not None:
+        await http_client.aclose()
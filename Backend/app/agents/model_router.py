@@ -0,0 +1,269 @@
+"""
+Model selection, hedging, retries and circuit breaking for Gemini calls.
+
+Candidate models are configured per request type, in order of preference:
+MODEL_IMAGE_CANDIDATES for requests with an image, MODEL_LONG_PROMPT_CANDIDATES
+for prompts estimated above MODEL_LONG_PROMPT_TOKENS, MODEL_TEXT_CANDIDATES
+otherwise. For every call the router:
+
+- selects the first candidate whose circuit is closed and whose recent p95
+  latency is within MODEL_LATENCY_TARGET_SECONDS (the fastest healthy one if
+  none is within target);
+- hedges: if no answer arrived after the selected model's p95 latency (at least
+  MODEL_HEDGE_MIN_DELAY_SECONDS), a second attempt goes to the next healthy
+  candidate (the same model if there is none). The first answer wins, the other
+  attempt is cancelled;
+- retries transient failures (timeouts, 429/5xx, connection errors) with
+  jittered exponential backoff, preferring a candidate that has not failed yet;
+- opens a model's circuit when its error rate over the last MODEL_BREAKER_WINDOW
+  calls reaches MODEL_BREAKER_ERROR_RATE. After MODEL_BREAKER_COOLDOWN_SECONDS a
+  single probe call is let through; its outcome closes or re-opens the circuit.
+
+Latency and error statistics are kept per process.
+"""
+import asyncio
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Iterable, List, Optional, Tuple, TypeVar
+
+from tenacity import AsyncRetrying, retry_if_exception, stop_after_attempt, wait_random_exponential
+
+from app.core.config import settings
+from app.core.metrics import registry
+
+T = TypeVar("T")
+
+
+class ModelBusyError(RuntimeError):
+    """Raised when no model slot frees up within MODEL_QUEUE_TIMEOUT_SECONDS."""
+
+
+class ModelTimeoutError(RuntimeError):
+    """Raised when a single model call exceeds MODEL_CALL_TIMEOUT_SECONDS."""
+
+
+_calls = registry.counter("model_calls_total", "Model call attempts by model and outcome (ok/error/cancelled).")
+_call_seconds = registry.histogram("model_call_duration_seconds", "Duration of successful model call attempts, by model.")
+_hedges = registry.counter("model_hedged_calls_total", "Second attempts fired after the p95 delay, by which attempt won.")
+_retries = registry.counter("model_retries_total", "Model calls retried after a transient failure.")
+_breaker_open = registry.gauge("model_circuit_open", "1 while a model's circuit breaker is open.")
+
+
+def model_list(value: str) -> List[str]:
+    """Parses a comma-separated list of model names."""
+    return [name.strip() for name in value.split(",") if name.strip()]
+
+
+def primary_model() -> str:
+    """The preferred model for text requests (used where no routing happens)."""
+    return model_list(settings.MODEL_TEXT_CANDIDATES)[0]
+
+
+def is_transient(error: BaseException) -> bool:
+    """True for failures worth retrying on (another) model; False for local back-pressure and bad requests."""
+    if not isinstance(error, Exception):
+        return False # Cancellation / generator close: never retried
+    if isinstance(error, ModelBusyError):
+        return False # Our own queue is full: a retry would only queue again
+    if isinstance(error, ModelTimeoutError):
+        return True
+    code = getattr(error, "code", None) # google.genai.errors.APIError
+    if isinstance(code, int):
+        return code == 429 or code >= 500
+    return True # Connection resets, DNS failures, ...
+
+
+class ModelStats:
+    """Rolling latency and outcome window of one model, plus its circuit state."""
+
+    def __init__(self, model: str):
+        self.model = model
+        self.latencies: Deque[float] = deque(maxlen=settings.MODEL_STATS_WINDOW)
+        self.outcomes: Deque[bool] = deque(maxlen=settings.MODEL_BREAKER_WINDOW)
+        self.opened_at: Optional[float] = None
+        self.probing = False
+
+    def p95(self) -> Optional[float]:
+        """Recent p95 latency, or None until MODEL_HEDGE_MIN_SAMPLES calls were observed."""
+        if len(self.latencies) < settings.MODEL_HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+    def available(self, now: float) -> bool:
+        """Closed circuit, or open long enough for a probe that is not already running."""
+        if self.opened_at is None:
+            return True
+        return not self.probing and now - self.opened_at >= settings.MODEL_BREAKER_COOLDOWN_SECONDS
+
+    def record(self, ok: bool, seconds: float, now: float) -> None:
+        if ok:
+            self.latencies.append(seconds)
+        if self.opened_at is not None:
+            # Result of the half-open probe
+            self.probing = False
+            if ok:
+                self._close()
+            else:
+                self.opened_at = now
+            return
+        self.outcomes.append(ok)
+        errors = self.outcomes.count(False)
+        if (
+            not ok and len(self.outcomes) >= settings.MODEL_BREAKER_MIN_CALLS
+            and errors / len(self.outcomes) >= settings.MODEL_BREAKER_ERROR_RATE
+        ):
+            self.opened_at = now
+            _breaker_open.set(1, model=self.model)
+            print(f"⚠️ Circuit opened for {self.model}: {errors}/{len(self.outcomes)} recent calls failed.")
+
+    def abandon(self) -> None:
+        """An attempt ended without saying anything about the model (cancelled, rejected locally)."""
+        self.probing = False
+
+    def _close(self) -> None:
+        self.opened_at = None
+        self.outcomes.clear()
+        _breaker_open.set(0, model=self.model)
+        print(f"✅ Circuit closed for {self.model}.")
+
+
+class ModelRouter:
+    """Chooses a model per call and runs the call with hedging, retries and circuit breaking."""
+
+    def __init__(self):
+        self._stats: Dict[str, ModelStats] = {}
+
+    def stats(self, model: str) -> ModelStats:
+        stats = self._stats.get(model)
+        if stats is None:
+            stats = self._stats[model] = ModelStats(model)
+        return stats
+
+    def candidates(self, has_image: bool = False, prompt_tokens: int = 0) -> List[str]:
+        """Configured models for a request, in order of preference."""
+        if has_image:
+            return model_list(settings.MODEL_IMAGE_CANDIDATES)
+        if prompt_tokens > settings.MODEL_LONG_PROMPT_TOKENS:
+            return model_list(settings.MODEL_LONG_PROMPT_CANDIDATES)
+        return model_list(settings.MODEL_TEXT_CANDIDATES)
+
+    def select(self, candidates: List[str], exclude: Iterable[str] = ()) -> str:
+        """
+        Picks the model for the next attempt (see the module docstring).
+
+        Excluded models are only used when nothing else is available; if every
+        circuit is open, the preferred model is tried anyway.
+        """
+        now = time.monotonic()
+        excluded = set(exclude)
+        healthy = [m for m in candidates if m not in excluded and self.stats(m).available(now)]
+        if not healthy:
+            healthy = [m for m in candidates if self.stats(m).available(now)] or candidates[:1]
+        within_target = [m for m in healthy if (self.stats(m).p95() or 0.0) <= settings.MODEL_LATENCY_TARGET_SECONDS]
+        if within_target:
+            chosen = within_target[0]
+        else:
+            chosen = min(healthy, key=lambda m: self.stats(m).p95() or 0.0)
+        stats = self.stats(chosen)
+        if stats.opened_at is not None:
+            stats.probing = True
+        return chosen
+
+    def hedge_delay(self, model: str) -> Optional[float]:
+        """Seconds to wait before hedging a call to `model` (None: do not hedge)."""
+        if not settings.MODEL_HEDGE_ENABLED:
+            return None
+        p95 = self.stats(model).p95()
+        return None if p95 is None else max(p95, settings.MODEL_HEDGE_MIN_DELAY_SECONDS)
+
+    def record(self, model: str, seconds: float, error: Optional[BaseException] = None) -> None:
+        """Feeds one finished attempt into the model's statistics (for callers driving the model themselves)."""
+        if error is not None and not is_transient(error):
+            self.stats(model).abandon()
+            return # Bad requests and local back-pressure say nothing about the model's health
+        self.stats(model).record(error is None, seconds, time.monotonic())
+        _calls.inc(model=model, outcome="ok" if error is None else "error")
+        if error is None:
+            _call_seconds.observe(seconds, model=model)
+
+    async def _attempt(self, model: str, call: Callable[[str], Awaitable[T]]) -> Tuple[T, str]:
+        start = time.perf_counter()
+        try:
+            result = await call(model)
+        except asyncio.CancelledError:
+            # Lost a hedge race (or the client left): the elapsed time is still a lower bound of its latency
+            stats = self.stats(model)
+            stats.latencies.append(time.perf_counter() - start)
+            stats.abandon()
+            _calls.inc(model=model, outcome="cancelled")
+            raise
+        except Exception as e:
+            self.record(model, time.perf_counter() - start, e)
+            raise
+        self.record(model, time.perf_counter() - start)
+        return result, model
+
+    async def _hedged(self, candidates: List[str], call: Callable[[str], Awaitable[T]], failed: set) -> Tuple[T, str]:
+        primary = self.select(candidates, exclude=failed)
+        tasks = [asyncio.ensure_future(self._attempt(primary, call))]
+        try:
+            delay = self.hedge_delay(primary)
+            if delay is None:
+                return await tasks[0]
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done:
+                backup = self.select(candidates, exclude=failed | {primary})
+                tasks.append(asyncio.ensure_future(self._attempt(backup, call)))
+            pending = set(tasks)
+            first_error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if len(tasks) > 1:
+                            _hedges.inc(winner="primary" if task is tasks[0] else "hedge")
+                        return task.result()
+                    first_error = first_error or task.exception()
+            raise first_error
+        except Exception:
+            failed.add(primary) # Retries go to another candidate if there is one
+            raise
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    async def call(self, candidates: List[str], call: Callable[[str], Awaitable[T]]) -> Tuple[T, str]:
+        """
+        Runs `call(model)` on the selected model with hedging and retries.
+
+        Returns:
+            (result, model that produced it).
+
+        Raises:
+            The last attempt's error once retries are exhausted, or immediately for non-transient errors.
+        """
+        failed: set = set()
+        async for attempt in self.retrying():
+            with attempt:
+                return await self._hedged(candidates, call, failed)
+
+    def retrying(self, retry_if: Callable[[BaseException], bool] = is_transient) -> AsyncRetrying:
+        """Retry policy for callers that drive attempts themselves (e.g. streams, before the first chunk)."""
+        return AsyncRetrying(
+            stop=stop_after_attempt(settings.MODEL_RETRY_ATTEMPTS + 1),
+            wait=wait_random_exponential(multiplier=settings.MODEL_RETRY_BASE_DELAY_SECONDS, max=settings.MODEL_RETRY_MAX_DELAY_SECONDS),
+            retry=retry_if_exception(retry_if),
+            before_sleep=lambda state: _retries.inc(),
+            reraise=True,
+        )
+
+    def reset(self) -> None:
+        """Forgets all statistics and closes every circuit."""
+        for model in self._stats:
+            _breaker_open.set(0, model=model)
+        self._stats.clear()
+
+
+model_router = ModelRouter()
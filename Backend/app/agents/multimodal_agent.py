@@ -1,55 +1,172 @@
-from google import genai
-from google.genai.types import Part
-from io import BytesIO
-from typing import Optional, List, Union, Any
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import partial
+from typing import TYPE_CHECKING, Optional, List, Union, Any, AsyncIterator
 
-# NOTE: You will need to replace this import with your actual config and error handling
-# from app.core.config import settings 
+from app.agents import llm_clients, response_cache
+from app.agents.conversation_context import SessionContext, estimate_tokens
+from app.agents.model_router import ModelBusyError, ModelTimeoutError, is_transient, model_router
+from app.agents.response_cache import CachedAnswer
+from app.core.config import settings
+from app.core.concurrency import ConcurrencyLimiter, ConcurrencyLimitExceeded
+from app.core.metrics import registry
+
+if TYPE_CHECKING:
+    # google.genai.types is slow to import: loaded on first use (see llm_clients)
+    from google.genai.types import Content, Part
+
+
+@dataclass
+class TokenUsage:
+    """Filled in by the request functions below for the caller to report."""
+    prompt_tokens: Optional[int] = None # From the model's usage metadata; None when answered from the cache
+    output_tokens: Optional[int] = None
+    context_turns: int = 0 # Prior turns sent along with the message
+    model_used: Optional[str] = None # The model that produced the answer (chosen by model_router)
+
+
+TOKEN_BUCKETS = (100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000, 64000, 128000)
+prompt_tokens_histogram = registry.histogram("model_prompt_tokens", "Prompt tokens per model call.", buckets=TOKEN_BUCKETS)
+prompt_tokens_total = registry.counter("model_prompt_tokens_total", "Prompt tokens billed by the model.")
+output_tokens_total = registry.counter("model_output_tokens_total", "Output tokens billed by the model.")
+
+
+def record_usage(usage_metadata: Any, usage: Optional[TokenUsage]) -> None:
+    """Copies a response's usage metadata into the token metrics and `usage`."""
+    if usage_metadata is None:
+        return
+    prompt_tokens = getattr(usage_metadata, "prompt_token_count", None)
+    output_tokens = getattr(usage_metadata, "candidates_token_count", None)
+    if prompt_tokens is not None:
+        prompt_tokens_histogram.observe(prompt_tokens)
+        prompt_tokens_total.inc(prompt_tokens)
+    if output_tokens is not None:
+        output_tokens_total.inc(output_tokens)
+    if usage is not None:
+        usage.prompt_tokens = prompt_tokens
+        usage.output_tokens = output_tokens
 
 # --- 1. Client Initialization ---
-# Initialize the client. In a production app, use proper setup via config.
-# Assumes GEMINI_API_KEY is set in the environment or passed during client initialization.
-try:
-    # Use a placeholder client creation, replace with your actual setup
-    client = genai.Client()
-except Exception as e:
-    # Handle the case where the API key is missing or the client fails to initialize
-    print(f"Error initializing GenAI Client: {e}")
-    client = None 
+# The Gemini client is created on first use and shared (see llm_clients.py);
+# benchmarks plug in a local fake with set_model_client().
+_client_override: Any = None
+
+
+def get_client() -> Any:
+    """The client used for model calls (None if the Gemini client could not be created)."""
+    if _client_override is not None:
+        return _client_override
+    return llm_clients.get_genai_client()
+
+# Per-process cap on concurrent model calls (exports queue depth / wait time metrics)
+model_limiter = ConcurrencyLimiter(
+    "model_calls",
+    limit=settings.MODEL_MAX_CONCURRENCY,
+    queue_timeout=settings.MODEL_QUEUE_TIMEOUT_SECONDS,
+)
+
+# Dedicated threads for the synchronous-client fallback, sized to the limiter so the
+# default executor (shared with file I/O etc.) never caps model concurrency
+_fallback_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _get_fallback_executor() -> ThreadPoolExecutor:
+    global _fallback_executor
+    if _fallback_executor is None:
+        _fallback_executor = ThreadPoolExecutor(
+            max_workers=model_limiter.limit, thread_name_prefix="genai-sync"
+        )
+    return _fallback_executor
+
+
+def set_model_client(new_client: Any) -> None:
+    """Replaces the Gemini client (used by benchmarks to plug in a local fake; None restores it)."""
+    global _client_override
+    _client_override = new_client
 
 # --- 2. Helper Function to Create Image Part ---
 
-def get_image_part_from_bytes(image_bytes: bytes, mime_type: str) -> Part:
+def get_image_part_from_bytes(image_bytes: bytes, mime_type: str) -> "Part":
     """Creates a Part object from raw image bytes for the API request."""
+    from google.genai.types import Part
     # The GenAI SDK uses Part.from_bytes to handle binary data
     return Part.from_bytes(
         data=image_bytes,
         mime_type=mime_type
     )
 
-# --- 3. Main Multimodal Processing Function ---
+# --- 3. Non-blocking Model Invocation ---
 
-async def process_multimodal_request(
-    text_input: str, 
-    image_bytes: Optional[bytes], 
-    mime_type: str = "image/jpeg" # Default MIME type
-) -> str:
+async def generate_content(model: str, contents: List[Union[str, "Part"]], config: Any = None) -> Any:
     """
-    Calls the Gemini model with text and optional image data using Google GenAI SDK.
+    Runs one generate_content call without blocking the event loop.
     
-    Args:
-        text_input: The user's text query (can be an empty string if only image is provided).
-        image_bytes: The raw byte data of the uploaded image, or None.
-        mime_type: The MIME type of the image (e.g., 'image/png', 'image/avif').
-        
+    Uses the SDK's async client when available and falls back to running the
+    synchronous client in the default executor. The call holds a slot of
+    `model_limiter` and is bounded by MODEL_CALL_TIMEOUT_SECONDS.
+    
+    Raises:
+        ModelBusyError: No slot became available within the queue timeout.
+        ModelTimeoutError: The model did not answer within the call timeout.
+    """
+    try:
+        async with model_limiter.slot():
+            client = get_client()
+            aio = getattr(client, "aio", None)
+            if aio is not None:
+                call = aio.models.generate_content(model=model, contents=contents, config=config)
+            else:
+                call = asyncio.get_running_loop().run_in_executor(
+                    _get_fallback_executor(),
+                    partial(client.models.generate_content, model=model, contents=contents, config=config),
+                )
+            return await asyncio.wait_for(call, timeout=settings.MODEL_CALL_TIMEOUT_SECONDS)
+    except ConcurrencyLimitExceeded as e:
+        raise ModelBusyError(str(e))
+    except asyncio.TimeoutError:
+        raise ModelTimeoutError(f"Model call exceeded {settings.MODEL_CALL_TIMEOUT_SECONDS}s")
+
+
+async def drain(timeout: float) -> bool:
+    """
+    Waits until no model call holds or waits for a slot (call on shutdown, before the client is closed).
+
     Returns:
-        The final text response from the Gemini model.
+        False if calls were still running after `timeout` seconds.
     """
-    if not client:
-        return "Model client is not initialized. Check your API key and configuration."
+    deadline = time.monotonic() + timeout
+    while model_limiter.in_flight or model_limiter.waiting:
+        if time.monotonic() >= deadline:
+            print(f"⚠️ Shutting down with {model_limiter.in_flight} model calls still in flight.")
+            return False
+        await asyncio.sleep(0.05)
+    return True
+
+
+def _invocation_error(error: Exception) -> Exception:
+    """Agent errors pass through; anything else becomes the RuntimeError the router maps to a 500."""
+    if isinstance(error, (ModelBusyError, ModelTimeoutError)):
+        return error
+    return RuntimeError(f"Model invocation failed: {error}")
 
+# --- 4. Prompt Assembly ---
+
+def build_contents(
+    text_input: str,
+    image_bytes: Optional[bytes],
+    mime_type: str = "image/jpeg"
+) -> Optional[List[Union[str, "Part"]]]:
+    """
+    Builds the `contents` list sent to the model.
+    
+    Returns:
+        The list of parts (image first, then the prompt text), or None when
+        neither text nor an image was provided.
+    """
     # The list of parts to send to the model
-    contents: List[Union[str, Part]] = []
+    contents: List[Union[str, "Part"]] = []
     
     # 1. Handle Image Upload
     prompt_text = text_input.strip()
@@ -66,18 +183,192 @@ async def process_multimodal_request(
     # 2. Handle Text Input and Default Behavior
     if not image_bytes and not prompt_text:
         # Case: Neither image nor text provided.
-        return "Error: Please provide a text query, an image, or both."
+        return None
         
     # Append the final determined text prompt
     contents.append(prompt_text)
+    return contents
+
+
+def with_context(contents: List[Union[str, "Part"]], context: Optional[SessionContext]) -> List[Union[str, "Part", "Content"]]:
+    """Prepends the session's prior turns to the current message (unchanged without context)."""
+    if context is None or not context.turns:
+        return contents
+    from google.genai.types import Content, Part
+    parts = [part if isinstance(part, Part) else Part.from_text(text=part) for part in contents]
+    return [*context.history_contents(), Content(role="user", parts=parts)]
+
+
+def route_for(prompt_text: str, image_bytes: Optional[bytes], context: Optional[SessionContext]) -> List[str]:
+    """Candidate models for a request, by request type and estimated prompt size (see model_router)."""
+    prompt_tokens = estimate_tokens(prompt_text) + (context.prompt_token_estimate() if context is not None else 0)
+    return model_router.candidates(has_image=image_bytes is not None, prompt_tokens=prompt_tokens)
+
+# --- 5. Main Multimodal Processing Function ---
+
+async def process_multimodal_request(
+    text_input: str, 
+    image_bytes: Optional[bytes], 
+    mime_type: str = "image/jpeg", # Default MIME type
+    use_cache: bool = True,
+    context: Optional[SessionContext] = None,
+    usage: Optional[TokenUsage] = None
+) -> str:
+    """
+    Calls the Gemini model with text and optional image data using Google GenAI SDK.
+    
+    Args:
+        text_input: The user's text query (can be an empty string if only image is provided).
+        image_bytes: The raw byte data of the uploaded image, or None.
+        mime_type: The MIME type of the image (e.g., 'image/png', 'image/avif').
+        use_cache: Serve/store the answer through the response cache (False forces a model call).
+        context: The session's prior turns and rolling summary (see conversation_context.py).
+        usage: Receives the prompt/output token counts of the call and the model that answered.
+        
+    Returns:
+        The final text response from the Gemini model.
+    """
+    if not get_client():
+        return "Model client is not initialized. Check your API key and configuration."
+
+    contents = build_contents(text_input, image_bytes, mime_type)
+    if contents is None:
+        return "Error: Please provide a text query, an image, or both."
+
+    prompt_text = contents[-1]
+    config = context.generate_config() if context is not None else None
+    if usage is not None and context is not None:
+        usage.context_turns = len(context.turns)
+    candidates = route_for(prompt_text, image_bytes, context)
+
+    # Invoke the model
+    async def call_model() -> CachedAnswer:
+        try:
+            response, model = await model_router.call(
+                candidates,
+                lambda model: generate_content(model=model, contents=with_context(contents, context), config=config),
+            )
+            record_usage(getattr(response, "usage_metadata", None), usage)
+            return CachedAnswer(response.text, model)
+        except Exception as e:
+            # This will be caught by the router and converted to a 500 error
+            raise _invocation_error(e)
+
+    # Repeated prompt/image: answer from the cache (or share an identical in-flight call)
+    cache_key = response_cache.cache_key(
+        ",".join(candidates), prompt_text, image_bytes, mime_type, context.digest() if context is not None else ""
+    )
+    answer = await response_cache.get_or_compute(cache_key, call_model, use_cache)
+    if usage is not None:
+        usage.model_used = answer.model
+    return answer.text
+
+# --- 6. Streaming Variant ---
+
+async def stream_multimodal_request(
+    text_input: str,
+    image_bytes: Optional[bytes],
+    mime_type: str = "image/jpeg",
+    use_cache: bool = True,
+    context: Optional[SessionContext] = None,
+    usage: Optional[TokenUsage] = None
+) -> AsyncIterator[str]:
+    """
+    Same as `process_multimodal_request`, but yields text chunks as the model produces them.
+    
+    The model slot is held until the stream is exhausted or closed. Closing the
+    generator early (e.g. the HTTP client disconnected) closes the upstream
+    stream as well. MODEL_CALL_TIMEOUT_SECONDS bounds the wait for each chunk.
+    A cached answer is yielded as a single chunk; a complete streamed answer is
+    added to the cache.
+    
+    Raises:
+        ModelBusyError, ModelTimeoutError, RuntimeError: As for `process_multimodal_request`.
+    """
+    client = get_client()
+    if not client:
+        yield "Model client is not initialized. Check your API key and configuration."
+        return
+
+    contents = build_contents(text_input, image_bytes, mime_type)
+    if contents is None:
+        yield "Error: Please provide a text query, an image, or both."
+        return
+
+    timeout = settings.MODEL_CALL_TIMEOUT_SECONDS
+    aio = getattr(client, "aio", None)
+    if aio is None:
+        # Synchronous client: no incremental chunks, emit the full answer once
+        yield await process_multimodal_request(text_input, image_bytes, mime_type, use_cache, context, usage)
+        return
+
+    if usage is not None and context is not None:
+        usage.context_turns = len(context.turns)
+    candidates = route_for(contents[-1], image_bytes, context)
+    cache_key = response_cache.cache_key(
+        ",".join(candidates), contents[-1], image_bytes, mime_type, context.digest() if context is not None else ""
+    )
+    if use_cache:
+        cached = await response_cache.get(cache_key)
+        if cached is not None:
+            if usage is not None:
+                usage.model_used = cached.model
+            yield cached.text
+            return
+
+    chunks: List[str] = []
+    usage_metadata = None
+    failed: set = set()
 
-    # 3. Invoke the model
     try:
-        response = client.models.generate_content(
-            model='gemini-2.5-flash', # Using the same model specified in your history model
-            contents=contents,
-        )
-        return response.text
+        # No hedging for streams; a failed attempt is retried on another candidate until the first chunk was sent
+        async for attempt in model_router.retrying(lambda e: not chunks and is_transient(e)):
+            with attempt:
+                model = model_router.select(candidates, exclude=failed)
+                start = time.perf_counter()
+                try:
+                    async with model_limiter.slot():
+                        stream = await asyncio.wait_for(
+                            aio.models.generate_content_stream(
+                                model=model,
+                                contents=with_context(contents, context),
+                                config=context.generate_config() if context is not None else None,
+                            ),
+                            timeout=timeout,
+                        )
+                        try:
+                            while True:
+                                try:
+                                    chunk = await asyncio.wait_for(stream.__anext__(), timeout=timeout)
+                                except StopAsyncIteration:
+                                    break
+                                # Usage metadata is complete on the last chunk
+                                usage_metadata = getattr(chunk, "usage_metadata", None) or usage_metadata
+                                if chunk.text:
+                                    chunks.append(chunk.text)
+                                    yield chunk.text
+                        finally:
+                            aclose = getattr(stream, "aclose", None)
+                            if aclose is not None:
+                                await aclose()
+                except ConcurrencyLimitExceeded as e:
+                    model_router.stats(model).abandon()
+                    raise ModelBusyError(str(e))
+                except Exception as e:
+                    error = ModelTimeoutError(f"Model stream stalled for more than {timeout}s") if isinstance(e, asyncio.TimeoutError) else e
+                    model_router.record(model, time.perf_counter() - start, error)
+                    failed.add(model)
+                    raise error
+                except BaseException:
+                    model_router.stats(model).abandon() # Client went away
+                    raise
+                model_router.record(model, time.perf_counter() - start)
+    except (ModelBusyError, ModelTimeoutError):
+        raise
     except Exception as e:
-        # This will be caught by the router and converted to a 500 error
-        raise RuntimeError(f"Model invocation failed: {e}")
\ No newline at end of file
+        raise RuntimeError(f"Model invocation failed: {e}")
+
+    record_usage(usage_metadata, usage)
+    if usage is not None:
+        usage.model_used = model
+    await response_cache.put(cache_key, model, "".join(chunks))
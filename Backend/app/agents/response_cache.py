@@ -0,0 +1,180 @@
+"""
+Exact-match cache of model answers.
+
+Keys are an xxh3-128 digest of the model route (the candidate models, see
+model_router), the normalized prompt and the image bytes/MIME type sent to the model, so a repeated prompt or a re-uploaded
+image with the default description prompt is answered without a model call.
+
+Two tiers:
+- memory: per-process TTL cache bounded by the total size of the cached answers
+  (least recently used entries are evicted first once RESPONSE_CACHE_MAX_BYTES is reached)
+- MongoDB (optional, RESPONSE_CACHE_MONGO_ENABLED): shared by all workers, expired
+  by a TTL index on `created_at`. Hits are promoted to the memory tier.
+
+Identical requests arriving while the first one is still waiting for the model
+share its answer instead of each calling the model (see `get_or_compute`).
+Answers are stored with the model that produced them, so hits report it too.
+
+MongoDB errors never fail a request: the cache is skipped and the model called.
+"""
+import asyncio
+import re
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, NamedTuple, Optional
+
+import xxhash
+from cachetools import TTLCache
+
+from app.core.config import settings
+from app.core.metrics import registry
+from app.database.repositories import response_cache_entries
+
+_hits = registry.counter("response_cache_hits_total", "Model answers served from the response cache.")
+_misses = registry.counter("response_cache_misses_total", "Response cache lookups that fell through to the model.")
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+class CachedAnswer(NamedTuple):
+    text: str
+    model: str # The model that produced the answer
+
+# Keys currently being computed -> future resolved with the answer
+_pending: Dict[str, asyncio.Future] = {}
+
+# Sized by the length of the cached answers, not the number of entries
+_memory: TTLCache = TTLCache(
+    maxsize=settings.RESPONSE_CACHE_MAX_BYTES,
+    ttl=settings.RESPONSE_CACHE_TTL_SECONDS,
+    getsizeof=lambda answer: len(answer.text.encode("utf-8")),
+)
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Collapses runs of whitespace so trivially different prompts share a key."""
+    return _WHITESPACE.sub(" ", prompt).strip()
+
+
+def cache_key(
+    model: str, prompt: str, image_bytes: Optional[bytes] = None, mime_type: Optional[str] = None, context: str = ""
+) -> str:
+    """
+    Content hash identifying one model request.
+
+    `context` identifies any conversation history sent along (SessionContext.digest()).
+    """
+    digest = xxhash.xxh3_128()
+    for part in (model, normalize_prompt(prompt), (mime_type or "") if image_bytes else "", context):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    if image_bytes:
+        digest.update(image_bytes)
+    return digest.hexdigest()
+
+
+async def get(key: str) -> Optional[CachedAnswer]:
+    """Returns the cached answer for `key`, or None."""
+    if not settings.RESPONSE_CACHE_ENABLED:
+        return None
+    answer = _memory.get(key)
+    if answer is not None:
+        _hits.inc(tier="memory")
+        return answer
+
+    if settings.RESPONSE_CACHE_MONGO_ENABLED:
+        try:
+            not_before = datetime.utcnow() - timedelta(seconds=settings.RESPONSE_CACHE_TTL_SECONDS)
+            doc = await response_cache_entries.get(key, not_before)
+        except Exception as e:
+            print(f"Response cache lookup failed: {e}")
+            doc = None
+        if doc is not None:
+            _hits.inc(tier="mongo")
+            answer = CachedAnswer(doc["response_text"], doc["model"])
+            _store_in_memory(key, answer)
+            return answer
+
+    _misses.inc()
+    return None
+
+
+async def put(key: str, model: str, text: Optional[str]) -> None:
+    """Caches a model answer (empty answers are not cached)."""
+    if not settings.RESPONSE_CACHE_ENABLED or not text:
+        return
+    _store_in_memory(key, CachedAnswer(text, model))
+    if settings.RESPONSE_CACHE_MONGO_ENABLED:
+        try:
+            await response_cache_entries.put(key, model, text)
+        except Exception as e:
+            print(f"Response cache write failed: {e}")
+
+
+async def get_or_compute(
+    key: str, compute: Callable[[], Awaitable[CachedAnswer]], use_cache: bool = True
+) -> CachedAnswer:
+    """
+    Returns the cached answer for `key`, or awaits `compute()` and caches its result.
+
+    Concurrent misses for the same key wait for a single `compute()` call. With
+    `use_cache=False` the cache is not read, but the fresh answer replaces the cached one.
+    """
+    if not settings.RESPONSE_CACHE_ENABLED:
+        return await compute()
+    if use_cache:
+        cached = await get(key)
+        if cached is not None:
+            return cached
+        pending = _pending.get(key)
+        if pending is not None:
+            try:
+                answer = await asyncio.shield(pending)
+                _hits.inc(tier="coalesced")
+                return answer
+            except asyncio.CancelledError:
+                if not pending.cancelled():
+                    raise
+                # The first request was cancelled: compute the answer ourselves
+
+    future = asyncio.get_running_loop().create_future()
+    _pending.setdefault(key, future)
+    try:
+        answer = await compute()
+    except BaseException as e:
+        if isinstance(e, asyncio.CancelledError):
+            future.cancel()
+        else:
+            future.set_exception(e)
+            future.exception()  # Retrieved here so waiter-less failures are not logged
+        raise
+    else:
+        future.set_result(answer)
+    finally:
+        if _pending.get(key) is future:
+            del _pending[key]
+    await put(key, answer.model, answer.text)
+    return answer
+
+
+def _store_in_memory(key: str, answer: CachedAnswer) -> None:
+    try:
+        _memory[key] = answer
+    except ValueError:
+        pass  # A single answer larger than the whole cache
+
+
+def clear() -> None:
+    """Empties the memory tier."""
+    _memory.clear()
+
+
+def stats() -> dict:
+    """Hit/miss counters and memory-tier usage."""
+    return {
+        "memory_hits": _hits.value(tier="memory"),
+        "mongo_hits": _hits.value(tier="mongo"),
+        "coalesced": _hits.value(tier="coalesced"),
+        "misses": _misses.value(),
+        "memory_entries": len(_memory),
+        "memory_bytes": _memory.currsize,
+    }
@@ -1,24 +1,41 @@
 from fastapi import APIRouter, HTTPException, status, Depends
 from fastapi.security import OAuth2PasswordRequestForm
 from app.database.models import User
+from app.database.repositories import users
 from app.schemas.user import UserCreate, Token
-from app.core.security import get_password_hash, verify_password, create_access_token
+from app.core.security import (
+    hash_password_in_pool, verify_password_in_pool, create_access_token, PasswordHashingBusyError
+)
 from app.core.config import settings # Ensure this is imported for settings access
 from datetime import timedelta
+from pymongo.errors import DuplicateKeyError
 
 router = APIRouter(prefix="/auth", tags=["Authentication"])
 
+
+def hashing_busy_http(error: PasswordHashingBusyError) -> HTTPException:
+    """All password-hashing workers are busy: ask the client to retry shortly."""
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail=f"Authentication service is busy: {error}",
+        headers={"Retry-After": "1"},
+    )
+
+
 @router.post("/signup", response_model=Token)
 async def signup(user_data: UserCreate):
     """Register a new user and return an access token."""
     
-    if User.objects(email=user_data.email).first():
+    if await users.email_exists(user_data.email):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Email already registered")
-    if User.objects(username=user_data.username).first(): # Check unique username
+    if await users.username_exists(user_data.username): # Check unique username
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Username already taken")
 
     # Hash Password and Create User
-    hashed_password = get_password_hash(user_data.password)
+    try:
+        hashed_password = await hash_password_in_pool(user_data.password)
+    except PasswordHashingBusyError as e:
+        raise hashing_busy_http(e)
     user = User(
         email=user_data.email, 
         username=user_data.username, # NEW
@@ -26,12 +43,16 @@ async def signup(user_data: UserCreate):
         dob=user_data.dob, # NEW
         hashed_password=hashed_password
     )
-    user.save()
+    try:
+        user_id = await users.create(user)
+    except DuplicateKeyError:
+        # Lost a race with a concurrent signup for the same email/username
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Email or username already registered")
     
     # 3. Create Access Token
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"user_id": str(user.id)},
+        data={"user_id": user_id},
         expires_delta=access_token_expires
     )
     
@@ -42,10 +63,14 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends()):
     """Authenticate user with email (username) and password."""
     
     # 1. Find User by email (username is the email field in the OAuth2 form)
-    user = User.objects(email=form_data.username).first()
+    user = await users.find_by_email(form_data.username)
     
     # 2. Verify Credentials
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    try:
+        valid = user is not None and await verify_password_in_pool(form_data.password, user["hashed_password"])
+    except PasswordHashingBusyError as e:
+        raise hashing_busy_http(e)
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
@@ -55,7 +80,7 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends()):
     # 3. Create Access Token
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"user_id": str(user.id)},
+        data={"user_id": str(user["_id"])},
         expires_delta=access_token_expires
     )
     
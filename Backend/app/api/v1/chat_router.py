@@ -1,28 +1,247 @@
 # app/api/endpoints/chat_router.py
 
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Depends, status
-from typing import Optional, List, Annotated
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Depends, WebSocket, WebSocketDisconnect, status
+from fastapi.responses import StreamingResponse
+from typing import Optional, List, Annotated, Tuple, AsyncIterator, Union, NamedTuple
 from uuid import uuid4
-from datetime import datetime
+from datetime import datetime, timezone
+from contextlib import aclosing, suppress
+import asyncio
+import json
+import time
 
 # Import logic components (Adjust paths as needed for your project structure)
-from app.agents.multimodal_agent import process_multimodal_request
-from app.agents.image_handler import upload_image_to_cloudinary
+from app.agents.multimodal_agent import (
+    process_multimodal_request, stream_multimodal_request, ModelBusyError, ModelTimeoutError, TokenUsage
+)
+from app.agents.model_router import primary_model
+from app.agents import conversation_context
+from app.agents.conversation_context import SessionContext
+from app.agents import image_store
+from app.agents.image_store import StoredImage
+from app.agents.image_ingestion import (
+    ingest_image_upload, ingest_image_bytes, IngestedImage, ImageTooLargeError, UnsupportedImageError
+)
+from app.agents.image_preprocessing import preprocess_image_for_model
 from app.database.models import ConversationHistory
+from app.database.history_writer import history_writer
+from app.database.repositories import conversations
 from app.schemas.chat import HistoryItem, ChatResponse 
-from app.core.security import get_current_user_id 
+from app.core.security import get_current_user_id, authenticate_token
+from app.core import rate_limit
+from app.core.concurrency import ConcurrencyLimitExceeded
+from app.core.config import settings
+from app.core.metrics import registry
+from bson import ObjectId
 
 router = APIRouter(prefix="/chat", tags=["AI Chat"])
 
+# Per-stage timings: tell whether a slow request spent its time in Gemini, Cloudinary or MongoDB.
+# Stages: file_read, image_preprocess, cloudinary_upload, context_load, model_call, history_save, history_fetch
+chat_stage_seconds = registry.histogram("chat_stage_duration_seconds", "Time spent in each stage of a chat request.")
+chat_stage_failures = registry.counter("chat_stage_failures_total", "Chat stages that failed (including failures the client never sees).")
+
 # --- Helper Function for History Retrieval (Only for Logged-in Users) ---
 
-def retrieve_user_history(user_id: str) -> List[HistoryItem]:
-    """Retrieves chat history ONLY for the given logged-in user."""
-    # Retrieve up to the last 10 entries for the user, ordered by time
-    history_docs = ConversationHistory.objects(user_id=user_id).order_by('-timestamp').limit(10)
+# Sorts after every real ObjectId: "(timestamp, MAX_OBJECT_ID)" means "strictly after timestamp"
+MAX_OBJECT_ID = ObjectId("f" * 24)
+
+
+def parse_history_since(history_since: Optional[str]) -> Optional[Union[ObjectId, datetime]]:
+    """
+    Parses the client's last-seen marker: a turn id or an ISO-8601 timestamp.
+    
+    Raises:
+        HTTPException: 400 if the value is neither.
+    """
+    if not history_since:
+        return None
+    if ObjectId.is_valid(history_since):
+        return ObjectId(history_since)
+    try:
+        since = datetime.fromisoformat(history_since)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="history_since must be a turn id or an ISO-8601 timestamp."
+        )
+    # Stored timestamps are naive UTC
+    if since.tzinfo is not None:
+        since = since.astimezone(timezone.utc).replace(tzinfo=None)
+    return since
+
+
+async def retrieve_user_history(
+    user_id: str, since: Optional[Union[ObjectId, datetime]] = None
+) -> List[HistoryItem]:
+    """
+    Retrieves chat history ONLY for the given logged-in user, most recent first.
+    
+    Args:
+        since: Last turn id / timestamp the client has seen. When given, only
+            newer turns are returned (delta sync); an unknown turn id falls back
+            to the latest turns.
+    """
+    after = None
+    if isinstance(since, datetime):
+        after = (since, MAX_OBJECT_ID)
+    elif isinstance(since, ObjectId):
+        seen = await conversations.get_for_user(user_id, str(since), projection={"timestamp": 1})
+        if seen is not None:
+            after = (seen["timestamp"], since)
+
+    if after is not None:
+        history_docs, _ = await conversations.page_for_user(user_id, settings.HISTORY_DELTA_MAX_ITEMS, after=after)
+    else:
+        # Retrieve up to the last 10 entries for the user, ordered by time
+        history_docs = await conversations.recent_for_user(user_id, limit=10)
     
     # Convert MongoDB documents to Pydantic models (using model_validate for safety)
-    return [HistoryItem.model_validate(doc.to_mongo()) for doc in history_docs]
+    return [HistoryItem.model_validate(doc) for doc in history_docs]
+
+
+def resolve_identity(current_user_id: Optional[str]) -> Tuple[Optional[str], str, bool]:
+    """Returns (user_id_to_store, session_id, is_anonymous) for the caller."""
+    if current_user_id is not None:
+        return current_user_id, str(current_user_id), False
+    return None, str(uuid4()), True
+
+
+async def read_image_and_start_upload(
+    image_file: Optional[UploadFile]
+) -> Tuple[Optional[bytes], str, Optional["asyncio.Task[StoredImage]"]]:
+    """
+    Ingests the uploaded image once, starts storing it in the background
+    and prepares the downscaled copy sent to the model.
+    
+    The original upload is stored in Cloudinary (once per distinct image, see
+    image_store); only the model receives the re-encoded image. Storing runs
+    concurrently with preprocessing and the model call; collect the stored image
+    with `finish_image_upload` once the answer is ready.
+    
+    Returns:
+        (model_image_bytes, mime_type, upload_task). Bytes and task are None when no image was sent.
+    
+    Raises:
+        HTTPException: 413 if the image is too large, 415 if it is not a supported image.
+    """
+    if not (image_file and image_file.filename):
+        return None, "image/jpeg", None
+
+    try:
+        with chat_stage_seconds.time(stage="file_read"):
+            image = await ingest_image_upload(image_file)
+    except ImageTooLargeError as e:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(e))
+    except UnsupportedImageError as e:
+        raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, detail=str(e))
+    return await start_image_processing(image)
+
+
+async def start_image_processing(image: IngestedImage) -> Tuple[bytes, str, "asyncio.Task[StoredImage]"]:
+    """Starts storing an ingested image in the background and prepares the copy sent to the model."""
+    # Upload to Cloudinary unless already stored (overlaps with preprocessing and the model call)
+    upload_task = asyncio.create_task(timed_image_upload(image.data, image.mime_type))
+
+    with chat_stage_seconds.time(stage="image_preprocess"):
+        model_image = await preprocess_image_for_model(image.data, image.mime_type)
+    return model_image.data, model_image.mime_type, upload_task
+
+
+async def timed_image_upload(image_bytes: bytes, mime_type: Optional[str] = None) -> StoredImage:
+    """Image store lookup and (for new images) Cloudinary upload, recorded as the cloudinary_upload stage."""
+    with chat_stage_seconds.time(stage="cloudinary_upload"):
+        return await image_store.store(image_bytes, mime_type)
+
+
+async def finish_image_upload(upload_task: Optional["asyncio.Task[StoredImage]"]) -> Optional[StoredImage]:
+    """Waits for a background upload and returns the stored image (None if absent or failed)."""
+    if upload_task is None:
+        return None
+    try:
+        return await upload_task
+    except Exception as e:
+        chat_stage_failures.inc(stage="cloudinary_upload")
+        print(f"Cloudinary upload failed: {e}")
+        return None
+
+
+def cancel_image_upload(upload_task: Optional["asyncio.Task[StoredImage]"]) -> None:
+    """Drops a background upload whose turn will not be saved."""
+    if upload_task is not None and not upload_task.done():
+        upload_task.cancel()
+
+
+def model_error_to_http(error: Exception) -> HTTPException:
+    """Maps an exception raised by the agent layer to the HTTP error returned to the client."""
+    chat_stage_failures.inc(stage="model_call")
+    if isinstance(error, ModelBusyError): # All model slots busy for too long: ask the client to retry
+        return HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=f"AI service is busy: {error}", headers={"Retry-After": "1"})
+    if isinstance(error, ModelTimeoutError):
+        return HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail=f"AI processing timed out: {error}")
+    if isinstance(error, RuntimeError): # Catch the specific exception raised in multimodal_agent.py
+        return HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"AI processing failed: {error}")
+    return HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="An unexpected error occurred during AI processing.")
+
+
+async def load_conversation_context(session_id: str, user_id: Optional[str]) -> Optional[SessionContext]:
+    """Prior turns for the model (logged-in users only). Failures only cost the context."""
+    if user_id is None or not settings.CONTEXT_ENABLED:
+        return None
+    try:
+        with chat_stage_seconds.time(stage="context_load"):
+            return await conversation_context.load_context(session_id, user_id)
+    except Exception as e:
+        chat_stage_failures.inc(stage="context_load")
+        print(f"Error loading conversation context for user {user_id}: {e}")
+        return None
+
+
+async def save_conversation_turn(
+    session_id: str,
+    user_id: Optional[str],
+    is_anonymous: bool,
+    user_input_text: str,
+    ai_response: str,
+    image: Optional[StoredImage],
+    context: Optional[SessionContext] = None,
+    has_image: bool = False,
+    model_used: Optional[str] = None,
+) -> Optional[str]:
+    """
+    Persists one user/AI turn. Failures are logged, never raised to the client.
+    
+    The turn is queued on the write-behind buffer, so its id is known before
+    it reaches MongoDB. The turn is also appended to the session's conversation context, if any.
+    
+    Returns:
+        The new turn's id, or None if it could not be saved.
+    """
+    timestamp = datetime.utcnow()
+    turn_id = None
+    turn = ConversationHistory(
+        session_id=session_id,
+        user_id=user_id,           
+        is_anonymous=is_anonymous,     
+        user_input_text=user_input_text,
+        ai_response_text=ai_response,
+        image_url=image.url if image else None,
+        image_digest=image.digest if image else None,
+        model_used=model_used or primary_model(),
+        timestamp=timestamp
+    )
+    try:
+        with chat_stage_seconds.time(stage="history_save"):
+            turn_id = await history_writer.save(turn)
+    except Exception as e:
+        chat_stage_failures.inc(stage="history_save")
+        print(f"Error saving conversation history: {e}")
+
+    if context is not None:
+        conversation_context.record_turn(
+            session_id, context, user_input_text, ai_response, has_image=has_image, turn_id=turn_id, timestamp=timestamp
+        )
+    return turn_id
 
 
 @router.post("/", response_model=ChatResponse)
@@ -33,20 +252,18 @@ async def chat_endpoint(
     # FIX APPLIED HERE: Default value (= None) is set outside the Annotated type.
     image_file: Annotated[Optional[UploadFile], File()] = None, 
     
+    # History echo is opt-in: either the latest turns, or only turns newer than history_since
+    include_history: Annotated[bool, Form()] = False,
+    history_since: Annotated[Optional[str], Form()] = None,
+    # Skip the response cache and force a fresh model answer
+    no_cache: Annotated[bool, Form()] = False,
+    
     current_user_id: Optional[str] = Depends(get_current_user_id),
 ):
     
     # --- 1. Identity & Session Setup ---
     is_logged_in = current_user_id is not None
-    
-    if is_logged_in:
-        user_id_to_store = current_user_id
-        current_session_id = str(current_user_id)
-        is_anonymous_flag = False
-    else:
-        user_id_to_store = None
-        current_session_id = str(uuid4())
-        is_anonymous_flag = True
+    user_id_to_store, current_session_id, is_anonymous_flag = resolve_identity(current_user_id)
 
     # --- 2. Initial Input Validation ---
     if not user_input_text.strip() and not image_file:
@@ -54,71 +271,432 @@ async def chat_endpoint(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Must provide either text input or an image file."
         )
+    history_since_marker = parse_history_since(history_since)
         
-    # --- 3. Image Processing & Cloudinary Upload ---
-    image_bytes = None
-    image_url_to_save: Optional[str] = None
-    image_mime_type = "image/jpeg" 
-    
-    if image_file and image_file.filename:
-        # Get MIME Type
-        if image_file.content_type:
-            image_mime_type = image_file.content_type
-            
-        try:
-            # a. Read bytes for the LLM agent (Consumes the stream)
-            image_bytes = await image_file.read() 
-            
-            # b. Reset stream for the Cloudinary uploader
-            await image_file.seek(0) 
-            
-            # c. Upload to Cloudinary
-            image_url_to_save = await upload_image_to_cloudinary(image_file)
-            
-        except Exception as e:
-            print(f"Cloudinary upload/file read failed: {e}")
-            image_bytes = None 
-            if not user_input_text.strip():
-                 raise HTTPException(status_code=500, detail="Image upload failed and no text was provided.")
-
+    # --- 3. Image Processing & Cloudinary Upload (runs alongside the model call) ---
+    image_bytes, image_mime_type, upload_task = await read_image_and_start_upload(image_file)
 
-    # --- 4. Call AI Logic ---
+    # --- 4. Call AI Logic (with the conversation so far, for logged-in users) ---
+    context = await load_conversation_context(current_session_id, current_user_id)
+    usage = TokenUsage()
     try:
-        ai_response = await process_multimodal_request(
-            text_input=user_input_text, 
-            image_bytes=image_bytes,
-            mime_type=image_mime_type # Passed for best model performance
-        )
-    except RuntimeError as e: # Catch the specific exception raised in multimodal_agent.py
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"AI processing failed: {e}")
-    except Exception:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="An unexpected error occurred during AI processing.")
+        with chat_stage_seconds.time(stage="model_call"):
+            ai_response = await process_multimodal_request(
+                text_input=user_input_text, 
+                image_bytes=image_bytes,
+                mime_type=image_mime_type, # Passed for best model performance
+                use_cache=not no_cache,
+                context=context,
+                usage=usage
+            )
+    except Exception as e:
+        cancel_image_upload(upload_task)
+        raise model_error_to_http(e)
 
+    stored_image = await finish_image_upload(upload_task)
 
     # --- 5. Store History ---
-    try:
-        ConversationHistory(
-            session_id=current_session_id,
-            user_id=user_id_to_store,           
-            is_anonymous=is_anonymous_flag,     
-            user_input_text=user_input_text,
-            ai_response_text=ai_response,
-            image_url=image_url_to_save,
-            model_used="gemini-2.5-flash",
-            timestamp=datetime.utcnow()
-        ).save()
-    except Exception as e:
-        print(f"Error saving conversation history: {e}")
+    turn_id = await save_conversation_turn(
+        current_session_id, user_id_to_store, is_anonymous_flag,
+        user_input_text, ai_response, stored_image,
+        context=context, has_image=image_bytes is not None, model_used=usage.model_used
+    )
 
-    # --- 6. Retrieve History (CONDITIONALLY) ---
+    # --- 6. Retrieve History (CONDITIONALLY: logged in and asked for it) ---
     user_history = []
-    if is_logged_in:
-        user_history = retrieve_user_history(current_user_id)
+    if is_logged_in and (include_history or history_since_marker is not None):
+        with chat_stage_seconds.time(stage="history_fetch"):
+            await history_writer.flush() # The echo includes the turn just queued
+            user_history = await retrieve_user_history(current_user_id, since=history_since_marker)
 
     # --- 7. Return Response ---
     return ChatResponse(
         session_id=current_session_id, 
         ai_response=ai_response,
-        model_used="gemini-2.5-flash",
+        model_used=usage.model_used or primary_model(),
+        turn_id=turn_id,
+        prompt_tokens=usage.prompt_tokens,
+        context_turns=usage.context_turns,
         chat_history=user_history
-    )
\ No newline at end of file
+    )
+
+
+# --- Streaming Variant (Server-Sent Events) ---
+
+def _sse(event: str, payload: dict) -> str:
+    """Formats one Server-Sent Event frame."""
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+
+stream_first_chunk_seconds = registry.histogram(
+    "chat_stream_first_chunk_seconds", "Time from request to the first streamed model chunk."
+)
+
+
+async def stream_chat_turn(
+    session_id: str,
+    user_id: Optional[str],
+    is_anonymous: bool,
+    user_input_text: str,
+    image_bytes: Optional[bytes],
+    image_mime_type: str,
+    upload_task: Optional["asyncio.Task[StoredImage]"],
+    context: Optional[SessionContext],
+    no_cache: bool,
+    start: float,
+) -> AsyncIterator[Tuple[str, dict]]:
+    """
+    Streams one chat turn as (event, payload) pairs, shared by the SSE and WebSocket channels.
+
+    Events:
+        chunk: {"text": ...} for every piece of text produced by the model.
+        done:  {"session_id": ..., "model_used": ..., "turn_id": ..., "prompt_tokens": ..., "context_turns": ...}
+               once the answer is complete and saved.
+        error: {"detail": ..., "status": ...} if the model call fails mid-stream.
+    
+    Closing the generator early (client gone) closes the upstream model stream
+    and saves nothing.
+    """
+    chunks: List[str] = []
+    usage = TokenUsage()
+    model_stream = stream_multimodal_request(
+        text_input=user_input_text,
+        image_bytes=image_bytes,
+        mime_type=image_mime_type,
+        use_cache=not no_cache,
+        context=context,
+        usage=usage
+    )
+    completed = False
+    model_start = time.perf_counter()
+    try:
+        # aclosing() guarantees the upstream call is torn down on disconnect/cancel
+        async with aclosing(model_stream):
+            async for text in model_stream:
+                if not chunks:
+                    stream_first_chunk_seconds.observe(time.perf_counter() - start)
+                chunks.append(text)
+                yield "chunk", {"text": text}
+        completed = True
+        chat_stage_seconds.observe(time.perf_counter() - model_start, stage="model_call")
+    except Exception as e:
+        error = model_error_to_http(e)
+        yield "error", {"detail": error.detail, "status": error.status_code}
+        return
+    finally:
+        if not completed:
+            cancel_image_upload(upload_task)
+
+    stored_image = await finish_image_upload(upload_task)
+    turn_id = await save_conversation_turn(
+        session_id, user_id, is_anonymous,
+        user_input_text, "".join(chunks), stored_image,
+        context=context, has_image=image_bytes is not None, model_used=usage.model_used
+    )
+    yield "done", {
+        "session_id": session_id, "model_used": usage.model_used or primary_model(), "turn_id": turn_id,
+        "prompt_tokens": usage.prompt_tokens, "context_turns": usage.context_turns,
+    }
+
+
+@router.post("/stream")
+async def chat_stream_endpoint(
+    user_input_text: Annotated[str, Form()] = "", 
+    image_file: Annotated[Optional[UploadFile], File()] = None, 
+    no_cache: Annotated[bool, Form()] = False,
+    current_user_id: Optional[str] = Depends(get_current_user_id),
+):
+    """
+    Streams the model answer as Server-Sent Events.
+    
+    Events:
+        chunk: {"text": ...} for every piece of text produced by the model.
+        done:  {"session_id": ..., "model_used": ..., "turn_id": ..., "prompt_tokens": ..., "context_turns": ...}
+               once the answer is complete.
+        error: {"detail": ..., "status": ...} if the model call fails mid-stream.
+    
+    The assembled answer is saved to the conversation history when the stream
+    completes. If the client disconnects, the upstream model stream is closed
+    and nothing is saved.
+    """
+    start = time.perf_counter()
+    user_id_to_store, current_session_id, is_anonymous_flag = resolve_identity(current_user_id)
+
+    if not user_input_text.strip() and not image_file:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Must provide either text input or an image file."
+        )
+
+    image_bytes, image_mime_type, upload_task = await read_image_and_start_upload(image_file)
+    context = await load_conversation_context(current_session_id, current_user_id)
+
+    async def event_stream() -> AsyncIterator[str]:
+        turn = stream_chat_turn(
+            current_session_id, user_id_to_store, is_anonymous_flag, user_input_text,
+            image_bytes, image_mime_type, upload_task, context, no_cache, start
+        )
+        async with aclosing(turn):
+            async for event, payload in turn:
+                yield _sse(event, payload)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# --- Persistent Channel (WebSocket) ---
+
+chat_ws_connections = registry.gauge("chat_ws_connections", "Open chat WebSocket connections.")
+chat_ws_messages = registry.counter(
+    "chat_ws_messages_total", "Chat messages received over WebSockets, by outcome (answered/error/rejected)."
+)
+
+
+class WsChatMessage(NamedTuple):
+    id: Optional[Union[str, int]] # Client's id, echoed on every frame answering this message
+    text: str
+    image: Optional[bytes] # The binary frame sent just before, if any
+    no_cache: bool
+    received_at: float
+
+
+class SlowClientError(Exception):
+    """A frame could not be sent within CHAT_WS_SEND_TIMEOUT_SECONDS: the client stopped reading."""
+
+
+class ChatChannel:
+    """
+    One chat WebSocket: the caller is authenticated and the session context loaded
+    once, then shared by every message on the connection.
+
+    A reader task takes frames off the socket (and sends heartbeats) while an
+    answering task works through queued messages one at a time, in order.
+    """
+
+    def __init__(self, websocket: WebSocket, user_id: Optional[str], expires_at: Optional[float], caller: str):
+        self.websocket = websocket
+        self.user_id = user_id
+        self.expires_at = expires_at # Token expiry (Unix time); None for anonymous connections
+        self.caller = caller # Rate-limit key, as for HTTP chat requests
+        self.user_id_to_store, self.session_id, self.is_anonymous = resolve_identity(user_id)
+        self.context: Optional[SessionContext] = None
+        self.queue: "asyncio.Queue[WsChatMessage]" = asyncio.Queue(maxsize=settings.CHAT_WS_MAX_PENDING_MESSAGES)
+        self.pending_image: Optional[bytes] = None
+        self.answering = False
+        self.last_activity = time.monotonic()
+        self._send_lock = asyncio.Lock()
+
+    async def send(self, frame: dict) -> None:
+        """
+        Sends one JSON frame. A client that does not read blocks the send (and so
+        the model stream feeding it) until the timeout.
+
+        Raises:
+            SlowClientError: The frame was not sent within CHAT_WS_SEND_TIMEOUT_SECONDS.
+        """
+        async def locked_send() -> None:
+            async with self._send_lock:
+                await self.websocket.send_text(json.dumps(frame))
+
+        try:
+            await asyncio.wait_for(locked_send(), settings.CHAT_WS_SEND_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            raise SlowClientError() from None
+
+    async def send_error(self, message_id: Optional[Union[str, int]], status_code: int, detail: str, **extra) -> None:
+        await self.send({"type": "error", "id": message_id, "status": status_code, "detail": detail, **extra})
+
+    async def run(self) -> Optional[Tuple[int, str]]:
+        """
+        Serves the connection until it ends.
+
+        Returns:
+            (close code, reason) when the server ends the connection, None when the client left.
+        """
+        tasks: List[asyncio.Task] = []
+        try:
+            self.context = await load_conversation_context(self.session_id, self.user_id)
+            await self.send({"type": "ready", "session_id": self.session_id, "anonymous": self.is_anonymous})
+            tasks = [asyncio.create_task(self._read_frames()), asyncio.create_task(self._answer_messages())]
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            return done.pop().result()
+        except SlowClientError:
+            return 1008, "client is not reading"
+        except (WebSocketDisconnect, OSError):
+            return None
+        except Exception as e:
+            print(f"Chat WebSocket failed for session {self.session_id}: {e}")
+            return 1011, "internal error"
+        finally:
+            # An answer still streaming is abandoned like a disconnected SSE stream: nothing is saved
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    # --- Reading ---
+
+    async def _read_frames(self) -> Optional[Tuple[int, str]]:
+        while True:
+            try:
+                message = await asyncio.wait_for(self.websocket.receive(), settings.CHAT_WS_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                if self.answering or not self.queue.empty():
+                    continue # Answer frames are traffic enough
+                if time.monotonic() - self.last_activity >= settings.CHAT_WS_IDLE_TIMEOUT_SECONDS:
+                    return 1000, "idle timeout"
+                await self.send({"type": "ping"})
+                continue
+
+            if message["type"] == "websocket.disconnect":
+                return None
+            self.last_activity = time.monotonic()
+            if message.get("bytes") is not None:
+                # Attached to the next chat message
+                self.pending_image = message["bytes"]
+                continue
+            close = await self._on_text_frame(message.get("text") or "")
+            if close is not None:
+                return close
+
+    async def _on_text_frame(self, text: str) -> Optional[Tuple[int, str]]:
+        try:
+            frame = json.loads(text)
+        except ValueError:
+            frame = None
+        if not isinstance(frame, dict):
+            await self.send_error(None, status.HTTP_400_BAD_REQUEST, "Frames must be JSON objects.")
+            return None
+
+        kind, message_id = frame.get("type"), frame.get("id")
+        if kind == "ping":
+            await self.send({"type": "pong"})
+            return None
+        if kind == "pong":
+            return None
+        if kind != "chat":
+            await self.send_error(message_id, status.HTTP_400_BAD_REQUEST, "Unknown frame type; expected chat, ping or pong.")
+            return None
+
+        if self.expires_at is not None and time.time() >= self.expires_at:
+            await self.send_error(message_id, status.HTTP_401_UNAUTHORIZED, "Token expired. Reconnect with a new token.")
+            return 1008, "token expired"
+
+        message = WsChatMessage(
+            id=message_id, text=str(frame.get("text") or ""), image=self.pending_image,
+            no_cache=bool(frame.get("no_cache")), received_at=time.perf_counter(),
+        )
+        self.pending_image = None
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            chat_ws_messages.inc(outcome="rejected")
+            await self.send_error(
+                message_id, status.HTTP_429_TOO_MANY_REQUESTS,
+                "Too many messages waiting for an answer. Wait for the pending ones first."
+            )
+        return None
+
+    # --- Answering ---
+
+    async def _answer_messages(self) -> None:
+        while True:
+            message = await self.queue.get()
+            self.answering = True
+            try:
+                outcome = await self._answer(message)
+            finally:
+                self.answering = False
+                self.last_activity = time.monotonic()
+            chat_ws_messages.inc(outcome=outcome)
+
+    async def _answer(self, message: WsChatMessage) -> str:
+        """Answers one message with the same checks as a chat request; errors become error frames."""
+        try:
+            if not message.text.strip() and message.image is None:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST, detail="Must provide either text input or an image file."
+                )
+            if settings.RATE_LIMIT_ENABLED:
+                budget = rate_limit.image_budget() if message.image is not None else rate_limit.text_budget()
+                await rate_limit.check_budget(budget, self.caller)
+            async with rate_limit.chat_admission.slot():
+                return await self._stream_answer(message)
+        except HTTPException as e:
+            retry_after = (e.headers or {}).get("Retry-After")
+            extra = {"retry_after": int(retry_after)} if retry_after else {}
+            await self.send_error(message.id, e.status_code, e.detail, **extra)
+        except ConcurrencyLimitExceeded:
+            await self.send_error(
+                message.id, status.HTTP_503_SERVICE_UNAVAILABLE, "Server is at capacity. Please retry shortly.", retry_after=1
+            )
+        return "error"
+
+    async def _stream_answer(self, message: WsChatMessage) -> str:
+        image_bytes, image_mime_type, upload_task = None, "image/jpeg", None
+        if message.image is not None:
+            try:
+                image = ingest_image_bytes(message.image)
+            except ImageTooLargeError as e:
+                raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(e))
+            except UnsupportedImageError as e:
+                raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, detail=str(e))
+            image_bytes, image_mime_type, upload_task = await start_image_processing(image)
+
+        outcome = "answered"
+        turn = stream_chat_turn(
+            self.session_id, self.user_id_to_store, self.is_anonymous, message.text,
+            image_bytes, image_mime_type, upload_task, self.context, message.no_cache, message.received_at
+        )
+        async with aclosing(turn):
+            async for event, payload in turn:
+                if event == "error":
+                    outcome = "error"
+                await self.send({"type": event, "id": message.id, **payload})
+        return outcome
+
+
+@router.websocket("/ws")
+async def chat_websocket(websocket: WebSocket, token: Optional[str] = None):
+    """
+    Persistent chat channel: authenticate once, then send any number of messages.
+
+    The token comes from an `Authorization: Bearer` header or, for browsers (which
+    cannot set headers on WebSockets), the `token` query parameter. Without a
+    valid token the connection is anonymous, with one session for its lifetime.
+
+    Client frames:
+        binary: an image, attached to the next chat message.
+        {"type": "chat", "id": ..., "text": ..., "no_cache": false}
+        {"type": "ping"} / {"type": "pong"}
+    Server frames:
+        {"type": "ready", "session_id": ..., "anonymous": ...} once connected.
+        {"type": "chunk" | "done" | "error", "id": ..., ...} per message, as in /chat/stream.
+            Errors also carry the HTTP "status" (and "retry_after" for 429/503); the connection stays open.
+        {"type": "ping"} after CHAT_WS_HEARTBEAT_SECONDS without traffic; {"type": "pong"} to a ping.
+
+    Messages are answered one at a time, in order. Up to CHAT_WS_MAX_PENDING_MESSAGES
+    wait behind the one being answered; further ones get a 429 error frame. Each
+    message is rate-limited and admitted like a chat request. The server closes
+    connections idle for CHAT_WS_IDLE_TIMEOUT_SECONDS (1000), clients that stop
+    reading (1008) and connections whose token has expired (1008).
+    """
+    scheme, _, credentials = websocket.headers.get("authorization", "").partition(" ")
+    if scheme.lower() == "bearer" and credentials:
+        token = credentials
+    decoded = await authenticate_token(token)
+    user_id = decoded.user_id if decoded is not None else None
+    caller = rate_limit.caller_key(websocket, user_id)
+
+    await websocket.accept()
+    channel = ChatChannel(websocket, user_id, decoded.expires_at if decoded is not None else None, caller)
+    chat_ws_connections.inc()
+    try:
+        close = await channel.run()
+    finally:
+        chat_ws_connections.dec()
+    if close is not None:
+        with suppress(Exception):
+            await asyncio.wait_for(websocket.close(*close), settings.CHAT_WS_SEND_TIMEOUT_SECONDS)
@@ -1,52 +1,149 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from typing import List
+import zlib
+from contextlib import aclosing
+from datetime import datetime
+from typing import Any, AsyncIterator, List, Literal, Optional
+
+import orjson
+import zstandard
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import ORJSONResponse, StreamingResponse
 
 # Import components from your project structure
-from app.core.security import get_current_user_id 
-from app.database.models import ConversationHistory
+from app.core.config import settings
+from app.core.pagination import encode_cursor, decode_cursor, InvalidCursorError
+from app.core.security import get_current_user_id
+from app.database.repositories import conversations
 from app.schemas.chat import HistoryItem #
 
 router = APIRouter(prefix="/history", tags=["Chat History"])
 
-# --- Helper Function (Reused from chat_router logic) ---
-
-def retrieve_user_history(user_id: str) -> List[HistoryItem]:
-    """Retrieves chat history ONLY for the given logged-in user, ordered by timestamp."""
-    
-    # Retrieve up to the last 50 entries for the user, ordered by time (most recent first)
-    history_docs = ConversationHistory.objects(user_id=user_id).order_by('-timestamp').limit(50)
-    
-    # Convert MongoDB documents to Pydantic models
-    # This uses the HistoryItem schema defined in chat.py
-    return [HistoryItem.model_validate(doc.to_mongo()) for doc in history_docs]
-
 
 @router.get("/", response_model=List[HistoryItem])
 async def get_all_chat_history(
+    limit: int = Query(
+        settings.HISTORY_DEFAULT_PAGE_SIZE, ge=1, le=settings.HISTORY_MAX_PAGE_SIZE,
+        description="Maximum number of turns to return."
+    ),
+    before: Optional[str] = Query(None, description="Cursor from X-Next-Cursor: return older turns."),
+    after: Optional[str] = Query(None, description="Cursor from X-Prev-Cursor: return newer turns."),
     # Requires an active JWT token to pass the user ID
     user_id: str = Depends(get_current_user_id),
-) -> List[HistoryItem]:
+) -> ORJSONResponse:
     """
-    Retrieves the chronological chat history for the currently logged-in user.
+    Retrieves the chat history for the currently logged-in user, most recent first.
+
+    Pages are keyset-paginated on (timestamp, _id). The response body is the
+    list of turns; the opaque cursors for neighbouring pages are returned in
+    the `X-Next-Cursor` (older turns, pass as `before`) and `X-Prev-Cursor`
+    (newer turns, pass as `after`) headers when such turns exist.
     """
-    
+
     # Ensure a user ID was successfully extracted from the token
     if not user_id:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Authentication failed. User ID not found in token."
         )
+    if before and after:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Use either 'before' or 'after', not both.")
 
     try:
-        # 1. Fetch history using the helper function
-        user_history = retrieve_user_history(user_id)
-        
-        # 2. Return the list of Pydantic models
-        return user_history
-        
+        before_key = decode_cursor(before) if before else None
+        after_key = decode_cursor(after) if after else None
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    try:
+        # 1. Fetch one page of history
+        docs, has_more = await conversations.page_for_user(user_id, limit, before=before_key, after=after_key)
     except Exception as e:
         print(f"Database error fetching history for user {user_id}: {e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to retrieve chat history from the database."
-        )
\ No newline at end of file
+        )
+
+    # 2. Cursors for the neighbouring pages
+    headers = {}
+    if docs:
+        if has_more or after_key is not None:
+            headers["X-Next-Cursor"] = encode_cursor(docs[-1]["timestamp"], docs[-1]["_id"])
+        if before_key is not None or (after_key is not None and has_more):
+            headers["X-Prev-Cursor"] = encode_cursor(docs[0]["timestamp"], docs[0]["_id"])
+
+    # 3. Validate against HistoryItem and serialize with orjson
+    items = [HistoryItem.model_validate(doc).model_dump() for doc in docs]
+    return ORJSONResponse(content=items, headers=headers)
+
+
+# media type and file extension per `compression`
+_EXPORT_FORMATS = {
+    "none": ("application/x-ndjson", "ndjson"),
+    "gzip": ("application/gzip", "ndjson.gz"),
+    "zstd": ("application/zstd", "ndjson.zst"),
+}
+
+
+def _compressor(compression: str) -> Any:
+    """A streaming compressor (`compress()` per chunk, `flush()` at the end), or None."""
+    if compression == "gzip":
+        return zlib.compressobj(settings.HISTORY_EXPORT_GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    if compression == "zstd":
+        return zstandard.ZstdCompressor(level=settings.HISTORY_EXPORT_ZSTD_LEVEL).compressobj()
+    return None
+
+
+async def _export_stream(user_id: str, compression: str) -> AsyncIterator[bytes]:
+    """
+    Serializes the user's turns as NDJSON, oldest first, in chunks of about
+    HISTORY_EXPORT_CHUNK_BYTES (compressed on the fly when asked to).
+
+    Only one cursor batch, one archive and one chunk are held at a time.
+    """
+    compressor = _compressor(compression)
+    buffer = bytearray()
+    turns = conversations.iter_for_user(user_id)
+    try:
+        async with aclosing(turns):
+            async for doc in turns:
+                buffer += orjson.dumps(HistoryItem.model_validate(doc).model_dump())
+                buffer += b"\n"
+                if len(buffer) >= settings.HISTORY_EXPORT_CHUNK_BYTES:
+                    chunk = compressor.compress(bytes(buffer)) if compressor else bytes(buffer)
+                    buffer.clear()
+                    if chunk:
+                        yield chunk
+    except Exception as e:
+        # The status line is already sent: aborting the stream is how the client learns the export is incomplete
+        print(f"Database error exporting history for user {user_id}: {e}")
+        raise
+    chunk = compressor.compress(bytes(buffer)) + compressor.flush() if compressor else bytes(buffer)
+    if chunk:
+        yield chunk
+
+
+@router.get("/export")
+async def export_chat_history(
+    compression: Literal["none", "gzip", "zstd"] = Query("none", description="Compress the stream on the fly."),
+    user_id: str = Depends(get_current_user_id),
+) -> StreamingResponse:
+    """
+    Downloads the full chat history of the logged-in user (archived turns
+    included) as NDJSON: one HistoryItem per line, oldest first.
+
+    The turns are streamed from a MongoDB cursor as they are read, so memory use
+    does not grow with the size of the history.
+    """
+    if not user_id:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Authentication failed. User ID not found in token."
+        )
+
+    media_type, extension = _EXPORT_FORMATS[compression]
+    filename = f"chat-history-{datetime.utcnow():%Y%m%d}.{extension}"
+    return StreamingResponse(
+        _export_stream(user_id, compression),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"', "Cache-Control": "no-store"},
+    )
@@ -0,0 +1,90 @@
+"""
+Per-process caches for request authentication.
+
+- Token cache: raw JWT -> decoded user_id. Entries never outlive the token's
+  own `exp`, so an expired token is always re-decoded (and rejected).
+- User cache: user_id -> whether the account exists and is active.
+
+Both are bounded and expire after AUTH_CACHE_TTL_SECONDS. Invalidation is
+local to the process: after `invalidate_user()` other worker processes can
+still serve the old state for at most the TTL.
+"""
+import time
+from typing import NamedTuple, Optional
+
+from cachetools import TLRUCache, TTLCache
+
+from app.core.config import settings
+from app.core.metrics import registry
+
+_hits = registry.counter("auth_cache_hits_total", "Authentication cache hits.")
+_misses = registry.counter("auth_cache_misses_total", "Authentication cache misses.")
+
+
+class DecodedToken(NamedTuple):
+    user_id: Optional[str]
+    expires_at: float # Unix time
+
+
+def _token_ttu(_token: str, decoded: DecodedToken, now: float) -> float:
+    return min(now + settings.AUTH_CACHE_TTL_SECONDS, decoded.expires_at)
+
+
+# Token expiry is wall-clock based, so this cache runs on time.time rather than monotonic time
+_token_cache: TLRUCache = TLRUCache(maxsize=settings.AUTH_CACHE_MAX_ENTRIES, ttu=_token_ttu, timer=time.time)
+_user_cache: TTLCache = TTLCache(maxsize=settings.AUTH_CACHE_MAX_ENTRIES, ttl=settings.AUTH_CACHE_TTL_SECONDS)
+
+_MISSING = object()
+
+
+def get_decoded_token(token: str) -> Optional[DecodedToken]:
+    if not settings.AUTH_CACHE_ENABLED:
+        return None
+    decoded = _token_cache.get(token)
+    (_hits if decoded is not None else _misses).inc(cache="token")
+    return decoded
+
+
+def put_decoded_token(token: str, decoded: DecodedToken) -> None:
+    if settings.AUTH_CACHE_ENABLED and decoded.expires_at > time.time():
+        _token_cache[token] = decoded
+
+
+def get_user_active(user_id: str) -> Optional[bool]:
+    """Returns the cached active flag (False also covers deleted users), or None on a miss."""
+    if not settings.AUTH_CACHE_ENABLED:
+        return None
+    active = _user_cache.get(user_id, _MISSING)
+    if active is _MISSING:
+        _misses.inc(cache="user")
+        return None
+    _hits.inc(cache="user")
+    return active
+
+
+def put_user_active(user_id: str, active: bool) -> None:
+    if settings.AUTH_CACHE_ENABLED:
+        _user_cache[user_id] = active
+
+
+def invalidate_user(user_id: str) -> None:
+    """Drops the cached state of one user; call after deleting or deactivating them."""
+    _user_cache.pop(user_id, None)
+
+
+def clear() -> None:
+    """Empties both caches."""
+    _token_cache.clear()
+    _user_cache.clear()
+
+
+def stats() -> dict:
+    """Hit/miss counters and current sizes, per cache."""
+    return {
+        name: {
+            "hits": _hits.value(cache=name),
+            "misses": _misses.value(cache=name),
+            "size": len(cache),
+        }
+        for name, cache in (("token", _token_cache), ("user", _user_cache))
+    }
@@ -0,0 +1,77 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+from app.core.metrics import registry
+
+
+class ConcurrencyLimitExceeded(RuntimeError):
+    """Raised when a slot could not be acquired within the queue timeout, or the queue is full."""
+
+
+class ConcurrencyLimiter:
+    """
+    Bounded per-process concurrency gate with queue metrics.
+
+    Callers wait (FIFO) for one of `limit` slots. The number of waiters, the
+    number of in-flight holders and the time spent waiting are exported as
+    `<name>_queue_depth`, `<name>_in_flight` and `<name>_wait_seconds`.
+    With `max_waiting` set, callers arriving at a full queue are rejected
+    immediately instead of waiting.
+    """
+
+    def __init__(self, name: str, limit: int, queue_timeout: Optional[float] = None, max_waiting: Optional[int] = None):
+        self.name = name
+        self.limit = max(1, limit)
+        self.queue_timeout = queue_timeout
+        self.max_waiting = max_waiting
+        self.waiting = 0
+        self.in_flight = 0
+        self._semaphore = asyncio.Semaphore(self.limit)
+
+        self._queue_depth = registry.gauge(f"{name}_queue_depth", f"Callers waiting for a {name} slot.")
+        self._in_flight = registry.gauge(f"{name}_in_flight", f"Callers currently holding a {name} slot.")
+        self._wait_seconds = registry.histogram(f"{name}_wait_seconds", f"Time spent waiting for a {name} slot.")
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """
+        Holds one slot for the duration of the `async with` block.
+
+        Raises:
+            ConcurrencyLimitExceeded: If no slot frees up within `queue_timeout`, or
+                `max_waiting` callers are already queued.
+        """
+        start = time.perf_counter()
+        if not self._semaphore.locked():
+            # Free slot and nobody queued: taken without yielding, so it never counts as waiting
+            await self._semaphore.acquire()
+            self._wait_seconds.observe(0.0)
+        else:
+            if self.max_waiting is not None and self.waiting >= self.max_waiting:
+                raise ConcurrencyLimitExceeded(f"{self.name}: queue full ({self.waiting} waiting)")
+            self.waiting += 1
+            self._queue_depth.set(self.waiting)
+            try:
+                if self.queue_timeout is None:
+                    await self._semaphore.acquire()
+                else:
+                    await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+            except asyncio.TimeoutError:
+                raise ConcurrencyLimitExceeded(
+                    f"{self.name}: no free slot after {self.queue_timeout}s ({self.waiting} waiting)"
+                )
+            finally:
+                self.waiting -= 1
+                self._queue_depth.set(self.waiting)
+                self._wait_seconds.observe(time.perf_counter() - start)
+
+        self.in_flight += 1
+        self._in_flight.set(self.in_flight)
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._in_flight.set(self.in_flight)
+            self._semaphore.release()
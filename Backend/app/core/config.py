@@ -1,3 +1,4 @@
+from pydantic import Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from dotenv import load_dotenv
 from pathlib import Path
@@ -12,16 +13,152 @@ class Settings(BaseSettings):
     
     # Database Settings
     MONGO_URI: str
+    MONGO_MAX_POOL_SIZE: int = 50 # Per client, per worker process
+    MONGO_MIN_POOL_SIZE: int = 5 # Connections kept warm
+    MONGO_MAX_IDLE_TIME_MS: int = 60_000
+    MONGO_WAIT_QUEUE_TIMEOUT_MS: int = 2_000 # Fail fast instead of queueing forever for a connection
+    MONGO_SERVER_SELECTION_TIMEOUT_MS: int = 5_000
+    MONGO_CONNECT_TIMEOUT_MS: int = 5_000
+    MONGO_MAX_CONNECTIONS_TOTAL: int = 0 # Cap across all worker processes (e.g. the cluster's connection limit); 0 = none
     GEMINI_API_KEY: str
     
+    # History Pagination
+    HISTORY_DEFAULT_PAGE_SIZE: int = 50
+    HISTORY_MAX_PAGE_SIZE: int = 200
+    HISTORY_DELTA_MAX_ITEMS: int = 50 # Cap on turns returned by a chat turn's delta sync
+
+    # History Write-Behind (turns are written in batches after the response is sent)
+    HISTORY_WRITE_BEHIND_ENABLED: bool = True
+    HISTORY_WRITE_BATCH_SIZE: int = 100 # Flush as soon as this many turns are buffered
+    HISTORY_WRITE_FLUSH_INTERVAL_SECONDS: float = 0.5 # ... or after this long
+    HISTORY_SPILL_PATH: str = "history_spill.jsonl" # Turns MongoDB rejected, replayed on startup
+
+    # History Retention (see app/database/retention.py)
+    HISTORY_ANONYMOUS_TTL_SECONDS: int = 86_400 # Anonymous turns are deleted by MongoDB after this long
+    HISTORY_ARCHIVE_AFTER_DAYS: int = 30 # Older turns of logged-in users are compacted into archives (reads look there too)
+    HISTORY_ARCHIVE_MAX_TURNS: int = 500 # Turns per archive document (one user, one day)
+    HISTORY_ARCHIVE_ZSTD_LEVEL: int = 10
+
+    # History Export (GET /api/v1/history/export streams NDJSON)
+    HISTORY_EXPORT_BATCH_SIZE: int = 500 # Turns fetched per MongoDB round trip
+    HISTORY_EXPORT_CHUNK_BYTES: int = 65_536 # NDJSON buffered (then compressed) per chunk sent
+    HISTORY_EXPORT_GZIP_LEVEL: int = 6
+    HISTORY_EXPORT_ZSTD_LEVEL: int = 3
+
     # NEW: JWT Settings - MUST BE CHANGED IN .env
     SECRET_KEY: str = "YOUR_SUPER_SECRET_JWT_KEY_HERE_CHANGE_ME"
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24 # 1 day
+
+    # Password Hashing (Argon2id)
+    ARGON2_TIME_COST: int = 3 # Iterations
+    ARGON2_MEMORY_COST: int = 64 * 1024 # KiB per hash (64 MiB)
+    ARGON2_PARALLELISM: int = 4 # Lanes per hash
+    PASSWORD_HASH_WORKERS: int = 2 # Threads hashing/verifying in parallel (memory use = workers x memory cost)
+    PASSWORD_HASH_MAX_QUEUE: int = 32 # Further signups/logins are rejected with 503
+    PASSWORD_HASH_QUEUE_TIMEOUT_SECONDS: float = 5.0 # Max wait for a free hashing worker
+
+    # Authentication Cache (per process)
+    AUTH_CACHE_ENABLED: bool = True
+    AUTH_CACHE_TTL_SECONDS: float = 60.0 # Max staleness after a user is deleted/deactivated elsewhere
+    AUTH_CACHE_MAX_ENTRIES: int = 10_000
     
     # NEW: Cloudinary Settings
     CLOUDINARY_CLOUD_NAME: str
     CLOUDINARY_API_KEY: str
     CLOUDINARY_API_SECRET: str
+    CLOUDINARY_UPLOAD_PREFIX: str = "" # Upload API base URL (e.g. a local stand-in); empty = Cloudinary's
+
+    # Model Invocation Settings
+    MODEL_MAX_CONCURRENCY: int = 16 # Per-process cap on in-flight Gemini calls
+    MODEL_QUEUE_TIMEOUT_SECONDS: float = 30.0 # Max wait for a free model slot
+    MODEL_CALL_TIMEOUT_SECONDS: float = 60.0 # Per-call timeout once a slot is held
+    MODEL_CLIENT_PRELOAD: bool = True # Build the Gemini client in the background right after startup
+    MODEL_HTTP_MAX_CONNECTIONS: int = 64 # Pooled HTTP connections of the shared Gemini client
+    MODEL_HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 32
+    MODEL_HTTP_KEEPALIVE_EXPIRY_SECONDS: float = 30.0
+    MODEL_HTTP_MAX_CONNECTIONS_TOTAL: int = 0 # Cap across all worker processes; 0 = none
+    MODEL_API_BASE_URL: str = "" # Gemini API base URL (e.g. a proxy or local stand-in); empty = Google's
+
+    # Model Routing (comma-separated candidates, most preferred first; see app/agents/model_router.py)
+    MODEL_TEXT_CANDIDATES: str = "gemini-2.5-flash,gemini-2.5-flash-lite"
+    MODEL_IMAGE_CANDIDATES: str = "gemini-2.5-flash,gemini-2.5-flash-lite"
+    MODEL_LONG_PROMPT_CANDIDATES: str = "gemini-2.5-flash,gemini-2.5-pro"
+    MODEL_LONG_PROMPT_TOKENS: int = 32_000 # Estimated prompt size above which the long-prompt list is used
+    MODEL_LATENCY_TARGET_SECONDS: float = 10.0 # Candidates with a higher recent p95 are skipped if another is faster
+    MODEL_STATS_WINDOW: int = 100 # Recent latencies kept per model
+    MODEL_HEDGE_ENABLED: bool = True # Fire a second attempt once the first exceeds the model's p95
+    MODEL_HEDGE_MIN_SAMPLES: int = 20 # No hedging (or latency-based skipping) before this many calls
+    MODEL_HEDGE_MIN_DELAY_SECONDS: float = 2.0
+    MODEL_RETRY_ATTEMPTS: int = 2 # Retries after a transient failure (timeout, 429, 5xx)
+    MODEL_RETRY_BASE_DELAY_SECONDS: float = 0.25 # Jittered exponential backoff
+    MODEL_RETRY_MAX_DELAY_SECONDS: float = 4.0
+    MODEL_BREAKER_WINDOW: int = 20 # Recent outcomes per model considered by the circuit breaker
+    MODEL_BREAKER_MIN_CALLS: int = 10
+    MODEL_BREAKER_ERROR_RATE: float = 0.5 # Open the circuit at this share of failures
+    MODEL_BREAKER_COOLDOWN_SECONDS: float = 30.0 # Then let one probe call through
+
+    # Model Response Cache (exact match on model + prompt + image)
+    RESPONSE_CACHE_ENABLED: bool = True
+    RESPONSE_CACHE_TTL_SECONDS: float = 3600.0
+    RESPONSE_CACHE_MAX_BYTES: int = 64 * 1024 * 1024 # Memory tier size (answer text), LRU eviction beyond it
+    RESPONSE_CACHE_MONGO_ENABLED: bool = False # Shared tier in the response_cache collection
+
+    # Conversation Context (prior turns sent to the model, logged-in users)
+    CONTEXT_ENABLED: bool = True
+    CONTEXT_HISTORY_TOKEN_BUDGET: int = 4000 # Estimated tokens of verbatim recent turns
+    CONTEXT_SUMMARY_MAX_TOKENS: int = 512 # Rolling summary of the turns before those
+    CONTEXT_MAX_LOADED_TURNS: int = 50 # Turns read from MongoDB when a session is not cached
+    CONTEXT_CACHE_MAX_SESSIONS: int = 10_000
+    CONTEXT_CACHE_TTL_SECONDS: float = 1800.0
+
+    # Image Upload Settings
+    IMAGE_UPLOAD_WORKERS: int = 8 # Threads running blocking Cloudinary uploads
+    MAX_IMAGE_UPLOAD_BYTES: int = 10 * 1024 * 1024 # Larger uploads are rejected with 413
+    IMAGE_READ_CHUNK_BYTES: int = 64 * 1024 # Read size while ingesting an upload
+
+    # Content-Addressed Image Store (an image already uploaded is not uploaded again)
+    IMAGE_STORE_ENABLED: bool = True
+    IMAGE_STORE_CACHE_MAX_ENTRIES: int = 10_000 # Per-process LRU of digest -> URL in front of MongoDB
+
+    # Image Preprocessing Settings (applied to the copy sent to the model only)
+    IMAGE_PREPROCESS_ENABLED: bool = True
+    IMAGE_MAX_EDGE: int = 1536 # Longest edge in pixels after downscaling
+    IMAGE_OUTPUT_FORMAT: str = "JPEG" # JPEG (fastest to encode), WEBP or PNG
+    IMAGE_OUTPUT_QUALITY: int = 85 # Encoder quality (1-100) for lossy formats
+    IMAGE_REENCODE_MIN_SAVING: float = 0.2 # Images within IMAGE_MAX_EDGE are only re-encoded if this share smaller
+    IMAGE_PREPROCESS_WORKERS: int = 4 # Threads used for decode/resize/encode
+
+    # Serving (gunicorn.conf.py, used by the Procfile)
+    SERVER_WORKERS: int = 0 # Uvicorn worker processes; 0 = one per available CPU
+    SERVER_PRELOAD_APP: bool = True # Import the app once in the master, then fork (clients are still created per worker)
+    SERVER_KEEPALIVE_SECONDS: int = 5
+    SERVER_GRACEFUL_TIMEOUT_SECONDS: int = 30 # On SIGTERM a worker is killed after this long
+    SERVER_REQUEST_DRAIN_SECONDS: float = 20.0 # ... of which in-flight requests (and their model calls) may take this long
+    SERVER_MODEL_DRAIN_SECONDS: float = 5.0 # ... then background model calls (summary folds) this long
+
+    # Metrics (Prometheus text format at /metrics)
+    METRICS_ENABLED: bool = True # Per-route HTTP metrics middleware and the /metrics endpoint
+
+    # Rate Limiting (token buckets per user id, or per client IP for anonymous callers)
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_BACKEND: str = "auto" # "memory" (per process), "mongo" (shared by all workers), "auto" (mongo with several workers)
+    RATE_LIMIT_TEXT_PER_MINUTE: float = Field(30, gt=0) # Refill rate of the text budget (> 0; RATE_LIMIT_ENABLED turns limits off)
+    RATE_LIMIT_TEXT_BURST: float = Field(10, gt=0) # Bucket size: requests allowed back to back
+    RATE_LIMIT_IMAGE_PER_MINUTE: float = Field(6, gt=0) # Requests carrying an image use this budget instead
+    RATE_LIMIT_IMAGE_BURST: float = Field(3, gt=0)
+    RATE_LIMIT_MAX_KEYS: int = 100_000 # Buckets kept in memory (least recently used dropped first)
+    RATE_LIMIT_TRUST_FORWARDED_FOR: bool = False # Key anonymous callers on X-Forwarded-For (only behind a trusted proxy)
+
+    # Chat Admission (per process, checked before the request body is read)
+    CHAT_ADMISSION_MAX_CONCURRENCY: int = 64 # Chat requests handled at once
+    CHAT_ADMISSION_MAX_QUEUE: int = 64 # Requests waiting for a slot; beyond that -> 503 immediately
+    CHAT_ADMISSION_QUEUE_TIMEOUT_SECONDS: float = 2.0 # Longest wait for a slot before 503
+
+    # Chat WebSocket (/api/v1/chat/ws)
+    CHAT_WS_HEARTBEAT_SECONDS: float = 20.0 # Server sends {"type": "ping"} after this long without traffic
+    CHAT_WS_IDLE_TIMEOUT_SECONDS: float = 300.0 # Connections silent this long (and not waiting for an answer) are closed
+    CHAT_WS_MAX_PENDING_MESSAGES: int = 4 # Messages queued behind the one being answered; more get an error frame
+    CHAT_WS_SEND_TIMEOUT_SECONDS: float = 10.0 # A client that stops reading this long is disconnected
 
 settings = Settings()
\ No newline at end of file
@@ -0,0 +1,78 @@
+"""
+ASGI middleware recording per-route HTTP metrics.
+
+Requests are labelled with the route template (e.g. `/api/v1/chat/stream`)
+rather than the raw path, so unknown paths and path parameters do not create a
+series each. Responses sent by a middleware before routing (the 413/429/503s of
+ChatAdmissionMiddleware) get the template the path would have matched. The
+duration covers the whole response, including streamed bodies.
+"""
+import time
+from typing import Any, Awaitable, Callable, MutableMapping
+
+from starlette.routing import Match
+
+from app.core.metrics import registry
+
+Scope = MutableMapping[str, Any]
+Message = MutableMapping[str, Any]
+Receive = Callable[[], Awaitable[Message]]
+Send = Callable[[Message], Awaitable[None]]
+
+UNMATCHED_ROUTE = "<unmatched>" # 404s and other paths no route claimed
+
+_requests_total = registry.counter("http_requests_total", "HTTP requests by method, route and status code.")
+_request_seconds = registry.histogram("http_request_duration_seconds", "HTTP request duration (until the last body byte), by method and route.")
+_in_flight = registry.gauge("http_requests_in_flight", "HTTP requests currently being handled.")
+
+
+def route_template(scope: Scope) -> str:
+    """
+    The path template of the route that handled the request (set by FastAPI's router).
+
+    When the response was sent before routing, the app's routes are matched against the
+    path instead; a path whose method does not match still gets its route's template.
+    """
+    route = scope.get("route")
+    if route is None:
+        router = getattr(scope.get("app"), "router", None)
+        partial = None
+        for candidate in getattr(router, "routes", ()):
+            match, _ = candidate.matches(scope)
+            if match == Match.FULL:
+                route = candidate
+                break
+            if match == Match.PARTIAL and partial is None:
+                partial = candidate
+        route = route or partial
+    return getattr(route, "path", None) or UNMATCHED_ROUTE
+
+
+class MetricsMiddleware:
+    """Counts requests, times them per route and tracks how many are in flight."""
+
+    def __init__(self, app: Callable[[Scope, Receive, Send], Awaitable[None]]):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500 # Unless the app manages to send a response
+        start = time.perf_counter()
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        _in_flight.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            _in_flight.dec()
+            method, route = scope["method"], route_template(scope)
+            _request_seconds.observe(time.perf_counter() - start, method=method, route=route)
+            _requests_total.inc(method=method, route=route, status=str(status_code))
@@ -0,0 +1,197 @@
+"""
+Lightweight in-process metrics registry.
+
+Counters, gauges and histograms are kept per process and can be read back
+with `registry.snapshot()` or rendered in the Prometheus text format (served
+at /metrics) with `registry.render_prometheus()`. Metrics are created on first
+use and are safe to update from worker threads.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Sequence, Tuple
+
+# Latency buckets (seconds) shared by every histogram unless overridden
+DEFAULT_BUCKETS: Tuple[float, ...] = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0
+)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+# Content type of the Prometheus text exposition format
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _label_key(labels: Dict[str, str]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(key: LabelKey, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    pairs = key + extra
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, description: str):
+        self.name = name
+        self.description = description
+        self._lock = threading.Lock()
+
+
+class Counter(_Metric):
+    """Monotonically increasing value (requests served, bytes sent, ...)."""
+    kind = "counter"
+
+    def __init__(self, name: str, description: str):
+        super().__init__(name, description)
+        self._values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(_label_key(labels), 0.0)
+
+    def samples(self) -> Dict[LabelKey, float]:
+        with self._lock:
+            return dict(self._values)
+
+
+class Gauge(Counter):
+    """Value that can go up and down (queue depth, in-flight calls, ...)."""
+    kind = "gauge"
+
+    def set(self, value: float, **labels: str) -> None:
+        with self._lock:
+            self._values[_label_key(labels)] = value
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    """Bucketed distribution of observed values (latencies, sizes, ...)."""
+    kind = "histogram"
+
+    def __init__(self, name: str, description: str, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, description)
+        self.buckets = tuple(sorted(buckets))
+        # label key -> [per-bucket counts..., +Inf count, sum]
+        self._values: Dict[LabelKey, list] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[len(self.buckets)] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        """Context manager that observes the elapsed wall time in seconds."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels: str) -> int:
+        series = self._values.get(_label_key(labels))
+        return series[len(self.buckets)] if series else 0
+
+    def total(self, **labels: str) -> float:
+        series = self._values.get(_label_key(labels))
+        return series[-1] if series else 0.0
+
+    def samples(self) -> Dict[LabelKey, list]:
+        with self._lock:
+            return {key: list(series) for key, series in self._values.items()}
+
+
+class MetricsRegistry:
+    """Get-or-create store for all metrics of this process."""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name: str, description: str, **kwargs) -> _Metric:
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, description, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} already registered as {metric.kind}")
+            return metric
+
+    def counter(self, name: str, description: str = "") -> Counter:
+        return self._get_or_create(Counter, name, description)
+
+    def gauge(self, name: str, description: str = "") -> Gauge:
+        return self._get_or_create(Gauge, name, description)
+
+    def histogram(self, name: str, description: str = "", buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, description, buckets=buckets)
+
+    def metrics(self) -> Dict[str, _Metric]:
+        with self._lock:
+            return dict(self._metrics)
+
+    def snapshot(self) -> Dict[str, dict]:
+        """Returns a plain-dict view of every metric (useful for logs and benchmarks)."""
+        result = {}
+        for name, metric in self.metrics().items():
+            if isinstance(metric, Histogram):
+                result[name] = {
+                    ",".join(f"{k}={v}" for k, v in key): {"count": series[len(metric.buckets)], "sum": series[-1]}
+                    for key, series in metric.samples().items()
+                }
+            else:
+                result[name] = {
+                    ",".join(f"{k}={v}" for k, v in key): value
+                    for key, value in metric.samples().items()
+                }
+        return result
+
+    def render_prometheus(self) -> str:
+        """Renders every metric in the Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        for name, metric in sorted(self.metrics().items()):
+            help_text = metric.description.replace("\\", "\\\\").replace("\n", "\\n")
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            if isinstance(metric, Histogram):
+                for key, series in sorted(metric.samples().items()):
+                    # Bucket counts are already cumulative (observe() increments every bucket >= value)
+                    for bound, count in zip(metric.buckets + (float("inf"),), series):
+                        lines.append(f"{name}_bucket{_format_labels(key, (('le', _format_value(bound)),))} {count}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {_format_value(series[-1])}")
+                    lines.append(f"{name}_count{_format_labels(key)} {series[len(metric.buckets)]}")
+            else:
+                for key, value in sorted(metric.samples().items()):
+                    lines.append(f"{name}{_format_labels(key)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
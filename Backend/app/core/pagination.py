@@ -0,0 +1,36 @@
+import base64
+from datetime import datetime, timedelta
+from typing import Tuple
+
+import orjson
+from bson import ObjectId
+from bson.errors import InvalidId
+
+# MongoDB stores datetimes with millisecond precision, so cursors do too
+_EPOCH = datetime(1970, 1, 1)
+_MILLISECOND = timedelta(milliseconds=1)
+
+
+class InvalidCursorError(ValueError):
+    """The cursor string was not produced by `encode_cursor`."""
+
+
+def encode_cursor(timestamp: datetime, object_id: ObjectId) -> str:
+    """Encodes a (timestamp, _id) keyset position as an opaque URL-safe string."""
+    payload = orjson.dumps({"t": (timestamp.replace(tzinfo=None) - _EPOCH) // _MILLISECOND, "i": str(object_id)})
+    return base64.urlsafe_b64encode(payload).rstrip(b"=").decode("ascii")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, ObjectId]:
+    """
+    Decodes a cursor produced by `encode_cursor`.
+
+    Raises:
+        InvalidCursorError: If the cursor is malformed.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = orjson.loads(base64.urlsafe_b64decode(padded))
+        return _EPOCH + payload["t"] * _MILLISECOND, ObjectId(payload["i"])
+    except (ValueError, TypeError, KeyError, InvalidId, orjson.JSONDecodeError):
+        raise InvalidCursorError("Invalid pagination cursor.")
@@ -0,0 +1,315 @@
+"""
+Rate limiting and admission control for the chat endpoints.
+
+Three layers, all applied before any expensive work (image read, upload, model call):
+
+- Body size (`ChatAdmissionMiddleware`): a chat request whose Content-Length is
+  above `max_chat_body_bytes()` is answered 413 before its body is read; a body
+  without a Content-Length (chunked) is cut off with 413 as soon as it passes it.
+- Admission gate (`ChatAdmissionMiddleware`): at most CHAT_ADMISSION_MAX_CONCURRENCY
+  chat requests are handled at once per process, with a short bounded queue.
+  Requests beyond that are shed with 503 + Retry-After before their body is read.
+- Token buckets (also checked in `ChatAdmissionMiddleware`, before the admission
+  slot): every caller - the user id of a valid bearer token, or the client IP for
+  anonymous callers - has a text budget and a separate, smaller image budget
+  (RATE_LIMIT_TEXT_* / RATE_LIMIT_IMAGE_*). Only the start of a multipart body is
+  read to tell the two apart, so an over-limit upload is answered 429 +
+  Retry-After without being received.
+
+Buckets live in this process when it is the only worker. With several gunicorn
+workers (or RATE_LIMIT_BACKEND=mongo) they are shared through the
+`rate_limit_buckets` collection; if MongoDB fails, requests are let through
+rather than rejected. Benchmarks and tests can plug in any other store with
+`set_bucket_store()`.
+"""
+import math
+import re
+import time
+from typing import Any, Awaitable, Callable, List, MutableMapping, NamedTuple, Optional, Protocol, Tuple
+
+from cachetools import TTLCache
+from fastapi import HTTPException, status
+from starlette.requests import HTTPConnection
+from starlette.responses import JSONResponse
+
+from app.core.concurrency import ConcurrencyLimiter, ConcurrencyLimitExceeded
+from app.core.config import settings
+from app.core.metrics import registry
+from app.core.serving import worker_processes
+from app.core.security import authenticate_token
+
+_rejections = registry.counter("rate_limit_rejections_total", "Requests rejected with 429, by budget (text/image).")
+_shed = registry.counter("chat_admission_shed_total", "Chat requests shed with 503 by the admission gate.")
+_too_large = registry.counter("chat_body_too_large_total", "Chat requests rejected with 413 for their body size.")
+
+# Room for the text fields and part headers next to the image (Starlette caps each text field at 1 MiB)
+FORM_ALLOWANCE_BYTES = 1024 * 1024
+
+
+def max_chat_body_bytes() -> int:
+    """Largest chat request body accepted: the image limit plus the rest of the form."""
+    return settings.MAX_IMAGE_UPLOAD_BYTES + FORM_ALLOWANCE_BYTES
+
+
+class Budget(NamedTuple):
+    name: str
+    per_minute: float
+    burst: float
+
+    @property
+    def rate(self) -> float:
+        """Tokens refilled per second."""
+        return self.per_minute / 60.0
+
+
+def text_budget() -> Budget:
+    return Budget("text", settings.RATE_LIMIT_TEXT_PER_MINUTE, settings.RATE_LIMIT_TEXT_BURST)
+
+
+def image_budget() -> Budget:
+    return Budget("image", settings.RATE_LIMIT_IMAGE_PER_MINUTE, settings.RATE_LIMIT_IMAGE_BURST)
+
+
+# --- Bucket stores ---
+
+class BucketStore(Protocol):
+    async def take(self, key: str, cost: float, rate: float, burst: float) -> Tuple[bool, float]:
+        """Refills the bucket, takes `cost` tokens if available; returns (allowed, tokens left)."""
+        ...
+
+
+class MemoryBucketStore:
+    """Per-process buckets. A bucket idle long enough to be full again is evicted (it carries no state)."""
+
+    def __init__(self, max_keys: int = 0, idle_seconds: float = 0.0):
+        # Rates are validated > 0 in settings; one that was changed to 0 at runtime is ignored here
+        refill = max((b.burst / b.rate for b in (text_budget(), image_budget()) if b.rate > 0), default=60.0)
+        self._buckets: TTLCache = TTLCache(
+            maxsize=max_keys or settings.RATE_LIMIT_MAX_KEYS, ttl=idle_seconds or refill, timer=time.monotonic
+        )
+
+    async def take(self, key: str, cost: float, rate: float, burst: float) -> Tuple[bool, float]:
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(key, (burst, now))
+        tokens = min(burst, tokens + (now - updated) * rate)
+        allowed = tokens >= cost
+        if allowed:
+            tokens -= cost
+        self._buckets[key] = (tokens, now)
+        return allowed, tokens
+
+
+class MongoBucketStore:
+    """Buckets shared by all workers (one atomic find_one_and_update per check)."""
+
+    async def take(self, key: str, cost: float, rate: float, burst: float) -> Tuple[bool, float]:
+        # Imported here: the database layer imports app.core modules
+        from app.database.repositories import rate_limit_buckets
+
+        try:
+            return await rate_limit_buckets.take(key, cost, rate, burst)
+        except Exception as e:
+            print(f"Rate limit store failed, letting the request through: {e}")
+            return True, burst
+
+
+def _default_store() -> BucketStore:
+    backend = settings.RATE_LIMIT_BACKEND
+    if backend == "auto":
+        # Per-process buckets would multiply every limit by the number of workers
+        backend = "mongo" if worker_processes() > 1 else "memory"
+    return MongoBucketStore() if backend == "mongo" else MemoryBucketStore()
+
+
+_store: BucketStore = _default_store()
+
+
+def set_bucket_store(store: Optional[BucketStore]) -> None:
+    """Replaces the bucket store (None restores the configured one)."""
+    global _store
+    _store = store or _default_store()
+
+
+# --- Token-bucket check ---
+
+def client_ip(request: HTTPConnection) -> str:
+    """The caller's address; the first X-Forwarded-For hop when RATE_LIMIT_TRUST_FORWARDED_FOR is set."""
+    if settings.RATE_LIMIT_TRUST_FORWARDED_FOR:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",", 1)[0].strip()
+    return request.client.host if request.client else "unknown"
+
+
+def caller_key(connection: HTTPConnection, user_id: Optional[str]) -> str:
+    """Bucket key of a caller: the user for logged-in callers, the client IP otherwise."""
+    return f"user:{user_id}" if user_id is not None else f"ip:{client_ip(connection)}"
+
+
+async def check_budget(budget: Budget, caller: str, cost: float = 1.0) -> None:
+    """
+    Takes `cost` tokens from the caller's bucket for `budget`.
+
+    Raises:
+        HTTPException: 429 with Retry-After (seconds until enough tokens are back) if the bucket is empty.
+    """
+    allowed, tokens = await _store.take(f"{budget.name}:{caller}", cost, budget.rate, budget.burst)
+    if allowed:
+        return
+    _rejections.inc(budget=budget.name)
+    retry_after = math.ceil((cost - tokens) / budget.rate) if budget.rate > 0 else 60
+    raise HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail=f"Too many {budget.name} requests. Try again in {retry_after}s.",
+        headers={"Retry-After": str(max(1, retry_after))},
+    )
+
+
+# Only the start of a chat form is read to find an image part. A text-only form is far
+# smaller; a body still without an image past this many bytes is charged as an image.
+IMAGE_PEEK_BYTES = 64 * 1024
+
+_DISPOSITION = re.compile(rb"content-disposition:[^\r\n]*\r\n", re.IGNORECASE)
+_FILENAME = re.compile(rb'filename="[^"]')
+
+Scope = MutableMapping[str, Any]
+Message = MutableMapping[str, Any]
+ASGIApp = Callable[[Scope, Callable, Callable], Awaitable[None]]
+
+
+async def _peek_for_image(receive: Callable[[], Awaitable[Message]]) -> Tuple[bool, List[Message]]:
+    """
+    Reads the request body until an `image_file` part with a file name shows up.
+
+    Returns:
+        Whether the request carries an image, and the messages read so far (to replay).
+    """
+    messages: List[Message] = []
+    body = b""
+    while True:
+        message = await receive()
+        messages.append(message)
+        if message["type"] != "http.request":
+            return False, messages # Client went away; the app sees the disconnect
+        body += message.get("body", b"")
+        for disposition in _DISPOSITION.finditer(body):
+            line = disposition.group()
+            if b'name="image_file"' in line and _FILENAME.search(line):
+                return True, messages
+        if not message.get("more_body", False):
+            return False, messages
+        if len(body) > IMAGE_PEEK_BYTES:
+            return True, messages
+
+
+async def _take_chat_budget(scope: Scope, receive: Callable) -> Tuple[Optional[HTTPException], Callable]:
+    """
+    Charges a chat request to its caller's text or image budget.
+
+    Returns:
+        The 429 to answer with (None if the request may go on), and the `receive`
+        to hand to the app (it replays what was read while peeking).
+    """
+    connection = HTTPConnection(scope)
+    scheme, _, token = connection.headers.get("authorization", "").partition(" ")
+    decoded = await authenticate_token(token if scheme.lower() == "bearer" and token else None)
+    caller = caller_key(connection, decoded.user_id if decoded is not None else None)
+
+    has_image, messages = False, []
+    if connection.headers.get("content-type", "").startswith("multipart/form-data"):
+        has_image, messages = await _peek_for_image(receive)
+
+    async def replay() -> Message:
+        return messages.pop(0) if messages else await receive()
+
+    try:
+        await check_budget(image_budget() if has_image else text_budget(), caller)
+    except HTTPException as e:
+        return e, replay
+    return None, replay
+
+
+# --- Body size cap ---
+
+def _body_too_large(limit: int) -> HTTPException:
+    _too_large.inc()
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"Request body exceeds the limit of {limit} bytes.",
+    )
+
+
+def _cap_body(scope: Scope, receive: Callable) -> Tuple[Optional[HTTPException], Callable]:
+    """
+    Checks a chat request's declared size and caps what can be received.
+
+    Returns:
+        The 413 to answer with right away (Content-Length over the limit, None
+        otherwise), and a `receive` that raises the 413 once more than the limit
+        arrives (FastAPI answers an HTTPException raised while the form is read).
+    """
+    limit = max_chat_body_bytes()
+    declared = HTTPConnection(scope).headers.get("content-length")
+    if declared is not None and declared.isdigit() and int(declared) > limit:
+        return _body_too_large(limit), receive
+    received = 0
+
+    async def capped() -> Message:
+        nonlocal received
+        message = await receive()
+        received += len(message.get("body", b""))
+        if received > limit:
+            raise _body_too_large(limit)
+        return message
+
+    return None, capped
+
+
+# --- Admission gate ---
+
+chat_admission = ConcurrencyLimiter(
+    "chat_admission",
+    limit=settings.CHAT_ADMISSION_MAX_CONCURRENCY,
+    queue_timeout=settings.CHAT_ADMISSION_QUEUE_TIMEOUT_SECONDS,
+    max_waiting=settings.CHAT_ADMISSION_MAX_QUEUE,
+)
+
+
+class ChatAdmissionMiddleware:
+    """
+    Gates chat requests before their body is read: the body size first (413), then
+    the caller's token bucket (429), then a `chat_admission` slot held for the whole
+    request (503 when none frees up).
+    """
+
+    def __init__(self, app: ASGIApp, path_prefix: str = "/api/v1/chat"):
+        self.app = app
+        self.path_prefix = path_prefix
+
+    async def __call__(self, scope: Scope, receive: Callable, send: Callable) -> None:
+        if scope["type"] != "http" or scope["method"] != "POST" or not scope["path"].startswith(self.path_prefix):
+            await self.app(scope, receive, send)
+            return
+        rejection, receive = _cap_body(scope, receive)
+        if rejection is None and settings.RATE_LIMIT_ENABLED:
+            try:
+                rejection, receive = await _take_chat_budget(scope, receive)
+            except HTTPException as e: # The body passed the size cap while peeking
+                rejection = e
+        if rejection is not None:
+            # Nothing past the peeked start of the body is received
+            response = JSONResponse({"detail": rejection.detail}, rejection.status_code, headers=rejection.headers)
+            await response(scope, receive, send)
+            return
+        try:
+            async with chat_admission.slot():
+                await self.app(scope, receive, send)
+        except ConcurrencyLimitExceeded:
+            # Raised before the slot was acquired, so nothing has been sent yet
+            _shed.inc()
+            response = JSONResponse(
+                {"detail": "Server is at capacity. Please retry shortly."},
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                headers={"Retry-After": "1"},
+            )
+            await response(scope, receive, send)
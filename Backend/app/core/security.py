@@ -1,17 +1,50 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 from typing import Optional
 from jose import jwt, exceptions
 from pwdlib import PasswordHash
-from fastapi import HTTPException, status, Depends
+from pwdlib.hashers.argon2 import Argon2Hasher
+from fastapi import Depends
 # IMPORTS UPDATED: Using HTTPBearer for optional token retrieval
 from fastapi.security import OAuth2PasswordBearer, HTTPBearer, HTTPAuthorizationCredentials 
 
+from app.core import auth_cache
+from app.core.concurrency import ConcurrencyLimiter, ConcurrencyLimitExceeded
 from app.core.config import settings
-from app.database.models import User
-from app.schemas.user import TokenData
+from app.database.repositories import users
 
-# Initialize Password Hashing (Argon2)
-password_context = PasswordHash.recommended()
+# Initialize Password Hashing (Argon2id). Hashes embed their own parameters, so
+# existing hashes still verify after the ARGON2_* settings change.
+password_context = PasswordHash((
+    Argon2Hasher(
+        time_cost=settings.ARGON2_TIME_COST,
+        memory_cost=settings.ARGON2_MEMORY_COST,
+        parallelism=settings.ARGON2_PARALLELISM,
+    ),
+))
+
+# Argon2 releases the GIL, so a small thread pool keeps hashing off the event loop.
+# The limiter caps queued work: a login storm gets 503s instead of stalling the worker.
+_hash_executor: Optional[ThreadPoolExecutor] = None
+hash_limiter = ConcurrencyLimiter(
+    "password_hashing",
+    limit=settings.PASSWORD_HASH_WORKERS,
+    queue_timeout=settings.PASSWORD_HASH_QUEUE_TIMEOUT_SECONDS,
+    max_waiting=settings.PASSWORD_HASH_MAX_QUEUE,
+)
+
+
+class PasswordHashingBusyError(RuntimeError):
+    """Raised when every hashing worker is busy and the queue is full (or timed out)."""
+
+
+def _get_hash_executor() -> ThreadPoolExecutor:
+    global _hash_executor
+    if _hash_executor is None:
+        _hash_executor = ThreadPoolExecutor(max_workers=hash_limiter.limit, thread_name_prefix="password-hash")
+    return _hash_executor
 
 # Dependency for Login Endpoint (Uses standard OAuth2PasswordBearer)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/login")
@@ -32,6 +65,32 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     except exceptions.InvalidTokenError:
         return False
 
+async def _run_in_hash_pool(func, *args):
+    try:
+        async with hash_limiter.slot():
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(_get_hash_executor(), func, *args)
+    except ConcurrencyLimitExceeded as e:
+        raise PasswordHashingBusyError(str(e))
+
+async def hash_password_in_pool(password: str) -> str:
+    """
+    Hashes a password on the hashing thread pool.
+
+    Raises:
+        PasswordHashingBusyError: If no hashing worker is available.
+    """
+    return await _run_in_hash_pool(get_password_hash, password)
+
+async def verify_password_in_pool(plain_password: str, hashed_password: str) -> bool:
+    """
+    Verifies a password on the hashing thread pool.
+
+    Raises:
+        PasswordHashingBusyError: If no hashing worker is available.
+    """
+    return await _run_in_hash_pool(verify_password, plain_password, hashed_password)
+
 # --- JWT Token Functions ---
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
@@ -48,43 +107,69 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
 
 # --- Dependency to Get Current User ID (The Core Logic - UPDATED) ---
 
-async def get_current_user_id(
-    # Use HTTPBearer, which will pass None if the header is missing
-    security_info: Optional[HTTPAuthorizationCredentials] = Depends(bearer_scheme)
-) -> Optional[str]:
+async def authenticate_token(token: Optional[str]) -> Optional[auth_cache.DecodedToken]:
     """
-    Extracts and validates the JWT token.
-    Returns user_id (str) if logged in, or None if anonymous/token is invalid.
+    Validates a JWT and checks that its user exists and is active.
+
+    Decoded tokens and the user's existence/active flag are cached per process
+    (see app/core/auth_cache.py), so repeat calls skip the JWT decode and the
+    MongoDB lookup.
+
+    Returns:
+        The decoded token (user id and expiry), or None if the caller is
+        anonymous: no token, an invalid/expired one, or an unknown/inactive user.
     """
-    
-    # Extract the token string safely
-    token = security_info.credentials if security_info else None
-    
     if token is None:
-        # If no token is found in the header, treat as Anonymous user
+        # If no token is found, treat as Anonymous user
         return None
     
     try:
-        # Decode the token
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+        # Decode the token (cached until the earlier of the cache TTL and the token's exp)
+        decoded = auth_cache.get_decoded_token(token)
+        if decoded is None:
+            payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+            decoded = auth_cache.DecodedToken(
+                user_id=payload.get("user_id"),
+                expires_at=float(payload.get("exp", time.time() + settings.AUTH_CACHE_TTL_SECONDS)),
+            )
+            auth_cache.put_decoded_token(token, decoded)
         
         # Get the user ID from the payload
-        user_id: str = payload.get("user_id")
+        user_id = decoded.user_id
         if user_id is None:
             # Token is valid but user_id is missing: Treat as anonymous
             return None
         
-        # Verify user exists in DB (essential for security)
-        user = User.objects(id=user_id).first()
-        if user is None:
-            # User deleted since token was issued: Treat as anonymous
+        # Verify user exists and is active (essential for security)
+        is_active = auth_cache.get_user_active(user_id)
+        if is_active is None:
+            user = await users.get_by_id(user_id, projection={"is_active": 1})
+            is_active = user is not None and user.get("is_active", True)
+            auth_cache.put_user_active(user_id, is_active)
+        if not is_active:
+            # User deleted or deactivated since token was issued: Treat as anonymous
             return None
             
-        return user_id
+        return decoded
 
     except exceptions.JWTError:
         # Token is expired, invalid signature, or malformed: Treat as anonymous
         return None
     except Exception:
         # Catch any other database or decoding error: Treat as anonymous
-        return None
\ No newline at end of file
+        return None
+
+
+async def get_current_user_id(
+    # Use HTTPBearer, which will pass None if the header is missing
+    security_info: Optional[HTTPAuthorizationCredentials] = Depends(bearer_scheme)
+) -> Optional[str]:
+    """
+    Extracts and validates the JWT token.
+    Returns user_id (str) if logged in, or None if anonymous/token is invalid.
+    """
+    
+    # Extract the token string safely
+    token = security_info.credentials if security_info else None
+    decoded = await authenticate_token(token)
+    return decoded.user_id if decoded is not None else None
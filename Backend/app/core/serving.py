@@ -0,0 +1,38 @@
+"""
+Process layout of the server.
+
+Production runs gunicorn with uvicorn workers (gunicorn.conf.py, Procfile).
+gunicorn.conf.py writes the resolved worker count into settings.SERVER_WORKERS
+before any worker starts, so each worker can size its own resources from it:
+connection budgets that apply to the whole deployment
+(MONGO_MAX_CONNECTIONS_TOTAL, MODEL_HTTP_MAX_CONNECTIONS_TOTAL) are split
+evenly between the workers. Under plain uvicorn the process is the only worker.
+"""
+import os
+
+from app.core.config import settings
+
+
+def available_cpus() -> int:
+    """CPUs this process may run on (respects affinity / container cpusets where the OS reports them)."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError: # Not available on macOS / Windows
+        return os.cpu_count() or 1
+
+
+def resolve_worker_count() -> int:
+    """SERVER_WORKERS, or one worker per available CPU when it is 0."""
+    return settings.SERVER_WORKERS if settings.SERVER_WORKERS > 0 else available_cpus()
+
+
+def worker_processes() -> int:
+    """Number of worker processes serving this deployment (1 outside gunicorn)."""
+    return max(1, settings.SERVER_WORKERS)
+
+
+def per_worker(per_process: int, total: int) -> int:
+    """`per_process`, capped at this worker's share of a deployment-wide `total` (0 = no cap)."""
+    if total <= 0:
+        return per_process
+    return max(1, min(per_process, total // worker_processes()))
@@ -0,0 +1,44 @@
+"""
+Payload format of `conversation_archives` documents.
+
+An archive holds a batch of conversation turns exactly as they were stored in
+`conversation_history` (`_id`, datetimes and all), BSON-encoded as
+{"turns": [...]} in time order and compressed with zstd. Chat turns are mostly
+prose and Markdown, so one user-day typically shrinks several times over.
+"""
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import bson
+import zstandard
+from bson import ObjectId
+
+from app.core.config import settings
+
+Turn = Dict[str, Any]
+Position = Tuple[datetime, ObjectId]
+
+
+def pack_turns(turns: List[Turn]) -> Tuple[bytes, int]:
+    """Returns (compressed payload, uncompressed size in bytes)."""
+    raw = bson.encode({"turns": turns})
+    # Compressor objects are not thread-safe and cheap to create: one per call
+    return zstandard.ZstdCompressor(level=settings.HISTORY_ARCHIVE_ZSTD_LEVEL).compress(raw), len(raw)
+
+
+def unpack_turns(payload: bytes) -> List[Turn]:
+    """Decompresses an archive payload back into its turns, oldest first."""
+    return bson.decode(zstandard.ZstdDecompressor().decompress(payload))["turns"]
+
+
+def position(turn: Turn) -> Position:
+    """The keyset position of a turn: (timestamp, _id), the order history is paged in."""
+    return turn["timestamp"], turn["_id"]
+
+
+def project(turns: Iterable[Turn], projection: Optional[Dict[str, int]]) -> List[Turn]:
+    """Applies an inclusion projection the way MongoDB would (`_id` is always kept)."""
+    if not projection:
+        return list(turns)
+    fields = {name for name, include in projection.items() if include}
+    return [{name: value for name, value in turn.items() if name == "_id" or name in fields} for turn in turns]
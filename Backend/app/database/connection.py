@@ -1,17 +1,96 @@
+from typing import Any, Optional
 from mongoengine import connect, disconnect_all
+from pymongo import AsyncMongoClient
 from app.core.config import settings
+from app.core.serving import per_worker
+from app.database.models import User, ConversationHistory, ConversationArchive, ImageAsset, ResponseCacheEntry, RateLimitBucket
+from app.database.monitoring import mongo_command_listener
+
+# MongoEngine falls back to this database when the URI does not name one;
+# the async client must use the same database so both see the same data.
+DEFAULT_DATABASE_NAME = "test"
+
+# Async client used by request handlers (see app/database/repositories.py)
+_async_client: Optional[AsyncMongoClient] = None
+_async_db: Any = None
+
+
+def pool_options(background: bool = False) -> dict:
+    """
+    Connection-pool settings (and the command-latency listener) of this worker's clients.
+
+    The pool is capped at the worker's share of MONGO_MAX_CONNECTIONS_TOTAL. The
+    `background` (MongoEngine) client only builds indexes and runs offline jobs,
+    so it keeps no connections warm.
+    """
+    max_pool_size = per_worker(settings.MONGO_MAX_POOL_SIZE, settings.MONGO_MAX_CONNECTIONS_TOTAL)
+    return {
+        "event_listeners": [mongo_command_listener],
+        "maxPoolSize": max_pool_size,
+        "minPoolSize": 0 if background else min(settings.MONGO_MIN_POOL_SIZE, max_pool_size),
+        "maxIdleTimeMS": settings.MONGO_MAX_IDLE_TIME_MS,
+        "waitQueueTimeoutMS": settings.MONGO_WAIT_QUEUE_TIMEOUT_MS,
+        "serverSelectionTimeoutMS": settings.MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        "connectTimeoutMS": settings.MONGO_CONNECT_TIMEOUT_MS,
+    }
+
 
 def connect_db():
     """Establishes the MongoDB connection on application startup."""
+    global _async_client, _async_db
     try:
-        # Use the URI from the configuration
-        connect(host=settings.MONGO_URI, alias="default")
+        # Use the URI from the configuration. The synchronous MongoEngine connection is
+        # kept for index management and offline jobs; request handlers use the async client.
+        connect(host=settings.MONGO_URI, alias="default", **pool_options(background=True))
+
+        _async_client = AsyncMongoClient(settings.MONGO_URI, **pool_options())
+        _async_db = _async_client.get_default_database(default=DEFAULT_DATABASE_NAME)
         print("✅ Successfully connected to MongoDB.")
     except Exception as e:
         print(f"❌ Failed to connect to MongoDB: {e}")
         # Optionally, raise the exception or handle failure gracefully
+        return
+
+    ensure_indexes()
+
+
+def ensure_indexes():
+    """
+    Creates the indexes declared in each document's `meta` (no-op if they exist).
+
+    Documents are inserted through the async client, so MongoEngine never gets the
+    chance to create them lazily on save().
+    """
+    for document in (User, ConversationHistory, ConversationArchive, ImageAsset, ResponseCacheEntry, RateLimitBucket):
+        try:
+            document.ensure_indexes()
+        except Exception as e:
+            print(f"❌ Failed to create indexes for {document.__name__}: {e}")
+
+
+def get_async_db() -> Any:
+    """Returns the async database handle used by the repositories."""
+    if _async_db is None:
+        raise RuntimeError("MongoDB is not connected. connect_db() must run at startup.")
+    return _async_db
+
+
+def set_async_db(db: Any) -> None:
+    """Replaces the async database handle (used by benchmarks to plug in a local stand-in)."""
+    global _async_db
+    _async_db = db
+
+
+async def close_async_db():
+    """Closes the async client (must run on the event loop that used it)."""
+    global _async_client, _async_db
+    if _async_client is not None:
+        await _async_client.close()
+    _async_client = None
+    _async_db = None
+
 
 def close_db():
     """Closes all MongoDB connections on application shutdown."""
     disconnect_all()
-    print("🔌 MongoDB connection closed.")
\ No newline at end of file
+    print("🔌 MongoDB connection closed.")
@@ -0,0 +1,204 @@
+"""
+Write-behind persistence for conversation turns.
+
+Chat handlers hand finished turns to `history_writer.save()`, which assigns the
+turn's `_id` and returns immediately; a background task writes the buffered
+turns with `insert_many` every HISTORY_WRITE_FLUSH_INTERVAL_SECONDS or as soon
+as HISTORY_WRITE_BATCH_SIZE turns are waiting.
+
+If MongoDB rejects a flush, the batch is appended to HISTORY_SPILL_PATH (one
+Extended-JSON document per line) instead of being lost. The spill file is
+replayed on startup and after the next successful flush. Turns keep the `_id`
+assigned in `save()`, so replaying a batch that was partly written is safe.
+
+Until `start()` has run (e.g. scripts driving the app without its lifespan) and
+when HISTORY_WRITE_BEHIND_ENABLED is off, `save()` inserts synchronously.
+"""
+import asyncio
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+from bson import ObjectId, json_util
+from pymongo.errors import BulkWriteError
+
+from app.core.config import settings
+from app.core.metrics import registry
+from app.database.models import ConversationHistory
+from app.database.repositories import conversations
+
+_DUPLICATE_KEY = 11000
+
+_buffer_depth = registry.gauge("history_write_buffer_depth", "Conversation turns waiting to be written to MongoDB.")
+_flush_seconds = registry.histogram("history_write_flush_seconds", "Duration of one insert_many flush of buffered turns.")
+_turns_written = registry.counter("history_write_turns_total", "Buffered conversation turns by outcome (inserted/spilled/replayed).")
+
+
+def _only_duplicates(error: BulkWriteError) -> bool:
+    """True if every failed document already exists (a replayed or retried batch)."""
+    return all(e.get("code") == _DUPLICATE_KEY for e in error.details.get("writeErrors", [])) and not error.details.get("writeConcernErrors")
+
+
+class HistoryWriteBuffer:
+    """Batches conversation turns and writes them in the background."""
+
+    def __init__(self, spill_path: str):
+        self.spill_path = spill_path
+        self._buffer: List[Dict[str, Any]] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._task: Optional["asyncio.Task[None]"] = None
+        self._stopping = False
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    @property
+    def depth(self) -> int:
+        return len(self._buffer)
+
+    # --- Request path ---
+
+    async def save(self, turn: ConversationHistory) -> str:
+        """
+        Validates a turn, assigns its id and queues it for writing.
+
+        Returns:
+            The turn's id as a string (valid immediately, before the write happens).
+        """
+        turn.validate()
+        document = turn.to_mongo().to_dict()
+        document["_id"] = ObjectId()
+        if not self.running:
+            await conversations.insert_documents([document])
+            return str(document["_id"])
+
+        self._buffer.append(document)
+        _buffer_depth.set(len(self._buffer))
+        if len(self._buffer) >= settings.HISTORY_WRITE_BATCH_SIZE:
+            self._wakeup.set()
+        return str(document["_id"])
+
+    # --- Background flushing ---
+
+    async def start(self) -> None:
+        """Replays any spilled turns, then starts the flush loop (call on startup)."""
+        if self.running or not settings.HISTORY_WRITE_BEHIND_ENABLED:
+            return
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._stopping = False
+        await self.replay_spill()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=settings.HISTORY_WRITE_FLUSH_INTERVAL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"❌ History write-behind flush failed: {e}")
+
+    async def flush(self) -> None:
+        """Writes everything buffered so far; batches MongoDB rejects are spilled to disk."""
+        if self._flush_lock is None:
+            return
+        async with self._flush_lock:
+            wrote = False
+            while self._buffer:
+                batch = self._buffer[:settings.HISTORY_WRITE_BATCH_SIZE]
+                del self._buffer[:len(batch)]
+                _buffer_depth.set(len(self._buffer))
+                if await self._insert(batch):
+                    _turns_written.inc(len(batch), outcome="inserted")
+                    wrote = True
+                else:
+                    await asyncio.to_thread(self._append_to_spill, batch)
+                    _turns_written.inc(len(batch), outcome="spilled")
+        if wrote and os.path.exists(self.spill_path):
+            await self.replay_spill()
+
+    async def _insert(self, batch: List[Dict[str, Any]]) -> bool:
+        start = time.perf_counter()
+        try:
+            await conversations.insert_documents(batch)
+            return True
+        except BulkWriteError as e:
+            if _only_duplicates(e):
+                return True
+            print(f"❌ Failed to write {len(batch)} conversation turns: {e}")
+            return False
+        except Exception as e:
+            print(f"❌ Failed to write {len(batch)} conversation turns: {e}")
+            return False
+        finally:
+            _flush_seconds.observe(time.perf_counter() - start)
+
+    async def close(self) -> None:
+        """Stops the flush loop and writes (or spills) whatever is still buffered (call on shutdown)."""
+        if self._task is not None:
+            # Not cancelled: a flush interrupted mid-write would lose its batch
+            self._stopping = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        await self.flush()
+
+    # --- Spill file ---
+
+    def _append_to_spill(self, batch: List[Dict[str, Any]]) -> None:
+        lines = "".join(json_util.dumps(document, json_options=json_util.CANONICAL_JSON_OPTIONS) + "\n" for document in batch)
+        with open(self.spill_path, "a", encoding="utf-8") as spill:
+            spill.write(lines)
+            spill.flush()
+            os.fsync(spill.fileno())
+        print(f"⚠️ Spilled {len(batch)} conversation turns to {self.spill_path}")
+
+    def _claim_spill(self) -> Optional[str]:
+        """Atomically moves the spill file aside so new spills do not mix with the replay."""
+        claimed = f"{self.spill_path}.{os.getpid()}.replay"
+        try:
+            os.replace(self.spill_path, claimed)
+        except FileNotFoundError:
+            return None
+        return claimed
+
+    @staticmethod
+    def _read_spill(path: str) -> List[Dict[str, Any]]:
+        with open(path, encoding="utf-8") as spill:
+            return [json_util.loads(line) for line in spill if line.strip()]
+
+    async def replay_spill(self) -> int:
+        """
+        Writes the turns in the spill file to MongoDB.
+
+        Returns:
+            The number of turns replayed (0 if there was nothing to replay or MongoDB is still unavailable).
+        """
+        claimed = await asyncio.to_thread(self._claim_spill)
+        if claimed is None:
+            return 0
+        documents = await asyncio.to_thread(self._read_spill, claimed)
+        for start in range(0, len(documents), settings.HISTORY_WRITE_BATCH_SIZE):
+            batch = documents[start:start + settings.HISTORY_WRITE_BATCH_SIZE]
+            if not await self._insert(batch):
+                # Still unavailable: put the remainder back for the next attempt
+                await asyncio.to_thread(self._append_to_spill, documents[start:])
+                await asyncio.to_thread(os.remove, claimed)
+                replayed = start
+                break
+        else:
+            await asyncio.to_thread(os.remove, claimed)
+            replayed = len(documents)
+        if replayed:
+            _turns_written.inc(replayed, outcome="replayed")
+            print(f"✅ Replayed {replayed} spilled conversation turns.")
+        return replayed
+
+
+history_writer = HistoryWriteBuffer(settings.HISTORY_SPILL_PATH)
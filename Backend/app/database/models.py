@@ -1,5 +1,6 @@
-from mongoengine import Document, StringField, DateTimeField, BooleanField, connect
+from mongoengine import Document, StringField, DateTimeField, BooleanField, FloatField, IntField, BinaryField
 from datetime import datetime
+from app.core.config import settings
 
 class User(Document):
     """Stores user account information for authentication."""
@@ -25,9 +26,87 @@ class ConversationHistory(Document):
     user_input_text = StringField(required=True)
     ai_response_text = StringField(required=True)
     image_url = StringField() 
+    image_digest = StringField() # SHA-256 of the uploaded bytes: the turn's ImageAsset
     
     # Model Metadata
-    model_used = StringField(required=True, default="gemini-2.5-flash")
+    model_used = StringField(required=True) # The model that actually answered (see model_router)
     timestamp = DateTimeField(default=datetime.utcnow)
 
-    meta = {'collection': 'conversation_history'}
\ No newline at end of file
+    meta = {
+        'collection': 'conversation_history',
+        'indexes': [
+            # "Latest N turns for a user" and keyset pagination on (timestamp, _id):
+            # index scan in order, no in-memory sort
+            ('user_id', '-timestamp', '-_id'),
+            'session_id',
+            # Turns referencing an image (only turns that have one are indexed)
+            {'fields': ['image_digest'], 'sparse': True},
+            # Anonymous sessions are random uuid4s that nobody can read back: MongoDB deletes their turns
+            {
+                'fields': ['timestamp'],
+                'name': 'anonymous_turns_ttl',
+                'expireAfterSeconds': settings.HISTORY_ANONYMOUS_TTL_SECONDS,
+                'partialFilterExpression': {'is_anonymous': True},
+            },
+        ],
+    }
+
+class ConversationArchive(Document):
+    """Older turns of one user and day, moved out of conversation_history and compressed (see app/database/retention.py)."""
+    key = StringField(primary_key=True) # "<user_id>:<_id of the first turn>": re-running a compaction rewrites it
+    user_id = StringField(required=True)
+    day = DateTimeField(required=True) # UTC midnight
+    start_at = DateTimeField(required=True) # Timestamps of the oldest and the newest turn inside
+    end_at = DateTimeField(required=True)
+    turn_count = IntField(required=True)
+    raw_bytes = IntField(required=True) # BSON size of the turns before compression
+    payload = BinaryField(required=True) # zstd-compressed BSON (see app/database/archive.py)
+    created_at = DateTimeField(default=datetime.utcnow)
+
+    meta = {
+        'collection': 'conversation_archives',
+        'indexes': [
+            ('user_id', '-end_at'), # Paging back in time
+            ('user_id', 'start_at'), # Paging forward (delta sync from an archived turn)
+        ],
+    }
+
+class ImageAsset(Document):
+    """An uploaded image, stored once per distinct content (see app/agents/image_store.py)."""
+    digest = StringField(primary_key=True) # SHA-256 hex of the original upload bytes
+    secure_url = StringField(required=True)
+    mime_type = StringField()
+    size = IntField() # Bytes
+    created_at = DateTimeField(default=datetime.utcnow)
+
+    meta = {'collection': 'image_assets'}
+
+class ResponseCacheEntry(Document):
+    """Shared tier of the model response cache (see app/agents/response_cache.py)."""
+    key = StringField(primary_key=True) # xxh3-128 content hash of model + prompt + image
+    model = StringField(required=True)
+    response_text = StringField(required=True)
+    created_at = DateTimeField(default=datetime.utcnow)
+
+    meta = {
+        'collection': 'response_cache',
+        'indexes': [
+            # MongoDB deletes entries once they are older than the cache TTL
+            {'fields': ['created_at'], 'expireAfterSeconds': int(settings.RESPONSE_CACHE_TTL_SECONDS)},
+        ],
+    }
+
+class RateLimitBucket(Document):
+    """Token bucket shared by all workers (RATE_LIMIT_BACKEND=mongo, see app/core/rate_limit.py)."""
+    key = StringField(primary_key=True) # "<budget>:user:<id>" or "<budget>:ip:<address>"
+    tokens = FloatField(required=True)
+    updated_at = DateTimeField(required=True) # Server clock ($$NOW) of the last refill
+    expires_at = DateTimeField() # When the bucket would be full again (null for a rate of 0: never)
+
+    meta = {
+        'collection': 'rate_limit_buckets',
+        'indexes': [
+            # A full bucket carries no state: MongoDB deletes it
+            {'fields': ['expires_at'], 'expireAfterSeconds': 0},
+        ],
+    }
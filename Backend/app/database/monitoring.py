@@ -0,0 +1,31 @@
+"""
+MongoDB command latency, reported by the driver itself.
+
+`mongo_command_listener` is registered on both the MongoEngine and the async
+client (see `connection.pool_options()`), so every command is timed no matter
+which code path issued it. The driver calls the listener from its own threads;
+the metrics registry is thread-safe.
+"""
+from pymongo import monitoring
+
+from app.core.metrics import registry
+
+_command_seconds = registry.histogram("mongo_command_duration_seconds", "MongoDB command round trip, by command name.")
+_command_failures = registry.counter("mongo_command_failures_total", "MongoDB commands that returned an error, by command name.")
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Observes the driver-measured duration of every command."""
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        pass
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        _command_seconds.observe(event.duration_micros / 1_000_000, command=event.command_name)
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        _command_seconds.observe(event.duration_micros / 1_000_000, command=event.command_name)
+        _command_failures.inc(command=event.command_name)
+
+
+mongo_command_listener = MongoCommandMetrics()
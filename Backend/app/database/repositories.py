@@ -0,0 +1,478 @@
+"""
+Async data access for request handlers.
+
+The MongoEngine documents in `models.py` remain the schema: new documents are
+built and validated through them and converted with `to_mongo()`, then written
+with the async PyMongo client so no handler blocks the event loop on MongoDB.
+Reads return raw dicts (field names exactly as stored, `_id` included).
+"""
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+from bson.errors import InvalidId
+
+from app.core import auth_cache
+from app.core.config import settings
+from app.database.archive import Position, Turn, position, project, unpack_turns
+from app.database.connection import get_async_db
+from app.database.models import User, ConversationHistory, ConversationArchive, ImageAsset, ResponseCacheEntry, RateLimitBucket
+
+# Fields needed to build a HistoryItem; everything else stays on the server
+HISTORY_ITEM_PROJECTION = {
+    "session_id": 1,
+    "user_id": 1,
+    "is_anonymous": 1,
+    "user_input_text": 1,
+    "ai_response_text": 1,
+    "image_url": 1,
+    "timestamp": 1,
+}
+
+
+def _to_object_id(value: str) -> Optional[ObjectId]:
+    try:
+        return ObjectId(value)
+    except (InvalidId, TypeError):
+        return None
+
+
+class UserRepository:
+    """Async access to the `users` collection."""
+
+    collection_name = User._meta["collection"]
+
+    @property
+    def collection(self) -> Any:
+        return get_async_db()[self.collection_name]
+
+    async def find_by_email(self, email: str) -> Optional[Dict[str, Any]]:
+        return await self.collection.find_one({"email": email})
+
+    async def email_exists(self, email: str) -> bool:
+        return await self.collection.find_one({"email": email}, {"_id": 1}) is not None
+
+    async def username_exists(self, username: str) -> bool:
+        return await self.collection.find_one({"username": username}, {"_id": 1}) is not None
+
+    async def get_by_id(self, user_id: str, projection: Optional[Dict[str, int]] = None) -> Optional[Dict[str, Any]]:
+        object_id = _to_object_id(user_id)
+        if object_id is None:
+            return None
+        return await self.collection.find_one({"_id": object_id}, projection)
+
+    async def set_active(self, user_id: str, is_active: bool) -> bool:
+        """Activates/deactivates a user; returns whether the user exists."""
+        object_id = _to_object_id(user_id)
+        if object_id is None:
+            return False
+        result = await self.collection.update_one({"_id": object_id}, {"$set": {"is_active": is_active}})
+        auth_cache.invalidate_user(user_id)
+        return result.matched_count > 0
+
+    async def delete(self, user_id: str) -> bool:
+        """Deletes a user; returns whether a user was removed."""
+        object_id = _to_object_id(user_id)
+        if object_id is None:
+            return False
+        result = await self.collection.delete_one({"_id": object_id})
+        auth_cache.invalidate_user(user_id)
+        return result.deleted_count > 0
+
+    async def create(self, user: User) -> str:
+        """Validates and inserts a new user; returns its id as a string."""
+        user.validate()
+        document = user.to_mongo().to_dict()
+        result = await self.collection.insert_one(document)
+        return str(result.inserted_id)
+
+
+class ConversationRepository:
+    """Async access to the `conversation_history` collection."""
+
+    collection_name = ConversationHistory._meta["collection"]
+
+    @property
+    def collection(self) -> Any:
+        return get_async_db()[self.collection_name]
+
+    async def insert(self, turn: ConversationHistory) -> str:
+        """Validates and inserts one conversation turn; returns its id as a string."""
+        turn.validate()
+        document = turn.to_mongo().to_dict()
+        result = await self.collection.insert_one(document)
+        return str(result.inserted_id)
+
+    async def insert_documents(self, documents: List[Dict[str, Any]]) -> None:
+        """
+        Bulk-inserts already validated turn documents (see history_writer.py).
+
+        Unordered, so one duplicate `_id` does not stop the rest of the batch.
+        """
+        await self.collection.insert_many(documents, ordered=False)
+
+    async def recent_for_user(
+        self, user_id: str, limit: int, projection: Optional[Dict[str, int]] = HISTORY_ITEM_PROJECTION
+    ) -> List[Dict[str, Any]]:
+        """
+        Returns the user's latest turns, most recent first.
+
+        Served by the (user_id, -timestamp) index; only the projected fields are
+        sent over the wire.
+        """
+        cursor = self.collection.find({"user_id": user_id}, projection).sort("timestamp", -1).limit(limit)
+        docs = await cursor.to_list(length=limit)
+        if len(docs) < limit:
+            docs = await self._merge_archived(user_id, limit, docs, None, None, projection)
+        return docs
+
+    async def get_for_user(
+        self, user_id: str, turn_id: str, projection: Optional[Dict[str, int]] = None
+    ) -> Optional[Dict[str, Any]]:
+        """Returns one turn by id, only if it belongs to `user_id` (archived turns included)."""
+        object_id = _to_object_id(turn_id)
+        if object_id is None:
+            return None
+        doc = await self.collection.find_one({"_id": object_id, "user_id": user_id}, projection)
+        if doc is None and self._may_be_archived(object_id.generation_time.replace(tzinfo=None)):
+            turn = await conversation_archives.find_turn(user_id, object_id)
+            doc = project([turn], projection)[0] if turn is not None else None
+        return doc
+
+    async def page_for_user(
+        self,
+        user_id: str,
+        limit: int,
+        before: Optional[Tuple[datetime, ObjectId]] = None,
+        after: Optional[Tuple[datetime, ObjectId]] = None,
+        projection: Optional[Dict[str, int]] = HISTORY_ITEM_PROJECTION,
+    ) -> Tuple[List[Dict[str, Any]], bool]:
+        """
+        Keyset-paginated history on (timestamp, _id), most recent first.
+
+        Every page is a bounded range scan on the (user_id, -timestamp, -_id)
+        index, so deep pages cost the same as the first one. Pages reaching past
+        the live turns continue into the user's archives.
+
+        Args:
+            before: Only return turns strictly older than this position.
+            after: Only return turns strictly newer than this position.
+
+        Returns:
+            (turns, has_more): up to `limit` turns, newest first, and whether more
+            turns exist beyond this page in the direction being paged.
+        """
+        query: Dict[str, Any] = {"user_id": user_id}
+        direction = -1
+        if before is not None:
+            timestamp, object_id = before
+            query["$or"] = [{"timestamp": {"$lt": timestamp}}, {"timestamp": timestamp, "_id": {"$lt": object_id}}]
+        elif after is not None:
+            timestamp, object_id = after
+            query["$or"] = [{"timestamp": {"$gt": timestamp}}, {"timestamp": timestamp, "_id": {"$gt": object_id}}]
+            direction = 1
+
+        cursor = self.collection.find(query, projection).sort([("timestamp", direction), ("_id", direction)]).limit(limit + 1)
+        docs = await cursor.to_list(length=limit + 1)
+        if after is not None:
+            # Archived turns are older than every live one, so they come first when paging forward from among them
+            if self._may_be_archived(after[0]):
+                docs = await self._merge_archived(user_id, limit + 1, docs, None, after, projection)
+        elif len(docs) <= limit:
+            docs = await self._merge_archived(user_id, limit + 1, docs, before, None, projection)
+        has_more = len(docs) > limit
+        docs = docs[:limit]
+        if direction == 1:
+            docs.reverse()
+        return docs, has_more
+
+    async def iter_for_user(
+        self, user_id: str, projection: Optional[Dict[str, int]] = HISTORY_ITEM_PROJECTION
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Yields every turn of the user, oldest first, archived turns included.
+
+        The live turns are read through one cursor in batches of
+        HISTORY_EXPORT_BATCH_SIZE and merged with the archives (decompressed one
+        at a time), so memory stays bounded however long the history is.
+        """
+        cursor = (
+            self.collection.find({"user_id": user_id}, projection)
+            .sort([("timestamp", 1), ("_id", 1)])
+            .batch_size(settings.HISTORY_EXPORT_BATCH_SIZE)
+        )
+        archived = conversation_archives.iter_turns(user_id)
+        try:
+            pending = await anext(archived, None)
+            async for doc in cursor:
+                while pending is not None and position(pending) < position(doc):
+                    yield project([pending], projection)[0]
+                    pending = await anext(archived, None)
+                if pending is not None and pending["_id"] == doc["_id"]:
+                    # Archived but not yet deleted (an interrupted compaction): returned once
+                    pending = await anext(archived, None)
+                yield doc
+            while pending is not None:
+                yield project([pending], projection)[0]
+                pending = await anext(archived, None)
+        finally:
+            await archived.aclose()
+            await cursor.close()
+
+    async def users_with_turns_before(self, cutoff: datetime) -> List[str]:
+        """Ids of the logged-in users owning turns older than `cutoff`."""
+        user_ids = await self.collection.distinct("user_id", {"is_anonymous": False, "timestamp": {"$lt": cutoff}})
+        return [user_id for user_id in user_ids if user_id]
+
+    def turns_before(self, user_id: str, cutoff: datetime) -> Any:
+        """Cursor over the user's turns older than `cutoff`, oldest first (all fields)."""
+        query = {"user_id": user_id, "timestamp": {"$lt": cutoff}}
+        return self.collection.find(query).sort([("timestamp", 1), ("_id", 1)])
+
+    async def delete_ids(self, turn_ids: List[ObjectId]) -> int:
+        """Deletes turns by id; returns how many were removed."""
+        result = await self.collection.delete_many({"_id": {"$in": turn_ids}})
+        return result.deleted_count
+
+    @staticmethod
+    def _may_be_archived(timestamp: datetime) -> bool:
+        """Whether a turn this old can have been compacted (see app/database/retention.py)."""
+        return timestamp < datetime.utcnow() - timedelta(days=settings.HISTORY_ARCHIVE_AFTER_DAYS)
+
+    async def _merge_archived(
+        self,
+        user_id: str,
+        limit: int,
+        docs: List[Dict[str, Any]],
+        before: Optional[Position],
+        after: Optional[Position],
+        projection: Optional[Dict[str, int]],
+    ) -> List[Dict[str, Any]]:
+        """
+        Merges archived turns into a page of live ones, in the page's order.
+
+        A turn found in both (a compaction interrupted between writing the archive
+        and deleting the turns) is returned once.
+        """
+        if after is not None:
+            archived = await conversation_archives.newer_turns(user_id, limit, after)
+        else:
+            archived = await conversation_archives.older_turns(user_id, limit, before)
+        if not archived:
+            return docs
+        live_ids = {doc["_id"] for doc in docs}
+        merged = docs + project((turn for turn in archived if turn["_id"] not in live_ids), projection)
+        merged.sort(key=position, reverse=after is None)
+        return merged[:limit]
+
+
+class ConversationArchiveRepository:
+    """
+    Async access to the `conversation_archives` collection.
+
+    Each archive holds compressed turns of one user and day (see app/database/archive.py);
+    reads decompress only as many archives as the requested turns need.
+    """
+
+    collection_name = ConversationArchive._meta["collection"]
+
+    # Archives are fetched a few at a time: most reads need one or two of them
+    _BATCH_SIZE = 4
+
+    @property
+    def collection(self) -> Any:
+        return get_async_db()[self.collection_name]
+
+    async def put(self, archive: ConversationArchive) -> None:
+        """Writes an archive, replacing an earlier one with the same key (a re-run compaction)."""
+        archive.validate()
+        document = archive.to_mongo().to_dict()
+        await self.collection.replace_one({"_id": document["_id"]}, document, upsert=True)
+
+    async def _collect(self, cursor: Any, limit: int, newest_first: bool, keep: Any, bound: str) -> List[Turn]:
+        """
+        Unpacks archives in `bound` order until `limit` turns accepted by `keep` are
+        certain: the next archive lies entirely beyond the last one kept.
+        """
+        turns: List[Turn] = []
+        seen = set()
+        try:
+            async for archive in cursor:
+                if len(turns) >= limit:
+                    edge = turns[limit - 1]["timestamp"]
+                    if (archive[bound] < edge) if newest_first else (archive[bound] > edge):
+                        break
+                for turn in unpack_turns(archive["payload"]):
+                    # Re-chunked archives of an interrupted compaction may overlap
+                    if keep(turn) and turn["_id"] not in seen:
+                        seen.add(turn["_id"])
+                        turns.append(turn)
+                turns.sort(key=position, reverse=newest_first)
+                del turns[limit:]
+        finally:
+            await cursor.close()
+        return turns
+
+    async def older_turns(self, user_id: str, limit: int, before: Optional[Position] = None) -> List[Turn]:
+        """Up to `limit` archived turns strictly older than `before` (or the newest ones), newest first."""
+        query: Dict[str, Any] = {"user_id": user_id}
+        if before is not None:
+            query["start_at"] = {"$lte": before[0]}
+        cursor = self.collection.find(query, {"payload": 1, "end_at": 1}).sort("end_at", -1).batch_size(self._BATCH_SIZE)
+        keep = (lambda turn: position(turn) < before) if before is not None else (lambda turn: True)
+        return await self._collect(cursor, limit, True, keep, "end_at")
+
+    async def newer_turns(self, user_id: str, limit: int, after: Position) -> List[Turn]:
+        """Up to `limit` archived turns strictly newer than `after`, oldest first."""
+        query = {"user_id": user_id, "end_at": {"$gte": after[0]}}
+        cursor = self.collection.find(query, {"payload": 1, "start_at": 1}).sort("start_at", 1).batch_size(self._BATCH_SIZE)
+        return await self._collect(cursor, limit, False, lambda turn: position(turn) > after, "start_at")
+
+    async def iter_turns(self, user_id: str) -> AsyncIterator[Turn]:
+        """Yields all archived turns of the user, oldest first, one archive in memory at a time."""
+        cursor = self.collection.find({"user_id": user_id}, {"payload": 1}).sort("start_at", 1).batch_size(self._BATCH_SIZE)
+        last: Optional[Position] = None
+        try:
+            async for archive in cursor:
+                for turn in unpack_turns(archive["payload"]):
+                    # Re-chunked archives of an interrupted compaction may overlap
+                    if last is None or position(turn) > last:
+                        last = position(turn)
+                        yield turn
+        finally:
+            await cursor.close()
+
+    async def find_turn(self, user_id: str, object_id: ObjectId) -> Optional[Turn]:
+        """Looks an archived turn up by id; its ObjectId's creation time says which archives can hold it."""
+        created = object_id.generation_time.replace(tzinfo=None)
+        query = {
+            "user_id": user_id,
+            "start_at": {"$lte": created + timedelta(minutes=1)},
+            "end_at": {"$gte": created - timedelta(minutes=1)},
+        }
+        cursor = self.collection.find(query, {"payload": 1})
+        try:
+            async for archive in cursor:
+                for turn in unpack_turns(archive["payload"]):
+                    if turn["_id"] == object_id:
+                        return turn
+        finally:
+            await cursor.close()
+        return None
+
+
+class ImageAssetRepository:
+    """Async access to the `image_assets` collection (content digest -> Cloudinary URL)."""
+
+    collection_name = ImageAsset._meta["collection"]
+
+    @property
+    def collection(self) -> Any:
+        return get_async_db()[self.collection_name]
+
+    async def get_url(self, digest: str) -> Optional[str]:
+        """The stored URL of the image with this digest, or None."""
+        doc = await self.collection.find_one({"_id": digest}, {"secure_url": 1})
+        return doc["secure_url"] if doc else None
+
+    async def put(self, digest: str, secure_url: str, mime_type: Optional[str], size: int) -> str:
+        """
+        Records an uploaded image unless the digest is already known.
+
+        Returns:
+            The URL stored for the digest: `secure_url`, or the one recorded first when
+            another worker uploaded the same image concurrently.
+        """
+        asset = ImageAsset(digest=digest, secure_url=secure_url, mime_type=mime_type, size=size)
+        asset.validate()
+        document = asset.to_mongo().to_dict()
+        document.pop("_id")
+        doc = await self.collection.find_one_and_update(
+            {"_id": digest},
+            {"$setOnInsert": document},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+            projection={"secure_url": 1},
+        )
+        return doc["secure_url"]
+
+
+class ResponseCacheRepository:
+    """Async access to the `response_cache` collection."""
+
+    collection_name = ResponseCacheEntry._meta["collection"]
+
+    @property
+    def collection(self) -> Any:
+        return get_async_db()[self.collection_name]
+
+    async def get(self, key: str, not_before: datetime) -> Optional[Dict[str, Any]]:
+        """
+        Returns the cached answer (`response_text`, `model`) for `key` if it was stored at or after `not_before`.
+
+        The TTL monitor only runs about once a minute, so expiry is also checked here.
+        """
+        doc = await self.collection.find_one(
+            {"_id": key, "created_at": {"$gte": not_before}}, {"response_text": 1, "model": 1}
+        )
+        return doc
+
+    async def put(self, key: str, model: str, response_text: str) -> None:
+        """Stores (or refreshes) one cached answer."""
+        entry = ResponseCacheEntry(key=key, model=model, response_text=response_text)
+        entry.validate()
+        document = entry.to_mongo().to_dict()
+        await self.collection.replace_one({"_id": key}, document, upsert=True)
+
+
+class RateLimitRepository:
+    """Async access to the `rate_limit_buckets` collection."""
+
+    collection_name = RateLimitBucket._meta["collection"]
+
+    @property
+    def collection(self) -> Any:
+        return get_async_db()[self.collection_name]
+
+    async def take(self, key: str, cost: float, rate: float, burst: float) -> Tuple[bool, float]:
+        """
+        Refills the bucket at `rate` tokens/second (capped at `burst`) and takes `cost` tokens if available.
+
+        One atomic update using the server clock, so every worker sees the same bucket.
+        A `rate` of 0 is a fixed allowance that never refills (the bucket never expires).
+
+        Returns:
+            (allowed, tokens left after the update).
+        """
+        rate = max(0.0, rate)
+        elapsed = {"$max": [0, {"$divide": [{"$subtract": ["$$NOW", {"$ifNull": ["$updated_at", "$$NOW"]}]}, 1000]}]}
+        refilled = {"$min": [burst, {"$add": [{"$ifNull": ["$tokens", burst]}, {"$multiply": [elapsed, rate]}]}]}
+        doc = await self.collection.find_one_and_update(
+            {"_id": key},
+            [
+                {"$set": {"tokens": refilled, "updated_at": "$$NOW"}},
+                {"$set": {"allowed": {"$gte": ["$tokens", cost]}}},
+                {"$set": {
+                    "tokens": {"$cond": ["$allowed", {"$subtract": ["$tokens", cost]}, "$tokens"]},
+                }},
+                {"$set": {
+                    "expires_at": (
+                        {"$add": ["$$NOW", {"$multiply": [{"$subtract": [burst, "$tokens"]}, 1000 / rate]}]}
+                        if rate > 0 else None # Never full again: the TTL index skips null
+                    ),
+                }},
+            ],
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+            projection={"tokens": 1, "allowed": 1},
+        )
+        return doc["allowed"], doc["tokens"]
+
+
+users = UserRepository()
+conversations = ConversationRepository()
+conversation_archives = ConversationArchiveRepository()
+image_assets = ImageAssetRepository()
+response_cache_entries = ResponseCacheRepository()
+rate_limit_buckets = RateLimitRepository()
@@ -0,0 +1,149 @@
+"""
+Retention of conversation history.
+
+- Anonymous turns: their session ids are random, so nobody can read them back.
+  A partial TTL index on `timestamp` lets MongoDB delete them after
+  HISTORY_ANONYMOUS_TTL_SECONDS; nothing needs to run.
+- Turns of logged-in users older than HISTORY_ARCHIVE_AFTER_DAYS are compacted by
+  `compact()`. Each user's old turns are grouped by UTC day into
+  `conversation_archives` documents of up to HISTORY_ARCHIVE_MAX_TURNS turns,
+  zstd-compressed (see app/database/archive.py), then deleted from
+  `conversation_history`. The history endpoints read archives transparently.
+
+An archive is keyed by its first turn, so a run interrupted between writing an
+archive and deleting its turns is simply run again; reads return such turns once.
+
+Run it periodically (e.g. a daily cron job) from Backend/:
+    python -m app.database.retention [--dry-run] [--user USER_ID ...]
+"""
+import argparse
+import asyncio
+import sys
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from app.core.config import settings
+from app.database.archive import Turn, pack_turns
+from app.database.models import ConversationArchive
+from app.database.repositories import conversation_archives, conversations
+
+
+@dataclass
+class CompactionReport:
+    users: int = 0
+    turns: int = 0
+    archives: int = 0
+    raw_bytes: int = 0 # BSON size of the compacted turns
+    compressed_bytes: int = 0 # Size of the archive payloads
+    seconds: float = 0.0
+
+    @property
+    def ratio(self) -> float:
+        return self.raw_bytes / self.compressed_bytes if self.compressed_bytes else 0.0
+
+
+def archive_cutoff(now: Optional[datetime] = None) -> datetime:
+    """Turns older than this are compacted (UTC midnight, so a day is archived whole)."""
+    cutoff = (now or datetime.utcnow()) - timedelta(days=settings.HISTORY_ARCHIVE_AFTER_DAYS)
+    return cutoff.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+async def _archive(user_id: str, chunk: List[Turn], report: CompactionReport, dry_run: bool) -> None:
+    payload, raw_bytes = pack_turns(chunk)
+    report.archives += 1
+    report.turns += len(chunk)
+    report.raw_bytes += raw_bytes
+    report.compressed_bytes += len(payload)
+    if dry_run:
+        return
+    first, last = chunk[0], chunk[-1]
+    await conversation_archives.put(ConversationArchive(
+        key=f"{user_id}:{first['_id']}",
+        user_id=user_id,
+        day=first["timestamp"].replace(hour=0, minute=0, second=0, microsecond=0),
+        start_at=first["timestamp"],
+        end_at=last["timestamp"],
+        turn_count=len(chunk),
+        raw_bytes=raw_bytes,
+        payload=payload,
+    ))
+    # Only once the archive is stored: a crash before this line leaves the turns live
+    await conversations.delete_ids([turn["_id"] for turn in chunk])
+
+
+async def compact_user(user_id: str, cutoff: datetime, report: CompactionReport, dry_run: bool = False) -> None:
+    """Moves one user's turns older than `cutoff` into archives, one UTC day at a time."""
+    chunk: List[Turn] = []
+    cursor = conversations.turns_before(user_id, cutoff)
+    try:
+        async for turn in cursor:
+            if chunk and (turn["timestamp"].date() != chunk[0]["timestamp"].date()
+                          or len(chunk) >= settings.HISTORY_ARCHIVE_MAX_TURNS):
+                await _archive(user_id, chunk, report, dry_run)
+                chunk = []
+            chunk.append(turn)
+    finally:
+        await cursor.close()
+    if chunk:
+        await _archive(user_id, chunk, report, dry_run)
+
+
+async def compact(
+    cutoff: Optional[datetime] = None, user_ids: Optional[List[str]] = None, dry_run: bool = False
+) -> CompactionReport:
+    """
+    Compacts the turns of logged-in users older than `cutoff` into archives.
+
+    Args:
+        cutoff: Defaults to `archive_cutoff()`, and is never later: reads only look
+            for archived turns older than HISTORY_ARCHIVE_AFTER_DAYS.
+        user_ids: Only these users (default: every user with turns to compact).
+        dry_run: Measure what would be compacted without writing or deleting anything.
+
+    Returns:
+        What was (or would be) compacted, with the storage before and after.
+    """
+    start = time.perf_counter()
+    cutoff = min(cutoff or archive_cutoff(), archive_cutoff())
+    report = CompactionReport()
+    for user_id in user_ids or await conversations.users_with_turns_before(cutoff):
+        await compact_user(user_id, cutoff, report, dry_run)
+        report.users += 1
+    report.seconds = time.perf_counter() - start
+    return report
+
+
+async def _main(args: argparse.Namespace) -> CompactionReport:
+    # Imported here: the job opens (and closes) its own connections
+    from app.database.connection import close_async_db, close_db, connect_db
+
+    connect_db()
+    try:
+        return await compact(user_ids=args.user, dry_run=args.dry_run)
+    finally:
+        await close_async_db()
+        close_db()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Compacts old conversation history into compressed archives.")
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would be compacted.")
+    parser.add_argument("--user", action="append", help="Only compact this user id (repeatable).")
+    args = parser.parse_args()
+
+    try:
+        report = asyncio.run(_main(args))
+    except Exception as e:
+        print(f"❌ Compaction failed: {e}")
+        return 1
+    verb = "Would compact" if args.dry_run else "✅ Compacted"
+    print(f"{verb} {report.turns} turns of {report.users} users into {report.archives} archives: "
+          f"{report.raw_bytes / 1024:.0f} KiB -> {report.compressed_bytes / 1024:.0f} KiB "
+          f"({report.ratio:.1f}x) in {report.seconds:.1f} s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
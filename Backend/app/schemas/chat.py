@@ -1,6 +1,6 @@
 # app/schemas/chat.py
-from pydantic import BaseModel, Field
-from typing import Optional, List
+from pydantic import BaseModel, Field, AliasChoices, field_validator
+from typing import Any, Optional, List
 from datetime import datetime
 
 class ChatRequest(BaseModel):
@@ -15,6 +15,8 @@ class HistoryItem(BaseModel):
     Schema for a single conversation entry as it might be retrieved 
     from the database (e.g., for a history endpoint).
     """
+    # Turn id (MongoDB _id). Clients pass the newest one back as `history_since`.
+    id: Optional[str] = Field(default=None, validation_alias=AliasChoices("id", "_id"))
     session_id: str
     user_id: Optional[str] = None
     is_anonymous: bool
@@ -23,6 +25,11 @@ class HistoryItem(BaseModel):
     image_url: Optional[str] = None
     timestamp: datetime # Uses Python's datetime type
 
+    @field_validator("id", mode="before")
+    @classmethod
+    def _object_id_to_str(cls, value: Any) -> Optional[str]:
+        return None if value is None else str(value)
+
     class Config:
         """
         Configuration needed to map fields from the MongoDB/MongoEngine object.
@@ -36,6 +43,13 @@ class ChatResponse(BaseModel):
     session_id: str
     ai_response: str
     model_used: str 
+    # Id of the turn just stored (None if it could not be saved)
+    turn_id: Optional[str] = None
+    # Prompt tokens billed for this answer (None when it came from the response cache)
+    prompt_tokens: Optional[int] = None
+    # Prior turns of the conversation sent to the model with this message
+    context_turns: int = 0
     # NEW FIELD: Added to handle conditional history return in the router
     chat_history: List[HistoryItem] = Field(default_factory=list, 
-                                            description="History only returned for logged-in users.")
\ No newline at end of file
+                                            description="History only returned for logged-in users who ask for it "
+                                                        "(include_history or history_since).")
\ No newline at end of file
@@ -0,0 +1,20 @@
+# Benchmarks run fully offline against local stand-ins (see benchmarks/fakes.py).
+# Settings() requires these variables, so give them harmless defaults before
+# any `app.*` module is imported.
+import os
+
+for _name, _value in {
+    "MONGO_URI": "mongodb://localhost:27017/bench",
+    "GEMINI_API_KEY": "bench-fake-key",
+    "CLOUDINARY_CLOUD_NAME": "bench",
+    "CLOUDINARY_API_KEY": "bench",
+    "CLOUDINARY_API_SECRET": "bench",
+    # Benchmarks replay identical prompts and count model calls; bench_response_cache turns it on
+    "RESPONSE_CACHE_ENABLED": "false",
+    # Likewise for uploads of the same test image; bench_image_store turns it on
+    "IMAGE_STORE_ENABLED": "false",
+    # Load benchmarks drive many requests from one address; bench_rate_limit turns limiting on
+    "RATE_LIMIT_ENABLED": "false",
+    "CHAT_ADMISSION_MAX_CONCURRENCY": "100000",
+}.items():
+    os.environ.setdefault(_name, _value)
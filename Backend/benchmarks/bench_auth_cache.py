@@ -0,0 +1,92 @@
+"""
+Per-request authentication overhead of get_current_user_id with and without the auth cache.
+
+Calls the dependency directly (no HTTP) for a pool of signed-in users, so the
+numbers are the JWT decode plus the user lookup round trip and nothing else.
+Also checks that deactivating a user through the repository takes effect
+immediately despite the cache.
+
+Usage (from Backend/):
+    python -m benchmarks.bench_auth_cache --calls 2000 --users 50 --latency 0.002
+"""
+import argparse
+import asyncio
+import random
+import sys
+import time
+
+from fastapi.security import HTTPAuthorizationCredentials
+
+from benchmarks.fakes import percentile, use_mongomock
+
+
+async def _measure(calls: int, credentials: list, expected: dict) -> list:
+    from app.core.security import get_current_user_id
+
+    rng = random.Random(3)
+    samples = []
+    for _ in range(calls):
+        creds = rng.choice(credentials)
+        start = time.perf_counter()
+        user_id = await get_current_user_id(creds)
+        samples.append(time.perf_counter() - start)
+        assert user_id == expected[creds.credentials], user_id
+    return samples
+
+
+def _report(label: str, samples: list) -> float:
+    p50, p99 = percentile(samples, 50), percentile(samples, 99)
+    print(f"  {label:<14} p50 {p50 * 1000:7.3f} ms   p99 {p99 * 1000:7.3f} ms")
+    return p50
+
+
+async def run(calls: int, user_count: int, latency: float) -> bool:
+    from app.core import auth_cache
+    from app.core.config import settings
+    from app.core.security import create_access_token, get_current_user_id
+    from app.database.models import User
+    from app.database.repositories import users
+
+    use_mongomock(latency=latency)
+    credentials, expected = [], {}
+    for i in range(user_count):
+        user_id = await users.create(User(email=f"auth{i}@example.com", username=f"auth{i}", hashed_password="x"))
+        token = create_access_token({"user_id": user_id})
+        credentials.append(HTTPAuthorizationCredentials(scheme="Bearer", credentials=token))
+        expected[token] = user_id
+
+    print(f"{calls} get_current_user_id calls over {user_count} users ({latency * 1000:.1f} ms simulated round trip)")
+    settings.AUTH_CACHE_ENABLED = False
+    uncached = _report("cache off", await _measure(calls, credentials, expected))
+
+    settings.AUTH_CACHE_ENABLED = True
+    auth_cache.clear()
+    cached = _report("cache on", await _measure(calls, credentials, expected))
+    for name, stats in auth_cache.stats().items():
+        print(f"  {name} cache: {stats['hits']:.0f} hits, {stats['misses']:.0f} misses, {stats['size']} entries")
+    print(f"  speed-up (p50) : {uncached / cached:.1f}x")
+
+    # Deactivation must not be masked by the cached "active" entry
+    victim = credentials[0]
+    await users.set_active(expected[victim.credentials], False)
+    deactivated = await get_current_user_id(victim) is None
+    await users.set_active(expected[victim.credentials], True)
+    reactivated = await get_current_user_id(victim) == expected[victim.credentials]
+    print(f"  deactivation seen immediately: {deactivated}, reactivation: {reactivated}")
+    return deactivated and reactivated and cached < uncached
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=2000)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.002, help="Simulated MongoDB round trip (seconds).")
+    args = parser.parse_args()
+
+    ok = asyncio.run(run(args.calls, args.users, args.latency))
+    print("OK" if ok else "FAIL")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,79 @@
+"""
+Load test: N concurrent anonymous POST /api/v1/chat/ calls against a fake model.
+
+With a non-blocking agent the whole burst should finish in roughly one model
+latency (as long as N <= MODEL_MAX_CONCURRENCY), and the health check should
+answer immediately while the burst is in flight.
+
+Usage (from Backend/):
+    python -m benchmarks.bench_chat_concurrency --requests 20 --latency 0.5
+"""
+import argparse
+import asyncio
+import sys
+import time
+
+import httpx
+
+from benchmarks.fakes import FakeGenaiClient, use_mongomock
+
+
+async def run(requests: int, latency: float, with_async: bool) -> float:
+    from app.agents import multimodal_agent
+    from app.core.concurrency import ConcurrencyLimiter
+    from app.core.metrics import registry
+    from main import app
+
+    fake = FakeGenaiClient(latency=latency, with_async=with_async)
+    multimodal_agent.set_model_client(fake)
+    # Fresh limiter per event loop; size it to the burst so a single wave is expected
+    multimodal_agent.model_limiter = ConcurrencyLimiter("model_calls", limit=requests)
+    multimodal_agent._fallback_executor = None
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as http:
+        async def chat(i: int) -> int:
+            response = await http.post("/api/v1/chat/", data={"user_input_text": f"hello {i}"})
+            return response.status_code
+
+        start = time.perf_counter()
+        burst = asyncio.gather(*(chat(i) for i in range(requests)))
+        await asyncio.sleep(latency / 10)
+        health_start = time.perf_counter()
+        await http.get("/")
+        health_latency = time.perf_counter() - health_start
+        statuses = await burst
+        elapsed = time.perf_counter() - start
+
+    ratio = elapsed / latency
+    mode = "async client" if with_async else "executor fallback"
+    print(f"[{mode}] {requests} requests, model latency {latency:.3f}s")
+    print(f"  total wall time   : {elapsed:.3f}s ({ratio:.2f}x model latency)")
+    print(f"  health check      : {health_latency * 1000:.1f} ms during the burst")
+    print(f"  max in-flight     : {fake.max_in_flight}")
+    print(f"  statuses          : {sorted(set(statuses))}")
+    wait = registry.histogram("model_calls_wait_seconds")
+    print(f"  limiter wait      : {wait.count()} samples, {wait.total():.3f}s total")
+    return ratio
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--max-ratio", type=float, default=2.0, help="Fail if wall time exceeds this many model latencies.")
+    args = parser.parse_args()
+
+    use_mongomock()
+    worst = 0.0
+    for with_async in (True, False):
+        worst = max(worst, asyncio.run(run(args.requests, args.latency, with_async)))
+    if worst > args.max_ratio:
+        print(f"FAIL: burst took {worst:.2f}x model latency (limit {args.max_ratio}x)")
+        return 1
+    print("OK")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,75 @@
+"""
+Response size of POST /api/v1/chat/ for a logged-in user: full history echo vs delta sync.
+
+Runs a conversation of N turns three ways and reports mean response bytes
+per turn and how many history documents were read back from MongoDB:
+  - include_history=true (the previous always-on behaviour)
+  - default (no history echo)
+  - history_since=<previous turn_id> (delta sync)
+
+Usage (from Backend/):
+    python -m benchmarks.bench_chat_payload --turns 30
+"""
+import argparse
+import asyncio
+import sys
+from uuid import uuid4
+
+import httpx
+
+from benchmarks.fakes import FakeGenaiClient, use_mongomock
+
+
+async def _conversation(http: httpx.AsyncClient, turns: int, mode: str) -> tuple:
+    name = uuid4().hex[:10]
+    token = (await http.post("/api/v1/auth/signup", json={
+        "email": f"{name}@example.com", "username": name, "password": "bench-password"})).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    total_bytes, history_items, last_turn = 0, 0, None
+    for i in range(turns):
+        data = {"user_input_text": f"question {i}: " + "please explain in detail " * 4}
+        if mode == "full":
+            data["include_history"] = "true"
+        elif mode == "delta" and last_turn:
+            data["history_since"] = last_turn
+        response = await http.post("/api/v1/chat/", data=data, headers=headers)
+        body = response.json()
+        total_bytes += len(response.content)
+        history_items += len(body["chat_history"])
+        last_turn = body["turn_id"]
+    return total_bytes / turns, history_items / turns
+
+
+async def run(turns: int) -> bool:
+    from app.agents import multimodal_agent
+    from app.core.concurrency import ConcurrencyLimiter
+    from main import app
+
+    multimodal_agent.set_model_client(FakeGenaiClient(latency=0.0))
+    multimodal_agent.model_limiter = ConcurrencyLimiter("model_calls", limit=4)
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as http:
+        for mode in ("full", "none", "delta"):
+            results[mode] = await _conversation(http, turns, mode)
+
+    print(f"{turns}-turn conversation, mean per chat response:")
+    for mode, label in (("full", "include_history=true"), ("none", "default (no echo)"), ("delta", "history_since=<last turn_id>")):
+        size, items = results[mode]
+        print(f"  {label:<30} {size:8.0f} bytes, {items:5.1f} history items")
+    return results["delta"][0] < results["full"][0] / 2
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=30)
+    args = parser.parse_args()
+
+    use_mongomock()
+    ok = asyncio.run(run(args.turns))
+    print("OK" if ok else "FAIL")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,81 @@
+"""
+Time-to-first-token of POST /api/v1/chat/stream versus POST /api/v1/chat/.
+
+Also checks that a client disconnecting mid-stream closes the upstream model
+stream (no leaked generate_content_stream calls).
+
+Usage (from Backend/):
+    python -m benchmarks.bench_chat_stream --latency 1.0 --chunks 10
+"""
+import argparse
+import asyncio
+import sys
+import time
+
+import httpx
+
+from benchmarks.fakes import FakeGenaiClient, serve_app, use_mongomock
+
+PROMPT = "tell me a long story about a lighthouse keeper and the sea at night"
+
+
+async def run(latency: float, chunks: int) -> bool:
+    from app.agents import multimodal_agent
+    from app.core.concurrency import ConcurrencyLimiter
+    from main import app
+
+    fake = FakeGenaiClient(latency=latency, stream_chunks=chunks)
+    multimodal_agent.set_model_client(fake)
+    multimodal_agent.model_limiter = ConcurrencyLimiter("model_calls", limit=16)
+
+    async with serve_app(app) as base_url, httpx.AsyncClient(base_url=base_url, timeout=30) as http:
+        # 1. Non-streaming: first byte == last byte
+        start = time.perf_counter()
+        await http.post("/api/v1/chat/", data={"user_input_text": PROMPT})
+        blocking_total = time.perf_counter() - start
+
+        # 2. Streaming: time to the first `chunk` event and to `done`
+        start = time.perf_counter()
+        first_chunk = None
+        events = []
+        async with http.stream("POST", "/api/v1/chat/stream", data={"user_input_text": PROMPT}) as response:
+            async for line in response.aiter_lines():
+                if line.startswith("event: "):
+                    events.append(line[7:])
+                    if line == "event: chunk" and first_chunk is None:
+                        first_chunk = time.perf_counter() - start
+        stream_total = time.perf_counter() - start
+
+        # 3. Disconnect after the first chunk and make sure the upstream stream closes
+        async with http.stream("POST", "/api/v1/chat/stream", data={"user_input_text": PROMPT}) as response:
+            async for line in response.aiter_lines():
+                if line == "event: chunk":
+                    break
+        # Give the server two chunk intervals to notice, far less than the remaining stream
+        await asyncio.sleep(2 * latency / chunks)
+
+    print(f"model latency {latency:.3f}s split into {chunks} chunks")
+    print(f"  /chat/        first byte : {blocking_total * 1000:8.1f} ms")
+    print(f"  /chat/stream  first chunk: {(first_chunk or 0) * 1000:8.1f} ms")
+    print(f"  /chat/stream  complete   : {stream_total * 1000:8.1f} ms ({events.count('chunk')} chunks, done={'done' in events})")
+    print(f"  after disconnect: {fake.open_streams} open / {fake.aborted_streams} aborted upstream streams")
+    return (
+        first_chunk is not None and first_chunk < blocking_total / 2
+        and fake.open_streams == 0 and fake.aborted_streams == 1
+    )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=1.0)
+    parser.add_argument("--chunks", type=int, default=10)
+    args = parser.parse_args()
+
+    use_mongomock()
+    ok = asyncio.run(run(args.latency, args.chunks))
+    print("OK" if ok else "FAIL")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,240 @@
+"""
+Per-message overhead of the chat WebSocket vs one HTTP request per message, plus
+its heartbeat and backpressure behaviour.
+
+The app is served by uvicorn on loopback with MongoDB replaced by mongomock
+(--db-latency per round trip) and a fake model answering in --model-latency.
+
+  - overhead : --users logged-in users send --messages messages each, concurrently, as
+               POST /chat/ (multipart + bearer token per message), POST /chat/stream (SSE)
+               and over one WebSocket per user -> messages/s, p50/p95 per message
+  - image    : a binary frame followed by a chat message -> answered, uploaded once,
+               the saved turn carries the image URL
+  - heartbeat: a silent client gets {"type": "ping"} frames, then is closed (1000) once idle
+  - backlog  : 10 messages sent at once with CHAT_WS_MAX_PENDING_MESSAGES=4 -> 1 answering +
+               4 queued are answered in order, the rest get 429 error frames
+  - slow     : a client that stops reading a large streamed answer is disconnected (1008)
+               after CHAT_WS_SEND_TIMEOUT_SECONDS; the model stream is closed, nothing saved
+
+Usage (from Backend/):
+    python -m benchmarks.bench_chat_websocket --users 8 --messages 40
+"""
+import argparse
+import asyncio
+import json
+import socket
+import sys
+import time
+
+import httpx
+from websockets.asyncio.client import connect
+
+from benchmarks.fakes import FakeGenaiClient, FakeUploader, make_test_image, percentile, serve_app, use_mongomock
+
+MODES = ("POST /chat/", "POST /chat/stream", "WebSocket")
+
+
+def _ws_url(base_url: str, token: str = "") -> str:
+    return base_url.replace("http://", "ws://") + "/api/v1/chat/ws" + (f"?token={token}" if token else "")
+
+
+async def _until(ws, kind: str, message_id=None) -> dict:
+    """Reads frames until one of `kind` (for `message_id`, if given) arrives."""
+    while True:
+        frame = json.loads(await ws.recv())
+        if frame["type"] == kind and (message_id is None or frame.get("id") == message_id):
+            return frame
+        if frame["type"] == "error" and frame.get("id") == message_id:
+            raise AssertionError(frame)
+
+
+async def overhead(base_url: str, tokens: dict, args: argparse.Namespace) -> dict:
+    """Each mode has its own users, so every mode starts from the same (empty) conversations."""
+    results = {}
+
+    async def http_user(mode: str, token: str, u: int, latencies: list) -> None:
+        headers = {"Authorization": f"Bearer {token}"}
+        async with httpx.AsyncClient(base_url=base_url, timeout=60) as http:
+            for i in range(args.messages):
+                start = time.perf_counter()
+                if mode == "POST /chat/":
+                    response = await http.post("/api/v1/chat/", data={"user_input_text": f"user {u} message {i}"}, headers=headers)
+                    response.raise_for_status()
+                else:
+                    async with http.stream("POST", "/api/v1/chat/stream", data={"user_input_text": f"user {u} message {i}"},
+                                           headers=headers) as response:
+                        body = "".join([text async for text in response.aiter_text()])
+                        assert "event: done" in body, body
+                latencies.append(time.perf_counter() - start)
+
+    async def ws_user(token: str, u: int, latencies: list) -> None:
+        async with connect(_ws_url(base_url), additional_headers={"Authorization": f"Bearer {token}"}) as ws:
+            await _until(ws, "ready")
+            for i in range(args.messages):
+                start = time.perf_counter()
+                await ws.send(json.dumps({"type": "chat", "id": i, "text": f"user {u} message {i}"}))
+                await _until(ws, "done", i)
+                latencies.append(time.perf_counter() - start)
+
+    for mode in MODES:
+        latencies: list = []
+        start = time.perf_counter()
+        if mode == "WebSocket":
+            await asyncio.gather(*(ws_user(token, u, latencies) for u, token in enumerate(tokens[mode])))
+        else:
+            await asyncio.gather(*(http_user(mode, token, u, latencies) for u, token in enumerate(tokens[mode])))
+        elapsed = time.perf_counter() - start
+        results[mode] = (len(latencies) / elapsed, percentile(latencies, 50), percentile(latencies, 95))
+        rate, p50, p95 = results[mode]
+        print(f"  {mode:<18} {rate:7.1f} messages/s   p50 {p50 * 1000:6.2f} ms   p95 {p95 * 1000:6.2f} ms")
+    return results
+
+
+async def image(base_url: str, token: str) -> bool:
+    from app.agents import image_handler
+    from app.database.models import ConversationHistory
+
+    uploader = FakeUploader(latency=0.05)
+    image_handler.set_image_uploader(uploader)
+    async with connect(_ws_url(base_url, token)) as ws:
+        await _until(ws, "ready")
+        await ws.send(make_test_image(80, 60))
+        await ws.send(json.dumps({"type": "chat", "id": "img", "text": "what is in this picture?"}))
+        done = await _until(ws, "done", "img")
+    turn = ConversationHistory.objects(id=done["turn_id"]).first()
+    ok = uploader.uploads == 1 and turn is not None and bool(turn.image_url)
+    print(f"  image frame + chat: answered, {uploader.uploads} upload, turn image_url {turn.image_url if turn else None}")
+    return ok
+
+
+async def heartbeat(base_url: str) -> bool:
+    from app.core.config import settings
+
+    settings.CHAT_WS_HEARTBEAT_SECONDS, settings.CHAT_WS_IDLE_TIMEOUT_SECONDS = 0.2, 1.0
+    pings, start = 0, time.perf_counter()
+    async with connect(_ws_url(base_url)) as ws:
+        await _until(ws, "ready")
+        try:
+            async for frame in ws:
+                pings += json.loads(frame)["type"] == "ping"
+        except Exception:
+            pass
+        code = ws.close_code
+    elapsed = time.perf_counter() - start
+    settings.CHAT_WS_HEARTBEAT_SECONDS, settings.CHAT_WS_IDLE_TIMEOUT_SECONDS = 20.0, 300.0
+    print(f"  silent client: {pings} pings, closed with {code} after {elapsed:.1f} s (idle timeout 1.0 s)")
+    return pings >= 3 and code == 1000 and 0.9 < elapsed < 2.0
+
+
+async def backlog(base_url: str, fake: FakeGenaiClient) -> bool:
+    from app.core.config import settings
+
+    settings.CHAT_WS_MAX_PENDING_MESSAGES = 4
+    fake.latency = 0.2
+    answered, rejected = [], []
+    async with connect(_ws_url(base_url)) as ws:
+        await _until(ws, "ready")
+        for i in range(10):
+            await ws.send(json.dumps({"type": "chat", "id": i, "text": f"burst {i}"}))
+        while len(answered) + len(rejected) < 10:
+            frame = json.loads(await ws.recv())
+            if frame["type"] == "done":
+                answered.append(frame["id"])
+            elif frame["type"] == "error":
+                rejected.append((frame["id"], frame["status"]))
+    fake.latency = 0.0
+    print(f"  10 messages at once: answered {answered}, rejected {rejected}")
+    return answered == [0, 1, 2, 3, 4] and [status for _, status in rejected] == [429] * 5
+
+
+async def slow_reader(base_url: str, fake: FakeGenaiClient) -> bool:
+    from app.api.v1.chat_router import chat_ws_connections
+    from app.core.config import settings
+    from app.database.models import ConversationHistory
+
+    settings.CHAT_WS_SEND_TIMEOUT_SECONDS = 0.5
+    fake.latency, fake.stream_chunks = 0.5, 400
+    turns, aborted = ConversationHistory.objects.count(), fake.aborted_streams
+    start = time.perf_counter()
+    # No permessage-deflate (the repetitive answer would shrink to a few KB on the wire), a small
+    # fixed receive buffer and max_queue=1: once the client stops reading, the server's sends
+    # block after the ~4 MB of kernel send buffer instead of completing
+    host, port = base_url.removeprefix("http://").split(":")
+    sock = socket.socket()
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 64 * 1024)
+    sock.connect((host, int(port)))
+    sock.setblocking(False)
+    async with connect(_ws_url(base_url), sock=sock, compression=None, max_size=None, max_queue=1) as ws:
+        await _until(ws, "ready")
+        await ws.send(json.dumps({"type": "chat", "id": "big", "text": "word " * 1_600_000}))
+        await asyncio.sleep(3.0) # Not reading
+        frames = 0
+        try:
+            while True:
+                await asyncio.wait_for(ws.recv(), 5.0)
+                frames += 1
+        except Exception:
+            pass
+        code = ws.close_code
+    elapsed = time.perf_counter() - start
+    fake.latency, fake.stream_chunks = 0.0, 10
+    await asyncio.sleep(0.2)
+    open_connections = chat_ws_connections.value()
+    saved = ConversationHistory.objects.count() - turns
+    print(f"  client stopped reading a ~8 MB answer: closed with {code} after {elapsed:.1f} s ({frames} frames drained), "
+          f"model stream aborted: {fake.aborted_streams - aborted == 1}, turns saved: {saved}, open connections now: {open_connections}")
+    return code == 1008 and fake.aborted_streams - aborted == 1 and saved == 0 and open_connections == 0
+
+
+async def run(args: argparse.Namespace) -> bool:
+    from app.agents import multimodal_agent
+    from app.core.concurrency import ConcurrencyLimiter
+    from app.core import rate_limit
+    from app.core.security import create_access_token
+    from main import app
+
+    database = use_mongomock(latency=args.db_latency)
+    fake = FakeGenaiClient(latency=args.model_latency, stream_chunks=1)
+    multimodal_agent.set_model_client(fake)
+    multimodal_agent.model_limiter = ConcurrencyLimiter("model_calls", limit=1024)
+    rate_limit.chat_admission = ConcurrencyLimiter("chat_admission", limit=100_000)
+    users = database["users"]
+    tokens = {mode: [] for mode in MODES}
+    for m, mode in enumerate(MODES):
+        for u in range(args.users):
+            user_id = str(users.insert_one({"email": f"ws{m}.{u}@example.com", "username": f"ws{m}.{u}",
+                                            "hashed_password": "x", "is_active": True}).inserted_id)
+            tokens[mode].append(create_access_token({"user_id": user_id}))
+
+    async with serve_app(app) as base_url:
+        print("overhead:")
+        results = await overhead(base_url, tokens, args)
+        fake.stream_chunks = 10
+        print("image:")
+        ok = await image(base_url, tokens["WebSocket"][0])
+        print("heartbeat:")
+        ok &= await heartbeat(base_url)
+        print("backlog:")
+        ok &= await backlog(base_url, fake)
+        print("slow:")
+        ok &= await slow_reader(base_url, fake)
+    ws_rate, ws_p50, _ = results["WebSocket"]
+    http_rate, http_p50, _ = results["POST /chat/"]
+    return ok and ws_rate > http_rate and ws_p50 < http_p50
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=8)
+    parser.add_argument("--messages", type=int, default=40)
+    parser.add_argument("--model-latency", type=float, default=0.0)
+    parser.add_argument("--db-latency", type=float, default=0.002, help="Simulated MongoDB round trip (seconds).")
+    args = parser.parse_args()
+
+    ok = asyncio.run(run(args))
+    print("OK" if ok else "FAIL")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,120 @@
+"""
+Prompt size and history reads as a logged-in conversation grows.
+
+Sends a long sequence of chat turns for one user and records, per turn, the
+prompt tokens reported in the response and the number of history documents
+read from MongoDB. With the token-budgeted window and rolling summary the
+prompt size levels off; the naive alternative (every prior turn verbatim) is
+shown for comparison. After the per-session cache is cleared, the next turn
+rebuilds the context from MongoDB once.
+
+Usage (from Backend/):
+    python -m benchmarks.bench_conversation_context --turns 150 --message-chars 800
+"""
+import argparse
+import asyncio
+import sys
+import time
+from uuid import uuid4
+
+import httpx
+
+from benchmarks.fakes import FakeGenaiClient, use_mongomock
+
+
+def _count_docs(repository, name: str, counter: dict) -> None:
+    """Wraps a repository method so the number of documents it returns is tallied."""
+    original = getattr(repository, name)
+
+    async def wrapper(*args, **kwargs):
+        result = await original(*args, **kwargs)
+        docs = result[0] if isinstance(result, tuple) else result
+        counter["docs"] += len(docs)
+        counter["queries"] += 1
+        return result
+
+    setattr(repository, name, wrapper)
+
+
+async def run(turns: int, message_chars: int) -> bool:
+    from app.agents import conversation_context, multimodal_agent
+    from app.core.concurrency import ConcurrencyLimiter
+    from app.core.config import settings
+    from app.core.metrics import registry
+    from app.database.repositories import conversations
+    from main import app
+
+    use_mongomock()
+    fake = FakeGenaiClient(latency=0.0)
+    multimodal_agent.set_model_client(fake)
+    multimodal_agent.model_limiter = ConcurrencyLimiter("model_calls", limit=settings.MODEL_MAX_CONCURRENCY)
+    counter = {"docs": 0, "queries": 0}
+    _count_docs(conversations, "page_for_user", counter)
+    _count_docs(conversations, "recent_for_user", counter)
+
+    filler = ("lorem ipsum dolor sit amet " * (message_chars // 27 + 1))[:message_chars]
+    samples = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as http:
+        name = uuid4().hex[:12]
+        response = await http.post("/api/v1/auth/signup", json={
+            "email": f"{name}@example.com", "username": name, "password": "bench-password",
+        })
+        headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+        async def chat(i: int) -> dict:
+            before = dict(counter)
+            start = time.perf_counter()
+            response = await http.post("/api/v1/chat/", headers=headers, data={"user_input_text": f"turn {i}: {filler}"})
+            elapsed = time.perf_counter() - start
+            assert response.status_code == 200, response.text
+            await asyncio.sleep(0)  # let a pending summary task run
+            body = response.json()
+            return {
+                "prompt_tokens": body["prompt_tokens"], "context_turns": body["context_turns"],
+                "docs": counter["docs"] - before["docs"], "queries": counter["queries"] - before["queries"],
+                "seconds": elapsed,
+            }
+
+        for i in range(turns):
+            samples.append(await chat(i))
+
+        conversation_context.clear()
+        rebuilt = await chat(turns)
+
+    print(f"{turns} turns, {message_chars}-char messages, budget {settings.CONTEXT_HISTORY_TOKEN_BUDGET} tokens "
+          f"+ {settings.CONTEXT_SUMMARY_MAX_TOKENS} summary")
+    print("  turn  prompt tokens  naive tokens  context turns  docs read")
+    # Naive: every earlier message and answer (~message_chars each) sent verbatim
+    naive = samples[0]["prompt_tokens"]
+    for i, sample in enumerate(samples):
+        if i in (0, 1, 2, 5, 10, 20, 50, 100, turns - 1):
+            print(f"  {i:4d}  {sample['prompt_tokens']:13d}  {naive:12d}  {sample['context_turns']:13d}  {sample['docs']:9d}")
+        naive += 2 * (message_chars // 4 + 4)
+    print(f"  after cache clear: {rebuilt['prompt_tokens']} prompt tokens, {rebuilt['docs']} docs read "
+          f"in {rebuilt['queries']} queries (rebuild)")
+    summaries = registry.counter("context_summaries_total")
+    print(f"  summary updates  : {summaries.value(outcome='model'):.0f} by the model, "
+          f"{summaries.value(outcome='extractive'):.0f} extractive")
+
+    steady = samples[turns // 2:]
+    ceiling = settings.CONTEXT_HISTORY_TOKEN_BUDGET + settings.CONTEXT_SUMMARY_MAX_TOKENS + message_chars // 2
+    bounded = max(s["prompt_tokens"] for s in steady) <= ceiling
+    no_rereads = all(s["docs"] == 0 for s in samples[1:])
+    print(f"  prompt bounded by {ceiling}: {bounded}; no history re-reads on cached turns: {no_rereads}")
+    return bounded and no_rereads
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=150)
+    parser.add_argument("--message-chars", type=int, default=800)
+    args = parser.parse_args()
+
+    ok = asyncio.run(run(args.turns, args.message_chars))
+    print("OK" if ok else "FAIL")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,204 @@
+"""
+Memory and time of a full history export (GET /api/v1/history/export) as history grows.
+
+For each --turns size, one user gets that many turns spread over --days days; the
+turns older than HISTORY_ARCHIVE_AFTER_DAYS are stored as zstd archives, the way
+python -m app.database.retention leaves them (one archived turn is also left live,
+like an interrupted compaction). The app is served by uvicorn on loopback.
+
+  - export : the client streams the export (none, gzip, zstd), decompresses it on
+             the fly and checks every line: all turns, once each, oldest first
+             -> time, turns/s, bytes sent
+  - memory : the same export under tracemalloc -> peak Python memory of the server
+             and client together, against --memory-ceiling-mib
+  - before : the only way to export before: one history page as large as the whole
+             history, built as a list and serialized in one go (peak memory)
+
+Passes when every export is complete, the peak stays under the ceiling and flat
+across sizes, and the time per turn stays flat (export time linear in history size).
+
+Usage (from Backend/):
+    python -m benchmarks.bench_history_export --turns 10000 100000
+"""
+import argparse
+import asyncio
+import calendar
+import random
+import struct
+import sys
+import time
+import tracemalloc
+import zlib
+from datetime import datetime, timedelta
+
+import httpx
+import orjson
+import zstandard
+from bson import ObjectId
+
+from benchmarks.fakes import serve_app, use_mongomock
+
+COMPRESSIONS = ("none", "gzip", "zstd")
+
+_WORDS = (
+    "the model request response image upload cache token user session history page cursor index query latency "
+    "function return value error retry timeout python async await database document field schema validate config"
+).split()
+
+
+def _object_id(timestamp: datetime, rng: random.Random) -> ObjectId:
+    return ObjectId(struct.pack(">I", calendar.timegm(timestamp.utctimetuple())) + rng.randbytes(8))
+
+
+def _seed(database, label: str, turns: int, days: int, now: datetime) -> str:
+    """Seeds one user's history (live turns + archives); returns the user id."""
+    from app.database.archive import pack_turns
+    from app.database.models import ConversationArchive, ConversationHistory
+    from app.database.retention import archive_cutoff
+
+    rng = random.Random(turns)
+    user_id = str(database["users"].insert_one({"email": f"export.{label}@example.com", "username": f"export.{label}",
+                                                "hashed_password": "x", "is_active": True}).inserted_id)
+    docs = []
+    for _ in range(turns):
+        timestamp = (now - timedelta(seconds=rng.randint(0, days * 86_400))).replace(microsecond=rng.randint(0, 999) * 1000)
+        docs.append({
+            "_id": _object_id(timestamp, rng), "session_id": user_id, "user_id": user_id, "is_anonymous": False,
+            "user_input_text": " ".join(rng.choice(_WORDS) for _ in range(10)) + "?",
+            "ai_response_text": " ".join(rng.choice(_WORDS) for _ in range(rng.randint(40, 120))) + ".",
+            "model_used": "gemini-2.5-flash", "timestamp": timestamp,
+        })
+    docs.sort(key=lambda doc: (doc["timestamp"], doc["_id"]))
+
+    cutoff = archive_cutoff(now)
+    old = [doc for doc in docs if doc["timestamp"] < cutoff]
+    archives = []
+    chunk: list = []
+    for doc in old + [None]:
+        if chunk and (doc is None or doc["timestamp"].date() != chunk[0]["timestamp"].date() or len(chunk) >= 500):
+            payload, raw_bytes = pack_turns(chunk)
+            archives.append(ConversationArchive(
+                key=f"{user_id}:{chunk[0]['_id']}", user_id=user_id,
+                day=chunk[0]["timestamp"].replace(hour=0, minute=0, second=0, microsecond=0),
+                start_at=chunk[0]["timestamp"], end_at=chunk[-1]["timestamp"], turn_count=len(chunk),
+                raw_bytes=raw_bytes, payload=payload,
+            ).to_mongo().to_dict())
+            chunk = []
+        if doc is not None:
+            chunk.append(doc)
+    if archives:
+        database[ConversationArchive._meta["collection"]].insert_many(archives)
+    # Live: the recent turns, plus one archived turn whose deletion "did not happen"
+    live = docs[len(old):] + old[-1:]
+    database[ConversationHistory._meta["collection"]].insert_many(live)
+    return user_id
+
+
+async def _download(http: httpx.AsyncClient, token: str, compression: str) -> dict:
+    """Streams one export, decompressing and checking it line by line (constant memory)."""
+    decompressor = (
+        zlib.decompressobj(16 + zlib.MAX_WBITS) if compression == "gzip"
+        else zstandard.ZstdDecompressor().decompressobj() if compression == "zstd"
+        else None
+    )
+    lines, sent, ordered, rest, last = 0, 0, True, b"", None
+    async with http.stream("GET", "/api/v1/history/export", params={"compression": compression},
+                           headers={"Authorization": f"Bearer {token}"}) as response:
+        response.raise_for_status()
+        async for data in response.aiter_raw():
+            sent += len(data)
+            data = rest + (decompressor.decompress(data) if decompressor else data)
+            *complete, rest = data.split(b"\n")
+            for line in complete:
+                item = orjson.loads(line)
+                key = (item["timestamp"], item["id"])
+                ordered &= last is None or key > last
+                last = key
+                lines += 1
+    return {"lines": lines, "bytes": sent, "ordered": ordered and not rest}
+
+
+async def _materialized_peak(user_id: str, turns: int) -> int:
+    """Peak memory of the previous approach: one page holding the whole history, serialized at once."""
+    from app.database.repositories import conversations
+    from app.schemas.chat import HistoryItem
+
+    tracemalloc.start()
+    docs, _ = await conversations.page_for_user(user_id, turns + 1)
+    body = orjson.dumps([HistoryItem.model_validate(doc).model_dump() for doc in docs])
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    del docs, body
+    return peak
+
+
+async def run(args: argparse.Namespace) -> bool:
+    from app.core.config import settings
+    from app.core.security import create_access_token
+    from main import app
+
+    database = use_mongomock(latency=args.db_latency)
+    settings.HISTORY_ARCHIVE_AFTER_DAYS = args.archive_after_days
+    now = datetime.utcnow()
+    users = {}
+    for turns in args.turns:
+        start = time.perf_counter()
+        users[turns] = _seed(database, str(turns), turns, args.days, now)
+        print(f"seeded {turns} turns over {args.days} days in {time.perf_counter() - start:.1f} s")
+
+    ok = True
+    results = {}
+    async with serve_app(app) as base_url:
+        async with httpx.AsyncClient(base_url=base_url, timeout=600) as http:
+            for turns, user_id in users.items():
+                token = create_access_token({"user_id": user_id})
+                for compression in COMPRESSIONS:
+                    start = time.perf_counter()
+                    result = await _download(http, token, compression)
+                    elapsed = time.perf_counter() - start
+
+                    tracemalloc.start()
+                    await _download(http, token, compression)
+                    peak = tracemalloc.get_traced_memory()[1]
+                    tracemalloc.stop()
+
+                    complete = result["lines"] == turns and result["ordered"]
+                    ok &= complete
+                    results[turns, compression] = (elapsed, peak, result["bytes"])
+                    print(f"  {turns:>7} turns  {compression:<5} {elapsed:6.2f} s  {turns / elapsed:8.0f} turns/s  "
+                          f"{result['bytes'] / 2**20:7.1f} MiB sent  peak {peak / 2**20:5.1f} MiB  "
+                          f"{'complete, ordered' if complete else f'INCOMPLETE ({result}'}")
+
+    largest, smallest = max(args.turns), min(args.turns)
+    before = await _materialized_peak(users[largest], largest)
+    print(f"before: {largest} turns as one page + one JSON body: peak {before / 2**20:.1f} MiB")
+
+    for compression in COMPRESSIONS:
+        small_time, small_peak, _ = results[smallest, compression]
+        large_time, large_peak, _ = results[largest, compression]
+        per_turn_growth = (large_time / largest) / (small_time / smallest)
+        flat = large_peak <= max(small_peak * 1.5, small_peak + 2 * 2**20)
+        print(f"{compression:<5}: peak {small_peak / 2**20:.1f} -> {large_peak / 2**20:.1f} MiB "
+              f"({'flat' if flat else 'GROWS'}, ceiling {args.memory_ceiling_mib} MiB); "
+              f"time per turn x{per_turn_growth:.2f} from {smallest} to {largest} turns")
+        ok &= flat and large_peak <= args.memory_ceiling_mib * 2**20 and per_turn_growth < 1.5
+    ok &= all(results[largest, c][2] < results[largest, "none"][2] for c in ("gzip", "zstd"))
+    return ok
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--archive-after-days", type=int, default=30)
+    parser.add_argument("--memory-ceiling-mib", type=float, default=8)
+    parser.add_argument("--db-latency", type=float, default=0.0005, help="Simulated MongoDB round trip (seconds).")
+    args = parser.parse_args()
+
+    ok = asyncio.run(run(args))
+    print("OK" if ok else "FAIL")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
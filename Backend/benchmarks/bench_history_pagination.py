@@ -0,0 +1,91 @@
+"""
+Cost of deep history pages: keyset cursors vs skip/limit.
+
+Seeds one user with many turns, walks every page of GET /api/v1/history/
+through the before-cursors, and compares first-page vs last-page latency
+with a skip()-based query at the same depth.
+
+Usage (from Backend/):
+    python -m benchmarks.bench_history_pagination --turns 20000 --page-size 50
+    python -m benchmarks.bench_history_pagination --mongo-uri mongodb://localhost:27017/bench --turns 200000
+"""
+import argparse
+import asyncio
+import sys
+import time
+from datetime import datetime, timedelta
+
+import httpx
+
+from benchmarks.fakes import use_mongomock
+
+
+async def run(turns: int, page_size: int, mongo_uri: str) -> bool:
+    from app.core.config import settings
+    from app.core.security import create_access_token
+    from app.database import connection
+    from app.database.models import ConversationHistory
+    from main import app
+
+    if mongo_uri:
+        settings.MONGO_URI = mongo_uri
+        connection.connect_db()
+        from mongoengine import get_db
+        database = get_db()
+    else:
+        database = use_mongomock()
+
+    users = database["users"]
+    users.delete_many({"email": "pager@example.com"})
+    user_id = str(users.insert_one({"email": "pager@example.com", "username": "pager", "hashed_password": "x", "is_active": True}).inserted_id)
+    collection = database[ConversationHistory._meta["collection"]]
+    collection.delete_many({"user_id": user_id})
+    base = datetime(2025, 1, 1)
+    for start in range(0, turns, 10_000):
+        collection.insert_many([
+            {"session_id": user_id, "user_id": user_id, "is_anonymous": False, "user_input_text": f"q{i}",
+             "ai_response_text": "answer " * 50, "model_used": "gemini-2.5-flash", "timestamp": base + timedelta(seconds=i)}
+            for i in range(start, min(turns, start + 10_000))
+        ])
+    connection.ensure_indexes()
+
+    headers = {"Authorization": f"Bearer {create_access_token({'user_id': user_id})}"}
+    page_times, seen, cursor = [], 0, None
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as http:
+        while True:
+            params = {"limit": page_size, **({"before": cursor} if cursor else {})}
+            start = time.perf_counter()
+            response = await http.get("/api/v1/history/", params=params, headers=headers)
+            page_times.append(time.perf_counter() - start)
+            seen += len(response.json())
+            cursor = response.headers.get("x-next-cursor")
+            if not cursor:
+                break
+
+    def skip_page(skip: int) -> float:
+        start = time.perf_counter()
+        list(collection.find({"user_id": user_id}).sort([("timestamp", -1), ("_id", -1)]).skip(skip).limit(page_size))
+        return time.perf_counter() - start
+
+    deepest = (len(page_times) - 1) * page_size
+    print(f"{turns} turns, {len(page_times)} pages of {page_size} ({seen} turns returned)")
+    print(f"  keyset  first page : {page_times[0] * 1000:8.2f} ms   last page: {page_times[-1] * 1000:8.2f} ms")
+    print(f"  skip()  first page : {skip_page(0) * 1000:8.2f} ms   last page: {skip_page(deepest) * 1000:8.2f} ms (skip={deepest})")
+    return seen == turns
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=5000)
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--mongo-uri", default="")
+    args = parser.parse_args()
+
+    ok = asyncio.run(run(args.turns, args.page_size, args.mongo_uri))
+    print("OK" if ok else "FAIL")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,151 @@
+"""
+p50/p99 latency of "latest 50 turns for a user" before and after the history indexes.
+
+Seeds synthetic conversation turns spread over many users, then times the
+history query:
+  1. without secondary indexes, MongoEngine Documents -> to_mongo() -> HistoryItem (old path)
+  2. without secondary indexes, async repository with projection -> HistoryItem
+  3. with the declared (user_id, -timestamp) index, async repository with projection
+
+Index effects only show on a real server (--mongo-uri, default 1M turns), and
+only there do the timings decide the verdict. mongomock ignores indexes and its
+timings are noise, so without --mongo-uri they are printed for information and
+the verdict checks what is deterministic: the projected reads return the same
+turns, in the same order, as the old path, and no field outside the projection.
+
+Usage (from Backend/):
+    python -m benchmarks.bench_history_reads --mongo-uri mongodb://localhost:27017/bench --turns 1000000
+    python -m benchmarks.bench_history_reads --turns 20000
+"""
+import argparse
+import asyncio
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.fakes import percentile, use_mongomock
+
+USERS = 2000
+
+
+def _seed(collection, turns: int) -> None:
+    base = datetime(2025, 1, 1)
+    batch = []
+    for i in range(turns):
+        user = f"user-{i % USERS}"
+        batch.append({
+            "session_id": user,
+            "user_id": user,
+            "is_anonymous": False,
+            "user_input_text": f"question {i} " + "lorem ipsum " * 5,
+            "ai_response_text": f"answer {i} " + "dolor sit amet " * 60,
+            "image_url": None,
+            "model_used": "gemini-2.5-flash",
+            "timestamp": base + timedelta(seconds=i),
+        })
+        if len(batch) == 10_000:
+            collection.insert_many(batch)
+            batch = []
+    if batch:
+        collection.insert_many(batch)
+
+
+def _report(label: str, samples: list) -> float:
+    p50, p99 = percentile(samples, 50), percentile(samples, 99)
+    print(f"  {label:<44} p50 {p50 * 1000:8.2f} ms   p99 {p99 * 1000:8.2f} ms")
+    return p50
+
+
+async def run(turns: int, queries: int, mongo_uri: str) -> bool:
+    from app.core.config import settings
+    from app.database import connection
+    from app.database.models import ConversationHistory
+    from app.database.repositories import HISTORY_ITEM_PROJECTION, conversations
+    from app.schemas.chat import HistoryItem
+
+    if mongo_uri:
+        settings.MONGO_URI = mongo_uri
+        connection.connect_db()
+        from mongoengine import get_db
+        database = get_db()
+    else:
+        database = use_mongomock()
+
+    collection = database[ConversationHistory._meta["collection"]]
+    collection.drop()
+    print(f"seeding {turns} turns over {USERS} users ...")
+    _seed(collection, turns)
+    rng = random.Random(7)
+    users = [f"user-{rng.randrange(USERS)}" for _ in range(queries)]
+
+    def old_path(user_id: str) -> list:
+        docs = ConversationHistory.objects(user_id=user_id).order_by('-timestamp').limit(50)
+        return [HistoryItem.model_validate(doc.to_mongo()) for doc in docs]
+
+    async def new_path(user_id: str) -> list:
+        return [HistoryItem.model_validate(doc) for doc in await conversations.recent_for_user(user_id, limit=50)]
+
+    async def timed_async(fn) -> list:
+        samples = []
+        for user_id in users:
+            start = time.perf_counter()
+            await fn(user_id)
+            samples.append(time.perf_counter() - start)
+        return samples
+
+    def timed_sync(fn) -> list:
+        samples = []
+        for user_id in users:
+            start = time.perf_counter()
+            fn(user_id)
+            samples.append(time.perf_counter() - start)
+        return samples
+
+    ConversationHistory._collection = None  # make MongoEngine re-resolve after the drop
+    collection.drop_indexes()
+    print(f"{queries} history reads (limit 50):")
+    old = _report("no index, Document -> to_mongo -> HistoryItem", timed_sync(old_path))
+    _report("no index, projected dicts -> HistoryItem", await timed_async(new_path))
+
+    connection.ensure_indexes()
+    indexed = _report("(user_id, -timestamp) index, projected dicts", await timed_async(new_path))
+
+    allowed = set(HISTORY_ITEM_PROJECTION) | {"_id"}
+    same, extra_fields = 0, set()
+    for user_id in users:
+        docs = await conversations.recent_for_user(user_id, limit=50)
+        for doc in docs:
+            extra_fields |= set(doc) - allowed
+        same += [HistoryItem.model_validate(doc) for doc in docs] == old_path(user_id)
+    consistent = same == len(users) and not extra_fields
+    print(f"  projected reads match the old path for {same}/{len(users)} users; "
+          f"fields outside the projection: {sorted(extra_fields) or 'none'}")
+
+    if mongo_uri:
+        plan = collection.find({"user_id": users[0]}).sort("timestamp", -1).limit(50).explain()
+        stage = plan["queryPlanner"]["winningPlan"]
+        stages = []
+        while stage:
+            stages.append(stage.get("stage"))
+            stage = stage.get("inputStage")
+        print(f"  winning plan: {' <- '.join(stages)}")
+        return consistent and indexed < old
+    return consistent
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo-uri", default="", help="Real local mongod (required for index timings).")
+    parser.add_argument("--turns", type=int, default=0, help="Default: 1,000,000 with --mongo-uri, else 20,000.")
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    turns = args.turns or (1_000_000 if args.mongo_uri else 20_000)
+    ok = asyncio.run(run(turns, args.queries, args.mongo_uri))
+    print("OK" if ok else "FAIL")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
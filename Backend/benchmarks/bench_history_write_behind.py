@@ -0,0 +1,121 @@
+"""
+Chat latency with write-behind history persistence, plus its failure handling.
+
+1. Latency: sequential anonymous chats with a simulated MongoDB round trip,
+   with the turn written inline vs queued on the write-behind buffer.
+2. Batching: a burst of concurrent chats, counting insert_many calls.
+3. Outage: MongoDB rejects writes -> turns are spilled to the append-only file;
+   after MongoDB is back, start() replays the file and every turn is stored once.
+4. Shutdown: close() flushes turns still in the buffer.
+
+Usage (from Backend/):
+    python -m benchmarks.bench_history_write_behind --requests 100 --latency 0.005
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.fakes import FakeGenaiClient, percentile, use_mongomock
+
+
+async def _chat(http: httpx.AsyncClient, i: int) -> float:
+    start = time.perf_counter()
+    response = await http.post("/api/v1/chat/", data={"user_input_text": f"write-behind {i}"})
+    assert response.status_code == 200, response.text
+    assert response.json()["turn_id"], "turn id must be known before the write"
+    return time.perf_counter() - start
+
+
+async def run(requests: int, latency: float) -> bool:
+    from pymongo.errors import AutoReconnect
+    from app.agents import multimodal_agent
+    from app.core.concurrency import ConcurrencyLimiter
+    from app.core.config import settings
+    from app.database.history_writer import history_writer
+    from app.database.models import ConversationHistory
+    from app.database.repositories import conversations
+    from main import app
+
+    database = use_mongomock(latency=latency)
+    collection = database[ConversationHistory._meta["collection"]]
+    multimodal_agent.set_model_client(FakeGenaiClient(latency=0.0))
+    multimodal_agent.model_limiter = ConcurrencyLimiter("model_calls", limit=settings.MODEL_MAX_CONCURRENCY)
+    history_writer.spill_path = os.path.join(tempfile.mkdtemp(), "history_spill.jsonl")
+    inserts = {"calls": 0}
+    real_insert = conversations.insert_documents
+
+    async def counting_insert(documents):
+        inserts["calls"] += 1
+        await real_insert(documents)
+
+    conversations.insert_documents = counting_insert
+    ok = True
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as http:
+        # 1. Latency, inline vs write-behind
+        inline = [await _chat(http, i) for i in range(requests)]
+        await history_writer.start()
+        buffered = [await _chat(http, i) for i in range(requests)]
+        print(f"{requests} sequential chats, {latency * 1000:.1f} ms simulated MongoDB round trip")
+        print(f"  inline insert : p50 {percentile(inline, 50) * 1000:6.2f} ms   p99 {percentile(inline, 99) * 1000:6.2f} ms")
+        print(f"  write-behind  : p50 {percentile(buffered, 50) * 1000:6.2f} ms   p99 {percentile(buffered, 99) * 1000:6.2f} ms")
+        ok &= percentile(buffered, 50) < percentile(inline, 50)
+
+        # 2. Batching under a burst
+        await history_writer.flush()
+        inserts["calls"] = 0
+        await asyncio.gather(*(_chat(http, i) for i in range(requests)))
+        await history_writer.flush()
+        print(f"  burst of {requests}: {inserts['calls']} insert_many calls")
+
+        # 3. Outage: spill, then replay on the next start
+        stored_before = collection.count_documents({})
+
+        async def failing_insert(documents):
+            raise AutoReconnect("simulated outage")
+
+        conversations.insert_documents = failing_insert
+        await asyncio.gather(*(_chat(http, i) for i in range(requests)))
+        await history_writer.close()
+        with open(history_writer.spill_path, encoding="utf-8") as spill:
+            spilled = sum(1 for _ in spill)
+        conversations.insert_documents = counting_insert
+        await history_writer.start()
+        replayed_ok = collection.count_documents({}) == stored_before + requests and not os.path.exists(history_writer.spill_path)
+        print(f"  outage: {spilled} turns spilled, replayed on start: {replayed_ok}")
+        ok &= spilled == requests and replayed_ok
+
+        # 4. Shutdown flush
+        settings.HISTORY_WRITE_FLUSH_INTERVAL_SECONDS = 60.0
+        await history_writer.close()
+        await history_writer.start()
+        stored_before = collection.count_documents({})
+        await asyncio.gather(*(_chat(http, i) for i in range(10)))
+        pending = history_writer.depth
+        await history_writer.close()
+        flushed = collection.count_documents({}) - stored_before
+        print(f"  shutdown: {pending} buffered turns, {flushed} written by close()")
+        ok &= pending == 10 and flushed == 10
+
+    conversations.insert_documents = real_insert
+    return ok
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.005, help="Simulated MongoDB round trip (seconds).")
+    args = parser.parse_args()
+
+    ok = asyncio.run(run(args.requests, args.latency))
+    print("OK" if ok else "FAIL")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
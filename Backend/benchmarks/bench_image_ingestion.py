@@ -0,0 +1,133 @@
+"""
+Peak memory of image ingestion, plus the 413/415 rejection paths.
+
+Compares the single chunked read in app.agents.image_ingestion against the
+previous read + seek + read-again pattern, using tracemalloc on a large upload.
+Oversized requests must be refused before their body is received: by
+Content-Length, or (chunked, no Content-Length) once the body passes the cap.
+
+Usage (from Backend/):
+    python -m benchmarks.bench_image_ingestion --size-mb 8
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import tracemalloc
+
+import httpx
+from starlette.datastructures import UploadFile
+
+from benchmarks.fakes import FakeGenaiClient, FakeUploader, make_test_image, use_mongomock
+
+
+def _spooled_upload(payload: bytes) -> UploadFile:
+    # Same spooling Starlette's multipart parser uses (1 MiB in memory, then disk)
+    spool = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+    spool.write(payload)
+    spool.seek(0)
+    return UploadFile(file=spool, size=len(payload), filename="big.png")
+
+
+async def _streamed_upload(http: httpx.AsyncClient, size: int, declare_length: bool, chunk: int = 64 * 1024) -> tuple:
+    """Posts a multipart image chat produced lazily; returns (status, body bytes pulled by the server)."""
+    boundary = "bench-boundary"
+    head = (f"--{boundary}\r\nContent-Disposition: form-data; name=\"image_file\"; filename=\"big.png\"\r\n"
+            f"Content-Type: image/png\r\n\r\n").encode() + make_test_image()
+    tail = f"\r\n--{boundary}--\r\n".encode()
+    pieces = [head, *(b"\0" * chunk for _ in range(size // chunk)), tail]
+    pulled = 0
+
+    async def body():
+        nonlocal pulled
+        for piece in pieces:
+            pulled += len(piece)
+            yield piece
+
+    headers = {"Content-Type": f"multipart/form-data; boundary={boundary}"}
+    if declare_length:
+        headers["Content-Length"] = str(sum(len(piece) for piece in pieces))
+    response = await http.post("/api/v1/chat/", content=body(), headers=headers)
+    return response.status_code, pulled
+
+
+async def _peak(coro) -> int:
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    try:
+        await coro
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+async def run(size_mb: float) -> bool:
+    from app.agents import image_handler, multimodal_agent
+    from app.agents.image_ingestion import ingest_image_upload
+    from app.core.concurrency import ConcurrencyLimiter
+    from app.core.config import settings
+    from app.core.rate_limit import max_chat_body_bytes
+    from main import app
+
+    # A valid PNG header followed by filler: enough for magic-byte sniffing
+    payload = make_test_image() + os.urandom(int(size_mb * 1024 * 1024))
+    settings.MAX_IMAGE_UPLOAD_BYTES = len(payload) + 1
+
+    async def legacy(upload: UploadFile):
+        first = await upload.read()
+        await upload.seek(0)
+        second = await upload.read()
+        return first, second
+
+    async def single(upload: UploadFile):
+        return await ingest_image_upload(upload)
+
+    legacy_peak = await _peak(legacy(_spooled_upload(payload)))
+    single_peak = await _peak(single(_spooled_upload(payload)))
+    print(f"{len(payload) / 1e6:.1f} MB upload")
+    print(f"  read + seek + read : peak {legacy_peak / 1e6:6.1f} MB")
+    print(f"  chunked single read: peak {single_peak / 1e6:6.1f} MB")
+
+    multimodal_agent.set_model_client(FakeGenaiClient(latency=0.0))
+    multimodal_agent.model_limiter = ConcurrencyLimiter("model_calls", limit=4)
+    image_handler.set_image_uploader(FakeUploader(latency=0.0))
+    settings.MAX_IMAGE_UPLOAD_BYTES = 1024 * 1024
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as http:
+        too_big = await http.post("/api/v1/chat/", files={"image_file": ("big.png", payload, "image/png")})
+        not_image = await http.post("/api/v1/chat/", files={"image_file": ("x.png", b"%PDF-1.7 not an image", "image/png")})
+        ok = await http.post("/api/v1/chat/", files={"image_file": ("y.bin", make_test_image(), "application/octet-stream")})
+        # Over the image limit but within the whole-body cap: rejected by the ingestion check
+        slightly_big = await http.post("/api/v1/chat/", files={"image_file": ("b.png", payload[:1536 * 1024], "image/png")})
+        declared = await _streamed_upload(http, len(payload), declare_length=True)
+        chunked = await _streamed_upload(http, len(payload), declare_length=False)
+    body_cap = max_chat_body_bytes()
+    print(f"  oversized upload   : HTTP {too_big.status_code}")
+    print(f"  mislabelled PDF    : HTTP {not_image.status_code}")
+    print(f"  unlabelled PNG     : HTTP {ok.status_code}")
+    print(f"  1.5 MiB image      : HTTP {slightly_big.status_code} (image limit 1 MiB, body cap {body_cap} bytes)")
+    print(f"  {f'{len(payload) / 1e6:.1f} MB, declared':<19}: HTTP {declared[0]} after {declared[1]} bytes of the body were read")
+    print(f"  {f'{len(payload) / 1e6:.1f} MB, chunked':<19}: HTTP {chunked[0]} after {chunked[1]} bytes of the body were read")
+
+    return (
+        single_peak < legacy_peak * 0.75
+        and too_big.status_code == 413 and not_image.status_code == 415 and ok.status_code == 200
+        and slightly_big.status_code == 413
+        and declared == (413, 0) and chunked[0] == 413 and chunked[1] <= body_cap + 128 * 1024
+    )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=float, default=8.0)
+    args = parser.parse_args()
+
+    use_mongomock()
+    ok = asyncio.run(run(args.size_mb))
+    print("OK" if ok else "FAIL")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,147 @@
+"""
+Bytes sent to the model before/after preprocessing, and event-loop lag while it runs.
+
+Preprocesses a burst of camera-sized JPEGs concurrently and measures how late
+a 10 ms ticker on the event loop fires meanwhile (it should stay near zero,
+since decoding/resizing happens on the worker pool). Then PNG screenshots (a
+small diagram and a 1280x800 app window, which is smaller as JPEG) and small
+JPEGs, all within IMAGE_MAX_EDGE, must stay the original, or be re-encoded only
+when that saves at least IMAGE_REENCODE_MIN_SAVING; the PNGs must stay PNGs.
+
+Usage (from Backend/):
+    python -m benchmarks.bench_image_preprocessing --images 8
+"""
+import argparse
+import asyncio
+import sys
+import time
+from io import BytesIO
+
+from benchmarks.fakes import make_photo
+
+
+async def _ticker(stop: asyncio.Event, lags: list, interval: float = 0.01) -> None:
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - start - interval)
+
+
+def _screenshot() -> bytes:
+    """A small PNG of black text on white, like a screenshot of a diagram."""
+    from PIL import Image, ImageDraw
+
+    image = Image.new("RGB", (640, 200), "white")
+    draw = ImageDraw.Draw(image)
+    for line in range(8):
+        draw.text((10, 10 + line * 22), f"def handler_{line}(request): return cache.get(key_{line})", fill="black")
+    buffer = BytesIO()
+    image.save(buffer, format="PNG", optimize=True)
+    return buffer.getvalue()
+
+
+def _reencoded_size(data: bytes, settings) -> int:
+    """Size of `data` re-encoded to IMAGE_OUTPUT_FORMAT, for comparison."""
+    from PIL import Image
+
+    buffer = BytesIO()
+    with Image.open(BytesIO(data)) as image:
+        image.convert("RGB").save(buffer, format=settings.IMAGE_OUTPUT_FORMAT, quality=settings.IMAGE_OUTPUT_QUALITY,
+                                  optimize=True)
+    return buffer.tell()
+
+
+def _ui_screenshot(width: int = 1280, height: int = 800) -> bytes:
+    """A desktop-app screenshot: gradient header, sidebar, anti-aliased text and a photo thumbnail."""
+    from PIL import Image, ImageDraw, ImageFont
+
+    image = Image.new("RGB", (width, height), (246, 247, 249))
+    header = Image.linear_gradient("L").rotate(90).resize((width, 56))
+    image.paste(Image.merge("RGB", (header.point(lambda v: 40 + v // 4), header.point(lambda v: 70 + v // 5),
+                                    header.point(lambda v: 140 + v // 3))), (0, 0))
+    draw = ImageDraw.Draw(image)
+    font, small = ImageFont.load_default(size=15), ImageFont.load_default(size=12)
+    draw.text((20, 18), "Nova Agent - Conversations", font=font, fill="white")
+    draw.rectangle((0, 56, 240, height), fill=(232, 235, 240))
+    for row in range(20):
+        draw.text((16, 72 + row * 34), f"Session {row + 1}: image upload cache latency", font=small, fill=(60, 64, 72))
+    for card in range(6):
+        top = 80 + card * 118
+        draw.rounded_rectangle((270, top, width - 30, top + 104), radius=10, fill="white", outline=(220, 223, 228))
+        for line in range(4):
+            draw.text((290, top + 14 + line * 21), f"Message {card}.{line}: the model returned a streamed answer "
+                      f"with {card * 37 + line} tokens for the user's question about history pagination.",
+                      font=small, fill=(30, 32, 36))
+    # The photo makes the whole window a little smaller as JPEG (about 3%), the case to keep as PNG
+    photo = Image.open(BytesIO(make_photo(220, 136))).convert("RGB")
+    image.paste(photo, (width - 250, 90))
+    buffer = BytesIO()
+    image.save(buffer, format="PNG", optimize=True)
+    return buffer.getvalue()
+
+
+async def _small_images_kept() -> bool:
+    from app.agents.image_preprocessing import preprocess_image_for_model
+    from app.core.config import settings
+
+    ok = True
+    for label, data, mime_type in (
+        ("640x200 PNG screenshot", _screenshot(), "image/png"),
+        ("1280x800 UI screenshot", _ui_screenshot(), "image/png"),
+        ("64x48 JPEG", make_photo(64, 48, quality=75), "image/jpeg"),
+        ("16x16 JPEG", make_photo(16, 16, quality=50), "image/jpeg"),
+    ):
+        result = await preprocess_image_for_model(data, mime_type)
+        unchanged = result.data == data and result.mime_type == mime_type
+        # A re-encode is only kept when clearly smaller; lossless screenshots always stay the original PNG
+        min_saving = len(data) * settings.IMAGE_REENCODE_MIN_SAVING
+        ok &= (unchanged or result.processed_bytes <= len(data) - min_saving) and (unchanged or mime_type != "image/png")
+        print(f"  {label:<22}: {len(data)} -> {result.processed_bytes} bytes, {result.mime_type} "
+              f"({'unchanged' if unchanged else 're-encoded, smaller'}; as {settings.IMAGE_OUTPUT_FORMAT} "
+              f"{_reencoded_size(data, settings)} bytes)")
+    return ok
+
+
+async def run(images: int) -> bool:
+    from PIL import Image
+    from app.agents.image_preprocessing import preprocess_image_for_model
+    from app.core.config import settings
+
+    photo = make_photo()
+    stop, lags = asyncio.Event(), []
+    ticker = asyncio.create_task(_ticker(stop, lags))
+    start = time.perf_counter()
+    results = await asyncio.gather(*(preprocess_image_for_model(photo, "image/jpeg") for _ in range(images)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await ticker
+
+    result = results[0]
+    with Image.open(BytesIO(result.data)) as out:
+        has_exif = bool(out.getexif())
+    print(f"{images} x {len(photo) / 1e6:.2f} MB 4032x3024 JPEG -> max edge {settings.IMAGE_MAX_EDGE}, "
+          f"{settings.IMAGE_OUTPUT_FORMAT} q{settings.IMAGE_OUTPUT_QUALITY}, {settings.IMAGE_PREPROCESS_WORKERS} workers")
+    print(f"  bytes per image : {result.original_bytes} -> {result.processed_bytes} "
+          f"({100 * (1 - result.processed_bytes / result.original_bytes):.1f}% saved)")
+    print(f"  output          : {result.width}x{result.height} {result.mime_type}, EXIF present: {has_exif}")
+    print(f"  wall time       : {elapsed * 1000:.0f} ms ({elapsed * 1000 / images:.0f} ms/image)")
+    print(f"  event-loop lag  : max {max(lags) * 1000:.1f} ms over {len(lags)} ticks")
+    small_ok = await _small_images_kept()
+    # Orientation 6 means the stored landscape frame is displayed as portrait
+    return (
+        result.processed_bytes < result.original_bytes and not has_exif and result.height > result.width and small_ok
+    )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", type=int, default=8)
+    args = parser.parse_args()
+
+    ok = asyncio.run(run(args.images))
+    print("OK" if ok else "FAIL")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
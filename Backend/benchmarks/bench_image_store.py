@@ -0,0 +1,117 @@
+"""
+Cloudinary uploads and image chat latency with and without the content-addressed image store.
+
+Anonymous clients send image chats drawn from --distinct images, so most
+requests re-send an image seen before (a re-shared screenshot, a retried
+request). The fake uploader takes --upload-latency, longer than the fake model,
+so an upload shows up in the request time.
+
+  - repeat   : --requests sequential image chats, store off vs on -> uploads, mean latency, hit rate
+               (as reported by image_store.stats() and /metrics)
+  - restart  : the per-process LRU is emptied (a restarted or different worker) and the
+               same images sent again -> answered from MongoDB, no uploads
+  - retry    : --concurrent identical chats at once (a client retrying) -> a single upload
+Turns are checked to reference their image by digest (image_digest) with the stored URL.
+
+Usage (from Backend/):
+    python -m benchmarks.bench_image_store --requests 60 --distinct 12 --upload-latency 0.3
+"""
+import argparse
+import asyncio
+import random
+import sys
+import time
+
+import httpx
+
+from benchmarks.fakes import FakeGenaiClient, FakeUploader, make_test_image, use_mongomock
+
+
+async def _chat(http: httpx.AsyncClient, image: bytes, i: int) -> float:
+    start = time.perf_counter()
+    response = await http.post("/api/v1/chat/", data={"user_input_text": f"what is in this picture? ({i})"},
+                               files={"image_file": ("screenshot.png", image, "image/png")})
+    response.raise_for_status()
+    return time.perf_counter() - start
+
+
+async def run(enabled: bool, args: argparse.Namespace) -> dict:
+    from app.agents import image_handler, image_store, multimodal_agent
+    from app.core.config import settings
+    from app.database.models import ConversationHistory, ImageAsset
+    from main import app
+
+    multimodal_agent.set_model_client(FakeGenaiClient(latency=args.model_latency))
+    uploader = FakeUploader(latency=args.upload_latency)
+    image_handler.set_image_uploader(uploader)
+    settings.IMAGE_STORE_ENABLED = enabled
+    image_store.clear()
+    ImageAsset.objects.delete()
+    ConversationHistory.objects.delete()
+
+    images = [make_test_image(32 + n, 24 + n) for n in range(args.distinct)]
+    rng = random.Random(7)
+    sequence = images + [rng.choice(images) for _ in range(args.requests - len(images))] # Each image at least once
+    rng.shuffle(sequence)
+    result = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as http:
+        timings = [await _chat(http, image, i) for i, image in enumerate(sequence)]
+        result["repeat"] = (uploader.uploads, sum(timings) / len(timings), image_store.stats()["hit_rate"])
+        scraped = next(line for line in (await http.get("/metrics")).text.splitlines()
+                       if line.startswith("image_store_hit_ratio"))
+        result["scraped"] = float(scraped.split()[-1])
+
+        image_store.clear()
+        before = uploader.uploads
+        timings = [await _chat(http, image, i) for i, image in enumerate(images)]
+        result["restart"] = (uploader.uploads - before, sum(timings) / len(timings), image_store.stats()["mongo"])
+
+        before = uploader.uploads
+        retried = make_test_image(200, 150)
+        start = time.perf_counter()
+        await asyncio.gather(*(_chat(http, retried, i) for i in range(args.concurrent)))
+        result["retry"] = (uploader.uploads - before, time.perf_counter() - start)
+
+    # Every turn points at its image by digest; the digest resolves to the turn's URL
+    turns = list(ConversationHistory.objects(image_url__ne=None))
+    urls = {asset.digest: asset.secure_url for asset in ImageAsset.objects}
+    result["turns_ok"] = all(turn.image_digest and urls.get(turn.image_digest, turn.image_url) == turn.image_url
+                             for turn in turns)
+    result["assets"] = len(urls)
+
+    label = "store on " if enabled else "store off"
+    uploads, mean, hit_rate = result["repeat"]
+    print(f"  {label} repeat : {uploads:3d} uploads for {args.requests} image chats "
+          f"({args.distinct} distinct)  mean {mean * 1000:6.1f} ms  hit rate {hit_rate:.0%} (/metrics {result['scraped']:.2f})")
+    uploads, mean, from_mongo = result["restart"]
+    print(f"  {label} restart: {uploads:3d} uploads for {len(images)} re-sent images  mean {mean * 1000:6.1f} ms  "
+          f"answered from MongoDB {from_mongo}")
+    uploads, elapsed = result["retry"]
+    print(f"  {label} retry  : {uploads:3d} uploads for {args.concurrent} concurrent identical chats ({elapsed * 1000:.0f} ms)   "
+          f"image_assets {result['assets']}, turns reference digest: {result['turns_ok']}")
+    return result
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=60)
+    parser.add_argument("--distinct", type=int, default=12)
+    parser.add_argument("--concurrent", type=int, default=8)
+    parser.add_argument("--upload-latency", type=float, default=0.3)
+    parser.add_argument("--model-latency", type=float, default=0.05)
+    args = parser.parse_args()
+
+    use_mongomock()
+    off = asyncio.run(run(False, args))
+    on = asyncio.run(run(True, args))
+    ok = off["repeat"][0] == args.requests and on["repeat"][0] == args.distinct
+    ok = ok and on["repeat"][1] < off["repeat"][1] / 2 and abs(on["scraped"] - on["repeat"][2]) < 1e-6
+    ok = ok and on["restart"][0] == 0 and on["restart"][2] == args.distinct
+    ok = ok and on["retry"][0] == 1 and on["turns_ok"] and on["assets"] == args.distinct + 1
+    print("OK" if ok else "FAIL")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
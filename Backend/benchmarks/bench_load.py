@@ -0,0 +1,410 @@
+"""
+End-to-end load test of main:app with a realistic traffic mix, compared against a stored baseline.
+
+Everything runs offline on one machine, in three processes:
+  - stand-ins : benchmarks/fake_services.py (Gemini API + Cloudinary upload API over HTTP),
+                reached through the real SDKs via MODEL_API_BASE_URL / CLOUDINARY_UPLOAD_PREFIX
+  - app       : this process; main:app under uvicorn on loopback, MongoDB replaced by
+                mongomock (--db-latency per round trip), history write-behind running
+  - load      : a child process (this module with --drive) running --users virtual users
+                for --duration seconds; each signs up, then loops over the --mix of
+                operations, pausing --think seconds on average in between: chat, chat
+                (stream), chat with an image, a history page (and sometimes the next
+                one), login, or signing up as a new visitor
+
+Reported:
+  - per operation: requests/s, p50/p95/p99 latency, errors (after --warmup)
+  - event-loop lag of the app process during the load (10 ms ticker: p50/p99/max)
+  - memory: process RSS before/after and peak, and per operation the peak Python
+    memory of one request (tracemalloc, --profile sequential requests each)
+
+Results are compared with --baseline (written by --save-baseline). Baselines are
+machine-specific: record one on the box the comparison will run on. Fails on more
+than 1% errors, or when an operation's p95 (p50 for rare operations), its
+throughput, the loop lag or the per-request memory regresses beyond --tolerance.
+
+Usage (from Backend/):
+    python -m benchmarks.bench_load --users 16 --duration 40
+    python -m benchmarks.bench_load --save-baseline
+"""
+import argparse
+import asyncio
+import json
+import random
+import socket
+import subprocess
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from uuid import uuid4
+
+import httpx
+
+from benchmarks.fakes import make_test_image, percentile, serve_app, use_mongomock
+
+DEFAULT_MIX = "chat=40,stream=15,image=10,history=25,login=5,signup=5"
+DEFAULT_BASELINE = Path(__file__).parent / "baselines" / "bench_load.json"
+OP_HEADER = "X-Load-Op" # Lets the app process attribute per-request memory to an operation
+MIN_SAMPLES_TO_COMPARE = 40 # Rarer operations are reported but not compared with the baseline
+MIN_SAMPLES_FOR_P95 = 100 # Below this, baselines are compared on p50
+
+
+# --- 1. Load generator (child process) ---
+
+class VirtualUser:
+    """One simulated user: an account, a token and an HTTP connection of its own."""
+
+    def __init__(self, http: httpx.AsyncClient, rng: random.Random, images: List[bytes]):
+        self.http = http
+        self.rng = rng
+        self.images = images
+        self.email = ""
+        self.password = ""
+        self.token = ""
+
+    def _headers(self, op: str) -> Dict[str, str]:
+        return {"Authorization": f"Bearer {self.token}", OP_HEADER: op}
+
+    async def signup(self) -> None:
+        name = uuid4().hex[:12]
+        self.email, self.password = f"{name}@example.com", f"pw-{name}"
+        response = await self.http.post("/api/v1/auth/signup", headers={OP_HEADER: "signup"},
+                                         json={"email": self.email, "username": name, "password": self.password})
+        response.raise_for_status()
+        self.token = response.json()["access_token"]
+
+    async def login(self) -> None:
+        response = await self.http.post("/api/v1/auth/login", headers={OP_HEADER: "login"},
+                                        data={"username": self.email, "password": self.password})
+        response.raise_for_status()
+        self.token = response.json()["access_token"]
+
+    def _message(self) -> str:
+        words = ("explain", "how", "the", "cache", "works", "in", "python", "async", "code", "with", "an", "example")
+        return " ".join(self.rng.choice(words) for _ in range(self.rng.randint(5, 30)))
+
+    async def chat(self) -> None:
+        response = await self.http.post("/api/v1/chat/", headers=self._headers("chat"),
+                                        data={"user_input_text": self._message()})
+        response.raise_for_status()
+
+    async def stream(self) -> None:
+        async with self.http.stream("POST", "/api/v1/chat/stream", headers=self._headers("stream"),
+                                    data={"user_input_text": self._message()}) as response:
+            response.raise_for_status()
+            body = "".join([text async for text in response.aiter_text()])
+        if "event: done" not in body:
+            raise RuntimeError("stream ended without a done event")
+
+    async def image(self) -> None:
+        response = await self.http.post(
+            "/api/v1/chat/", headers=self._headers("image"), data={"user_input_text": "what is in this picture?"},
+            files={"image_file": ("photo.jpg", self.rng.choice(self.images), "image/jpeg")},
+        )
+        response.raise_for_status()
+
+    async def history(self) -> None:
+        response = await self.http.get("/api/v1/history/", params={"limit": 20}, headers=self._headers("history"))
+        response.raise_for_status()
+        cursor = response.headers.get("x-next-cursor")
+        if cursor and self.rng.random() < 0.3: # Scrolling back one page
+            response = await self.http.get("/api/v1/history/", params={"limit": 20, "before": cursor},
+                                           headers=self._headers("history"))
+            response.raise_for_status()
+
+
+async def _timed(op: str, call: Any, records: list) -> None:
+    start = time.perf_counter()
+    try:
+        await call()
+        ok = True
+    except Exception:
+        ok = False
+    records.append((op, start, time.perf_counter() - start, ok))
+
+
+def _parse_mix(mix: str) -> Dict[str, float]:
+    weights = {}
+    for item in mix.split(","):
+        op, _, weight = item.partition("=")
+        weights[op.strip()] = float(weight)
+    return weights
+
+
+async def drive(args: argparse.Namespace) -> dict:
+    """Runs the virtual users against --drive and returns per-operation statistics."""
+    mix = _parse_mix(args.mix)
+    ops, weights = list(mix), list(mix.values())
+    images = [make_test_image(640 + 16 * i, 480, "JPEG") for i in range(4)]
+    records: list = []
+    start = time.perf_counter()
+    measure_from, end = start + args.warmup, start + args.warmup + args.duration
+
+    async def run_user(n: int) -> None:
+        rng = random.Random(args.seed * 1000 + n)
+        async with httpx.AsyncClient(base_url=args.drive, timeout=120) as http:
+            user = VirtualUser(http, rng, images)
+            await _timed("signup", user.signup, records)
+            while time.perf_counter() < end:
+                op = rng.choices(ops, weights)[0]
+                await _timed(op, getattr(user, op), records)
+                if args.think:
+                    await asyncio.sleep(rng.expovariate(1 / args.think))
+
+    await asyncio.gather(*(run_user(n) for n in range(args.users)))
+    measured = [record for record in records if record[1] >= measure_from]
+    elapsed = max(1e-9, min(time.perf_counter(), end) - measure_from)
+    stats = {}
+    for op in sorted({record[0] for record in measured}):
+        latencies = [latency for name, _, latency, ok in measured if name == op and ok]
+        errors = sum(1 for name, _, _, ok in measured if name == op and not ok)
+        stats[op] = {
+            "count": len(latencies) + errors,
+            "errors": errors,
+            "rps": (len(latencies) + errors) / elapsed,
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+        }
+    return {"seconds": elapsed, "ops": stats}
+
+
+async def sequential(args: argparse.Namespace) -> dict:
+    """One virtual user, one request at a time: --sequential requests per operation."""
+    rng = random.Random(args.seed)
+    images = [make_test_image(640, 480, "JPEG")]
+    async with httpx.AsyncClient(base_url=args.drive, timeout=120) as http:
+        user = VirtualUser(http, rng, images)
+        await user.signup()
+        for op in _parse_mix(args.mix):
+            for _ in range(args.sequential):
+                await getattr(user, op)()
+    return {}
+
+
+# --- 2. App process ---
+
+class RequestMemory:
+    """
+    ASGI wrapper recording the peak Python memory each request allocates, per operation.
+
+    Only meaningful while tracemalloc runs and requests arrive one at a time.
+    """
+
+    def __init__(self, app: Any):
+        self.app = app
+        self.peaks: Dict[str, List[int]] = {}
+
+    async def __call__(self, scope: dict, receive: Any, send: Any) -> None:
+        if scope["type"] != "http" or not tracemalloc.is_tracing():
+            await self.app(scope, receive, send)
+            return
+        op = dict(scope["headers"]).get(OP_HEADER.lower().encode(), b"other").decode()
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.peaks.setdefault(op, []).append(tracemalloc.get_traced_memory()[1] - before)
+
+
+def _memory_kib(field: str) -> int:
+    """VmRSS / VmHWM of this process from /proc (Linux), in KiB."""
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith(field + ":"):
+                return int(line.split()[1])
+    return 0
+
+
+async def _ticker(stop: asyncio.Event, lags: list, interval: float = 0.01) -> None:
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - start - interval)
+
+
+def _child_args(args: argparse.Namespace, base_url: str, extra: List[str]) -> List[str]:
+    return [
+        sys.executable, "-m", "benchmarks.bench_load", "--drive", base_url, "--users", str(args.users),
+        "--duration", str(args.duration), "--warmup", str(args.warmup), "--think", str(args.think),
+        "--mix", args.mix, "--seed", str(args.seed), *extra,
+    ]
+
+
+async def _run_child(command: List[str]) -> dict:
+    process = await asyncio.create_subprocess_exec(*command, stdout=asyncio.subprocess.PIPE)
+    stdout, _ = await process.communicate()
+    if process.returncode:
+        raise RuntimeError(f"load generator exited with {process.returncode}")
+    return json.loads(stdout.decode().strip().splitlines()[-1])
+
+
+async def _fake_services(args: argparse.Namespace, port: int) -> subprocess.Popen:
+    process = subprocess.Popen([
+        sys.executable, "-m", "benchmarks.fake_services", "--port", str(port), "--model-latency", str(args.model_latency),
+        "--stream-chunks", str(args.stream_chunks), "--upload-latency", str(args.upload_latency),
+    ])
+    async with httpx.AsyncClient() as http:
+        for _ in range(200):
+            try:
+                await http.get(f"http://127.0.0.1:{port}/stats")
+                return process
+            except httpx.TransportError:
+                await asyncio.sleep(0.05)
+    process.terminate()
+    raise RuntimeError("fake services did not start")
+
+
+async def run(args: argparse.Namespace) -> dict:
+    from app.agents import llm_clients, multimodal_agent
+    from app.core.config import settings
+    from app.database.history_writer import history_writer
+    from main import app
+
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        services_port = probe.getsockname()[1]
+    services = await _fake_services(args, services_port)
+    services_url = f"http://127.0.0.1:{services_port}"
+    settings.MODEL_API_BASE_URL = settings.CLOUDINARY_UPLOAD_PREFIX = services_url
+    multimodal_agent.set_model_client(None)
+    measured_app = RequestMemory(app)
+
+    try:
+        use_mongomock(latency=args.db_latency)
+        await history_writer.start()
+        async with serve_app(measured_app) as base_url:
+            # Warm the SDKs up front, as the lifespan's preload would
+            await asyncio.get_running_loop().run_in_executor(None, llm_clients.preload)
+
+            rss_before = _memory_kib("VmRSS")
+            stop, lags = asyncio.Event(), []
+            ticker = asyncio.create_task(_ticker(stop, lags))
+            load = await _run_child(_child_args(args, base_url, []))
+            stop.set()
+            await ticker
+            rss_after, rss_peak = _memory_kib("VmRSS"), _memory_kib("VmHWM")
+
+            tracemalloc.start()
+            await _run_child(_child_args(args, base_url, ["--sequential", str(args.profile)]))
+            tracemalloc.stop()
+        async with httpx.AsyncClient() as http:
+            service_stats = (await http.get(f"{services_url}/stats")).json()
+    finally:
+        await history_writer.close()
+        await llm_clients.close()
+        services.terminate()
+        services.wait()
+
+    for op, peaks in measured_app.peaks.items():
+        if op in load["ops"]:
+            load["ops"][op]["memory_kib"] = percentile(peaks, 50) / 1024
+    load["loop_lag"] = {"p50": percentile(lags, 50), "p99": percentile(lags, 99), "max": max(lags, default=0.0)}
+    load["rss_mib"] = {"before": rss_before / 1024, "after": rss_after / 1024, "peak": rss_peak / 1024}
+    load["services"] = service_stats
+    return load
+
+
+# --- 3. Report and baseline ---
+
+def _report(results: dict) -> None:
+    ops = results["ops"]
+    total = sum(stat["count"] for stat in ops.values())
+    print(f"{total} requests in {results['seconds']:.1f} s ({total / results['seconds']:.1f} req/s)")
+    print(f"  {'operation':<9} {'req/s':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>6} {'KiB/req':>8}")
+    for op, stat in ops.items():
+        print(f"  {op:<9} {stat['rps']:7.1f} {stat['p50'] * 1000:8.1f} {stat['p95'] * 1000:8.1f} "
+              f"{stat['p99'] * 1000:8.1f} {stat['errors']:6d} {stat.get('memory_kib', 0.0):8.0f}")
+    lag, rss = results["loop_lag"], results["rss_mib"]
+    print(f"  event-loop lag: p50 {lag['p50'] * 1000:.1f} ms, p99 {lag['p99'] * 1000:.1f} ms, max {lag['max'] * 1000:.1f} ms")
+    print(f"  RSS: {rss['before']:.0f} MiB before, {rss['after']:.0f} MiB after, peak {rss['peak']:.0f} MiB")
+    services = results["services"]
+    print(f"  stand-ins served {services['generate']} model calls, {services['stream']} streams, {services['uploads']} uploads")
+
+
+def _regressions(results: dict, baseline: dict, tolerance: float) -> List[str]:
+    """
+    What got worse than the baseline beyond the tolerance (small absolute changes are noise).
+
+    Operations with fewer than MIN_SAMPLES_FOR_P95 requests in either run are
+    compared on p50: a p95 of a few dozen samples moves with a single slow request.
+    """
+    found = []
+    for op, base in baseline["ops"].items():
+        stat = results["ops"].get(op)
+        samples = min(stat["count"], base["count"]) if stat else 0
+        if samples < MIN_SAMPLES_TO_COMPARE:
+            continue
+        pct = "p95" if samples >= MIN_SAMPLES_FOR_P95 else "p50"
+        if stat[pct] > base[pct] * (1 + tolerance) and stat[pct] - base[pct] > 0.005:
+            found.append(f"{op}: {pct} {base[pct] * 1000:.1f} -> {stat[pct] * 1000:.1f} ms")
+        if stat["rps"] < base["rps"] * (1 - tolerance):
+            found.append(f"{op}: {base['rps']:.1f} -> {stat['rps']:.1f} req/s")
+        if "memory_kib" in base and stat.get("memory_kib", 0.0) > base["memory_kib"] * (1 + tolerance) + 64:
+            found.append(f"{op}: {base['memory_kib']:.0f} -> {stat['memory_kib']:.0f} KiB per request")
+    lag, base_lag = results["loop_lag"]["p99"], baseline["loop_lag"]["p99"]
+    if lag > base_lag * (1 + tolerance) and lag - base_lag > 0.03:
+        found.append(f"event-loop lag p99 {base_lag * 1000:.1f} -> {lag * 1000:.1f} ms")
+    return found
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=40.0, help="Measured seconds (after --warmup).")
+    parser.add_argument("--warmup", type=float, default=3.0)
+    parser.add_argument("--think", type=float, default=1.0,
+                        help="Mean pause between a user's requests (seconds); 0 saturates the app instead.")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="Operation weights.")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--model-latency", type=float, default=0.2)
+    parser.add_argument("--stream-chunks", type=int, default=10)
+    parser.add_argument("--upload-latency", type=float, default=0.3)
+    parser.add_argument("--db-latency", type=float, default=0.002, help="Simulated MongoDB round trip (seconds).")
+    parser.add_argument("--profile", type=int, default=5, help="Sequential requests per operation for per-request memory.")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="Store this run as the baseline.")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="Allowed relative regression (runs on one box vary ~30%%).")
+    # Internal: run as the load generator against an already running app
+    parser.add_argument("--drive", help=argparse.SUPPRESS)
+    parser.add_argument("--sequential", type=int, default=0, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.drive:
+        results = asyncio.run(sequential(args) if args.sequential else drive(args))
+        print(json.dumps(results))
+        return 0
+
+    results = asyncio.run(run(args))
+    _report(results)
+    ops = results["ops"]
+    error_rate = sum(stat["errors"] for stat in ops.values()) / max(1, sum(stat["count"] for stat in ops.values()))
+    ok = error_rate <= 0.01 and results["services"]["uploads"] > 0 and results["services"]["stream"] > 0
+    print(f"errors: {error_rate:.2%}")
+
+    baseline: Optional[dict] = json.loads(args.baseline.read_text()) if args.baseline.exists() else None
+    if args.save_baseline:
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(json.dumps(results, indent=2) + "\n")
+        print(f"baseline saved to {args.baseline}")
+    elif baseline is None:
+        print(f"no baseline at {args.baseline} (record one with --save-baseline)")
+    else:
+        regressions = _regressions(results, baseline, args.tolerance)
+        rare = [op for op, base in baseline["ops"].items()
+                if min(base["count"], results["ops"].get(op, {}).get("count", 0)) < MIN_SAMPLES_TO_COMPARE]
+        if rare:
+            print(f"  not compared (fewer than {MIN_SAMPLES_TO_COMPARE} requests): {', '.join(rare)}")
+        for regression in regressions:
+            print(f"  regression: {regression}")
+        print(f"vs baseline: {len(regressions)} regressions beyond {args.tolerance:.0%}")
+        ok &= not regressions
+    print("OK" if ok else "FAIL")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,103 @@
+"""
+Login throughput and chat latency during a login storm.
+
+Fires N concurrent POST /api/v1/auth/login calls while a steady stream of
+anonymous text chats (fake model) runs on the same worker, then reports login
+throughput, 503 rejections and chat p50/p99. Run twice:
+  1. inline   : Argon2 verification on the event loop (the previous behaviour)
+  2. pool     : verification on the bounded hashing thread pool
+
+Usage (from Backend/):
+    python -m benchmarks.bench_login_storm --logins 40 --model-latency 0.05
+"""
+import argparse
+import asyncio
+import sys
+import time
+from uuid import uuid4
+
+import httpx
+
+from benchmarks.fakes import FakeGenaiClient, percentile, use_mongomock
+
+
+async def run(logins: int, model_latency: float, inline: bool) -> tuple:
+    from app.agents import multimodal_agent
+    from app.api.v1 import auth_router
+    from app.core import security
+    from app.core.concurrency import ConcurrencyLimiter
+    from app.core.config import settings
+    from main import app
+
+    multimodal_agent.set_model_client(FakeGenaiClient(latency=model_latency))
+    multimodal_agent.model_limiter = ConcurrencyLimiter("model_calls", limit=settings.MODEL_MAX_CONCURRENCY)
+    # Fresh limiter per event loop
+    security.hash_limiter = ConcurrencyLimiter(
+        "password_hashing",
+        limit=settings.PASSWORD_HASH_WORKERS,
+        queue_timeout=settings.PASSWORD_HASH_QUEUE_TIMEOUT_SECONDS,
+        max_waiting=settings.PASSWORD_HASH_MAX_QUEUE,
+    )
+    pooled_verify = auth_router.verify_password_in_pool
+    if inline:
+        async def inline_verify(plain_password: str, hashed_password: str) -> bool:
+            return security.verify_password(plain_password, hashed_password)
+        auth_router.verify_password_in_pool = inline_verify
+
+    transport = httpx.ASGITransport(app=app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as http:
+            name = uuid4().hex[:12]
+            credentials = {"username": f"{name}@example.com", "password": "bench-password"}
+            response = await http.post("/api/v1/auth/signup", json={
+                "email": credentials["username"], "username": name, "password": credentials["password"],
+            })
+            response.raise_for_status()
+
+            chat_latencies = []
+            storm_done = asyncio.Event()
+
+            async def chat_loop() -> None:
+                while not storm_done.is_set():
+                    start = time.perf_counter()
+                    response = await http.post("/api/v1/chat/", data={"user_input_text": "ping"})
+                    chat_latencies.append(time.perf_counter() - start)
+                    assert response.status_code == 200, response.status_code
+
+            chatter = asyncio.create_task(chat_loop())
+            await asyncio.sleep(model_latency * 3)  # baseline chats before the storm
+            start = time.perf_counter()
+            responses = await asyncio.gather(*(http.post("/api/v1/auth/login", data=credentials) for _ in range(logins)))
+            elapsed = time.perf_counter() - start
+            storm_done.set()
+            await chatter
+    finally:
+        auth_router.verify_password_in_pool = pooled_verify
+
+    statuses = [r.status_code for r in responses]
+    ok = statuses.count(200)
+    p50, p99 = percentile(chat_latencies, 50), percentile(chat_latencies, 99)
+    mode = "inline (event loop)" if inline else f"pool ({settings.PASSWORD_HASH_WORKERS} workers)"
+    print(f"[{mode}] {logins} concurrent logins")
+    print(f"  login storm        : {elapsed:.2f}s, {ok / elapsed:.1f} logins/s, {statuses.count(503)} x 503")
+    print(f"  chat during storm  : {len(chat_latencies)} calls, p50 {p50 * 1000:.0f} ms, p99 {p99 * 1000:.0f} ms")
+    assert set(statuses) <= {200, 503}, set(statuses)
+    return p99, len(chat_latencies)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=40)
+    parser.add_argument("--model-latency", type=float, default=0.05)
+    args = parser.parse_args()
+
+    use_mongomock()
+    inline_p99, inline_chats = asyncio.run(run(args.logins, args.model_latency, inline=True))
+    pool_p99, pool_chats = asyncio.run(run(args.logins, args.model_latency, inline=False))
+    ok = pool_p99 < inline_p99 and pool_chats > inline_chats
+    print("OK" if ok else "FAIL")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
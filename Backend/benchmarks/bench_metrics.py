@@ -0,0 +1,129 @@
+"""
+Per-stage chat timings from /metrics, and the cost of the metrics middleware.
+
+1. Stages: image chats (fake Cloudinary upload slower than the fake model) and
+   logged-out text chats, one oversized chat rejected before routing, then a
+   scrape of /metrics. Prints the mean time per stage from
+   `chat_stage_duration_seconds`; every exposition line is checked against the
+   text format, and the rejection must carry the chat route's label.
+2. Overhead: a trivial ASGI app called directly vs wrapped in MetricsMiddleware.
+
+Usage (from Backend/):
+    python -m benchmarks.bench_metrics --requests 20 --model-latency 0.05 --upload-latency 0.08
+"""
+import argparse
+import asyncio
+import re
+import sys
+import time
+
+import httpx
+
+from benchmarks.fakes import FakeGenaiClient, FakeUploader, make_test_image, use_mongomock
+
+SAMPLE_LINE = re.compile(r'^[a-zA-Z_:][a-zA-Z0-9_:]*(\{([a-zA-Z_][a-zA-Z0-9_]*="([^"\\]|\\.)*",?)*\})? (-?[0-9.e+-]+|\+Inf|NaN)$')
+STAGE_SAMPLE = re.compile(r'^chat_stage_duration_seconds_(sum|count)\{stage="([a-z_]+)"\} ([0-9.e+-]+)$')
+EXPECTED_STAGES = {"file_read", "image_preprocess", "cloudinary_upload", "model_call", "history_save"}
+
+
+async def _empty_body():
+    yield b""
+
+
+async def _stages(requests: int, model_latency: float, upload_latency: float) -> bool:
+    from app.agents import image_handler, multimodal_agent
+    from app.core.concurrency import ConcurrencyLimiter
+    from app.core.rate_limit import max_chat_body_bytes
+    from main import app
+
+    multimodal_agent.set_model_client(FakeGenaiClient(latency=model_latency))
+    multimodal_agent.model_limiter = ConcurrencyLimiter("model_calls", limit=16)
+    image_handler.set_image_uploader(FakeUploader(latency=upload_latency))
+    image = make_test_image()
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=30) as http:
+        for i in range(requests):
+            response = await http.post(
+                "/api/v1/chat/", data={"user_input_text": f"describe {i}"},
+                files={"image_file": ("photo.png", image, "image/png")},
+            )
+            response.raise_for_status()
+            response = await http.post("/api/v1/chat/", data={"user_input_text": f"question {i}"})
+            response.raise_for_status()
+        # Rejected by ChatAdmissionMiddleware from its Content-Length alone, before routing
+        rejected = await http.post(
+            "/api/v1/chat/", content=_empty_body(),
+            headers={"Content-Type": "multipart/form-data; boundary=x", "Content-Length": str(max_chat_body_bytes() + 1)},
+        )
+        scrape = await http.get("/metrics")
+
+    body = scrape.text
+    malformed = [line for line in body.splitlines() if line and not line.startswith("#") and not SAMPLE_LINE.match(line)]
+    totals = {}
+    for line in body.splitlines():
+        match = STAGE_SAMPLE.match(line)
+        if match:
+            totals.setdefault(match.group(2), {})[match.group(1)] = float(match.group(3))
+
+    print(f"{requests} image chats (upload {upload_latency * 1000:.0f} ms, model {model_latency * 1000:.0f} ms) + {requests} text chats")
+    for stage, values in sorted(totals.items()):
+        print(f"  {stage:<18} n={values['count']:4.0f}  mean {values['sum'] / values['count'] * 1000:7.2f} ms")
+    route_ok = 'http_requests_total{method="POST",route="/api/v1/chat/",status="200"}' in body
+    rejected_ok = rejected.status_code == 413 and (
+        'http_requests_total{method="POST",route="/api/v1/chat/",status="413"}' in body
+    )
+    in_flight_ok = "http_requests_in_flight 1\n" in body # The scrape itself
+    tokens_ok = "model_prompt_tokens_total " in body
+    print(f"  /metrics: {len(body)} bytes, content-type {scrape.headers['content-type']}, malformed lines: {len(malformed)}")
+    print(f"  route template label: {route_ok} (413 before routing: {rejected_ok}), "
+          f"in-flight gauge: {in_flight_ok}, token counters: {tokens_ok}")
+    for line in malformed[:5]:
+        print(f"    malformed: {line}")
+    return not malformed and EXPECTED_STAGES <= totals.keys() and route_ok and rejected_ok and in_flight_ok and tokens_ok
+
+
+async def _overhead(iterations: int) -> float:
+    from app.core.http_metrics import MetricsMiddleware
+
+    async def bare(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        pass
+
+    scope = {"type": "http", "method": "GET", "path": "/"}
+    timings = {}
+    for label, app in (("bare app", bare), ("with middleware", MetricsMiddleware(bare))):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            await app(dict(scope), receive, send)
+        timings[label] = (time.perf_counter() - start) / iterations
+        print(f"  {label:<16} {timings[label] * 1e6:6.2f} us/request")
+    added = timings["with middleware"] - timings["bare app"]
+    print(f"  middleware adds {added * 1e6:.2f} us/request")
+    return added
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--model-latency", type=float, default=0.05)
+    parser.add_argument("--upload-latency", type=float, default=0.08)
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+
+    use_mongomock()
+    ok = asyncio.run(_stages(args.requests, args.model_latency, args.upload_latency))
+    added = asyncio.run(_overhead(args.iterations))
+    ok &= added < 50e-6
+    print("OK" if ok else "FAIL")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,117 @@
+"""
+Chat latency and errors when the preferred model degrades, with and without the model router.
+
+A fake fleet serves a primary and a fallback model. Each scenario runs
+--clients concurrent clients sending anonymous text chats, once with a single
+model (no retries, no hedging) and once with routing across both:
+  - tail   : the primary answers in 50 ms but 3% of calls take 1.5 s -> hedging cuts p99
+  - outage : the primary fails every call after a warm-up -> retries go to the fallback
+             and the circuit breaker stops sending traffic to the primary
+  - slow   : the primary degrades to 800 ms -> latency-aware selection moves to the fallback
+`model_used` in each response is checked against the model that answered.
+
+Usage (from Backend/):
+    python -m benchmarks.bench_model_routing --clients 8 --requests 40
+"""
+import argparse
+import asyncio
+import sys
+import time
+from collections import Counter
+
+import httpx
+
+from benchmarks.fakes import FakeModelFleet, ModelProfile, percentile, use_mongomock
+
+PRIMARY, FALLBACK = "gemini-2.5-flash", "gemini-2.5-flash-lite"
+
+
+async def _load(http: httpx.AsyncClient, clients: int, requests: int, tag: str) -> tuple:
+    latencies, statuses, models = [], Counter(), Counter()
+
+    async def client(c: int) -> None:
+        for i in range(requests):
+            start = time.perf_counter()
+            response = await http.post("/api/v1/chat/", data={"user_input_text": f"{tag} {c} {i}"})
+            latencies.append(time.perf_counter() - start)
+            statuses[response.status_code] += 1
+            if response.status_code == 200:
+                body = response.json()
+                answered_by = body["ai_response"].split("]", 1)[0].lstrip("[")
+                assert body["model_used"] == answered_by, (body["model_used"], answered_by)
+                models[answered_by] += 1
+
+    await asyncio.gather(*(client(c) for c in range(clients)))
+    return latencies, statuses, models
+
+
+async def run(scenario: str, routed: bool, args: argparse.Namespace) -> dict:
+    from app.agents import multimodal_agent
+    from app.agents.model_router import model_router
+    from app.core.concurrency import ConcurrencyLimiter
+    from app.core.config import settings
+    from main import app
+
+    primary, fallback = ModelProfile(latency=0.05), ModelProfile(latency=0.08)
+    fleet = FakeModelFleet({PRIMARY: primary, FALLBACK: fallback})
+    multimodal_agent.set_model_client(fleet)
+    multimodal_agent.model_limiter = ConcurrencyLimiter("model_calls", limit=64)
+    model_router.reset()
+    settings.MODEL_TEXT_CANDIDATES = f"{PRIMARY},{FALLBACK}" if routed else PRIMARY
+    settings.MODEL_RETRY_ATTEMPTS = 2 if routed else 0
+    settings.MODEL_HEDGE_ENABLED = routed
+    settings.MODEL_HEDGE_MIN_DELAY_SECONDS = 0.05
+    settings.MODEL_RETRY_BASE_DELAY_SECONDS = 0.01
+    settings.MODEL_RETRY_MAX_DELAY_SECONDS = 0.05
+    settings.MODEL_LATENCY_TARGET_SECONDS = 0.5
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as http:
+        # Warm-up: the router needs MODEL_HEDGE_MIN_SAMPLES healthy calls before it hedges or compares latency
+        await _load(http, args.clients, 5, f"{scenario}-warmup")
+        if scenario == "tail":
+            primary.slow_rate, primary.slow_latency = 0.03, 1.5
+        elif scenario == "outage":
+            primary.error_rate = 1.0
+        elif scenario == "slow":
+            primary.latency = 0.8
+        primary_calls_before = fleet.calls[PRIMARY]
+        latencies, statuses, models = await _load(http, args.clients, args.requests, scenario)
+
+    total = sum(statuses.values())
+    result = {
+        "p50": percentile(latencies, 50), "p99": percentile(latencies, 99),
+        "errors": total - statuses[200], "total": total, "models": models,
+        "primary_calls": fleet.calls[PRIMARY] - primary_calls_before,
+    }
+    label = "routed" if routed else "single model"
+    print(f"  {label:<13} p50 {result['p50'] * 1000:7.1f} ms  p99 {result['p99'] * 1000:7.1f} ms  "
+          f"errors {result['errors']:3d}/{total}  primary calls {result['primary_calls']:4d}  answered by {dict(models)}")
+    return result
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=40, help="Requests per client and scenario.")
+    args = parser.parse_args()
+
+    use_mongomock()
+    ok = True
+    for scenario in ("tail", "outage", "slow"):
+        print(f"{scenario}:")
+        single = asyncio.run(run(scenario, False, args))
+        routed = asyncio.run(run(scenario, True, args))
+        if scenario == "tail":
+            ok &= routed["p99"] < single["p99"] / 2
+        elif scenario == "outage":
+            ok &= routed["errors"] == 0 and single["errors"] == single["total"]
+            ok &= routed["primary_calls"] < routed["total"] / 2 # The breaker stopped most calls to the primary
+        elif scenario == "slow":
+            ok &= routed["p50"] < single["p50"] / 2
+    print("OK" if ok else "FAIL")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
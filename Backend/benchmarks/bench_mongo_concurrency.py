@@ -0,0 +1,92 @@
+"""
+Concurrent authenticated GET /api/v1/history/ with async vs blocking MongoDB access.
+
+Each request does two round trips (user lookup in get_current_user_id and the
+history query). With the async repositories N concurrent requests overlap; the
+blocking baseline (synchronous driver calls inside async handlers, i.e. the
+previous MongoEngine code) serialises them on the event loop.
+
+By default MongoDB is an in-memory mongomock database with a simulated round
+trip; pass --mongo-uri to run against a real local mongod instead.
+
+Usage (from Backend/):
+    python -m benchmarks.bench_mongo_concurrency --requests 50 --latency 0.005
+    python -m benchmarks.bench_mongo_concurrency --mongo-uri mongodb://localhost:27017/bench
+"""
+import argparse
+import asyncio
+import sys
+import time
+from uuid import uuid4
+
+import httpx
+
+from benchmarks.fakes import AsyncDatabaseShim, use_mongomock
+
+
+async def _signup(http: httpx.AsyncClient) -> str:
+    name = uuid4().hex[:12]
+    response = await http.post("/api/v1/auth/signup", json={
+        "email": f"{name}@example.com", "username": name, "password": "bench-password",
+    })
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+
+async def _burst(http: httpx.AsyncClient, token: str, requests: int) -> float:
+    headers = {"Authorization": f"Bearer {token}"}
+    start = time.perf_counter()
+    responses = await asyncio.gather(*(http.get("/api/v1/history/", headers=headers) for _ in range(requests)))
+    elapsed = time.perf_counter() - start
+    assert all(r.status_code == 200 for r in responses), {r.status_code for r in responses}
+    return elapsed
+
+
+async def run(requests: int, latency: float, mongo_uri: str) -> bool:
+    from app.core.config import settings
+    from app.database import connection
+    from main import app
+
+    if mongo_uri:
+        settings.MONGO_URI = mongo_uri
+        connection.connect_db()
+        from mongoengine import get_db
+        blocking_db = AsyncDatabaseShim(get_db(), latency=0.0, blocking=True)
+        label = f"mongod at {mongo_uri}"
+    else:
+        database = use_mongomock(latency=latency)
+        blocking_db = AsyncDatabaseShim(database, latency=latency, blocking=True)
+        label = f"mongomock, {latency * 1000:.1f} ms simulated round trip"
+    async_db = connection.get_async_db()
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as http:
+        token = await _signup(http)
+        await _burst(http, token, 5)  # warm-up (pool connections, imports)
+
+        async_elapsed = await _burst(http, token, requests)
+        connection.set_async_db(blocking_db)
+        blocking_elapsed = await _burst(http, token, requests)
+        connection.set_async_db(async_db)
+
+    print(f"{requests} concurrent GET /api/v1/history/ ({label})")
+    print(f"  async repositories : {async_elapsed * 1000:8.1f} ms ({requests / async_elapsed:7.1f} req/s)")
+    print(f"  blocking driver    : {blocking_elapsed * 1000:8.1f} ms ({requests / blocking_elapsed:7.1f} req/s)")
+    print(f"  speed-up           : {blocking_elapsed / async_elapsed:.1f}x")
+    return mongo_uri != "" or async_elapsed < blocking_elapsed
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.005, help="Simulated round trip for mongomock (seconds).")
+    parser.add_argument("--mongo-uri", default="", help="Use a real local mongod instead of mongomock.")
+    args = parser.parse_args()
+
+    ok = asyncio.run(run(args.requests, args.latency, args.mongo_uri))
+    print("OK" if ok else "FAIL")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,192 @@
+"""
+Per-caller rate limits and the chat admission gate under abusive load.
+
+The fake model server handles --server-concurrency calls at once. Scenarios:
+  - noisy  : one anonymous IP floods /chat/ with --noisy-clients concurrent loops while
+             --users normal callers (one IP each, via X-Forwarded-For) send a request every
+             0.5 s. Run with rate limiting off and on, with the per-process (memory) and
+             the shared (mongo, here mongomock) bucket stores -> normal callers' p50/p95
+  - image  : one caller sends image chats past RATE_LIMIT_IMAGE_BURST, then text chats.
+             Extra images get 429 + Retry-After while text still passes; rejected requests
+             never reach the uploader or the model, and a rejected 4 MiB upload is
+             refused after its first chunks rather than received in full
+  - admit  : a burst of --burst concurrent chats against an admission gate of 4 slots and
+             4 queue places -> the excess is shed with fast 503s, admitted chats all succeed
+
+Usage (from Backend/):
+    python -m benchmarks.bench_rate_limit --users 8 --noisy-clients 32 --duration 3
+"""
+import argparse
+import asyncio
+import sys
+import time
+from collections import Counter
+
+import httpx
+
+from benchmarks.fakes import FakeGenaiClient, FakeUploader, make_test_image, percentile, use_mongomock
+
+
+def _setup(fake: FakeGenaiClient, enabled: bool = True, backend: str = "memory") -> None:
+    from app.agents import multimodal_agent
+    from app.core import rate_limit
+    from app.core.concurrency import ConcurrencyLimiter
+    from app.core.config import settings
+
+    multimodal_agent.set_model_client(fake)
+    multimodal_agent.model_limiter = ConcurrencyLimiter("model_calls", limit=1024)
+    rate_limit.chat_admission = ConcurrencyLimiter("chat_admission", limit=100_000)
+    settings.RATE_LIMIT_ENABLED = enabled
+    settings.RATE_LIMIT_TRUST_FORWARDED_FOR = True
+    settings.RATE_LIMIT_TEXT_PER_MINUTE, settings.RATE_LIMIT_TEXT_BURST = 60, 5
+    settings.RATE_LIMIT_IMAGE_PER_MINUTE, settings.RATE_LIMIT_IMAGE_BURST = 6, 3
+    settings.RATE_LIMIT_BACKEND = backend
+    rate_limit.set_bucket_store(None) # Fresh buckets for the configured backend
+
+
+async def noisy(label: str, enabled: bool, backend: str, args: argparse.Namespace) -> dict:
+    from main import app
+
+    fake = FakeGenaiClient(latency=args.latency, server_concurrency=args.server_concurrency)
+    _setup(fake, enabled, backend)
+    deadline = time.perf_counter() + args.duration
+    normal, noisy_statuses = [], Counter()
+
+    async def flood(http: httpx.AsyncClient, c: int) -> None:
+        i = 0
+        while time.perf_counter() < deadline:
+            response = await http.post("/api/v1/chat/", data={"user_input_text": f"spam {c} {i}"},
+                                       headers={"X-Forwarded-For": "203.0.113.66"})
+            noisy_statuses[response.status_code] += 1
+            if response.status_code == 429:
+                await asyncio.sleep(0.05) # A careless client barely backs off
+            i += 1
+
+    async def user(http: httpx.AsyncClient, u: int) -> None:
+        i = 0
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            response = await http.post("/api/v1/chat/", data={"user_input_text": f"user {u} question {i}"},
+                                       headers={"X-Forwarded-For": f"198.51.100.{u + 1}"})
+            assert response.status_code == 200, (response.status_code, response.text)
+            normal.append(time.perf_counter() - start)
+            i += 1
+            await asyncio.sleep(0.5)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as http:
+        await asyncio.gather(*(flood(http, c) for c in range(args.noisy_clients)), *(user(http, u) for u in range(args.users)))
+
+    result = {"p50": percentile(normal, 50), "p95": percentile(normal, 95), "calls": fake.calls}
+    print(f"  {label:<22} normal users p50 {result['p50'] * 1000:6.0f} ms  p95 {result['p95'] * 1000:6.0f} ms   "
+          f"noisy IP: {noisy_statuses[200]:4d} served, {noisy_statuses[429]:5d} x 429   model calls {fake.calls}")
+    return result
+
+
+async def _streamed_upload(http: httpx.AsyncClient, headers: dict, size: int, chunk: int = 64 * 1024) -> tuple:
+    """Sends a multipart image chat whose body is produced lazily; returns (status, body bytes pulled)."""
+    boundary = "bench-boundary"
+    head = (
+        f"--{boundary}\r\nContent-Disposition: form-data; name=\"user_input_text\"\r\n\r\nbig upload\r\n"
+        f"--{boundary}\r\nContent-Disposition: form-data; name=\"image_file\"; filename=\"big.png\"\r\n"
+        f"Content-Type: image/png\r\n\r\n"
+    ).encode()
+    tail = f"\r\n--{boundary}--\r\n".encode()
+    pulled = 0
+
+    async def body():
+        nonlocal pulled
+        for piece in [head, *(b"\0" * chunk for _ in range(size // chunk)), tail]:
+            pulled += len(piece)
+            yield piece
+
+    response = await http.post("/api/v1/chat/", content=body(),
+                               headers={**headers, "Content-Type": f"multipart/form-data; boundary={boundary}"})
+    return response.status_code, pulled
+
+
+async def image_budget() -> bool:
+    from app.agents import image_handler
+    from main import app
+
+    fake = FakeGenaiClient(latency=0.0)
+    uploader = FakeUploader(latency=0.0)
+    _setup(fake)
+    image_handler.set_image_uploader(uploader)
+    image = make_test_image()
+    headers = {"X-Forwarded-For": "192.0.2.10"}
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as http:
+        images = []
+        for i in range(6):
+            images.append(await http.post("/api/v1/chat/", headers=headers, data={"user_input_text": f"image {i}"},
+                                          files={"image_file": ("photo.png", image, "image/png")}))
+        texts = [await http.post("/api/v1/chat/", headers=headers, data={"user_input_text": f"text {i}"}) for i in range(3)]
+        big_status, big_pulled = await _streamed_upload(http, headers, 4 * 2**20)
+
+    image_codes = [r.status_code for r in images]
+    text_codes = [r.status_code for r in texts]
+    retry_after = [r.headers.get("Retry-After") for r in images if r.status_code == 429]
+    print(f"  image chats {image_codes}  Retry-After {retry_after}  then text chats {text_codes}")
+    print(f"  uploads {uploader.uploads}  model calls {fake.calls} (3 images + 3 texts expected)")
+    print(f"  4 MiB upload over the image budget: {big_status} after {big_pulled} bytes of its body were read")
+    return (
+        image_codes == [200, 200, 200, 429, 429, 429] and text_codes == [200, 200, 200]
+        and all(retry_after) and uploader.uploads == 3 and fake.calls == 6
+        and big_status == 429 and big_pulled < 256 * 1024
+    )
+
+
+async def admission(args: argparse.Namespace) -> bool:
+    from app.core import rate_limit
+    from app.core.concurrency import ConcurrencyLimiter
+    from main import app
+
+    fake = FakeGenaiClient(latency=0.2)
+    _setup(fake, enabled=False)
+    rate_limit.chat_admission = ConcurrencyLimiter("chat_admission", limit=4, queue_timeout=0.5, max_waiting=4)
+    timings = {200: [], 503: []}
+
+    async def one(http: httpx.AsyncClient, i: int) -> None:
+        start = time.perf_counter()
+        response = await http.post("/api/v1/chat/", data={"user_input_text": f"burst {i}"})
+        timings.setdefault(response.status_code, []).append(time.perf_counter() - start)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as http:
+        await asyncio.gather(*(one(http, i) for i in range(args.burst)))
+
+    served, shed = timings[200], timings[503]
+    print(f"  burst of {args.burst}: {len(served)} served (p50 {percentile(served, 50) * 1000:.0f} ms), "
+          f"{len(shed)} shed with 503 (p50 {percentile(shed, 50) * 1000:.0f} ms)   model calls {fake.calls}")
+    return len(served) + len(shed) == args.burst and len(shed) > 0 and len(served) >= 8 and fake.calls == len(served) \
+        and percentile(shed, 50) < 0.1
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=8)
+    parser.add_argument("--noisy-clients", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=3.0)
+    parser.add_argument("--latency", type=float, default=0.1, help="Fake model latency per call (seconds).")
+    parser.add_argument("--server-concurrency", type=int, default=4)
+    parser.add_argument("--burst", type=int, default=40)
+    args = parser.parse_args()
+
+    use_mongomock()
+    print("noisy:")
+    off = asyncio.run(noisy("rate limiting off", False, "memory", args))
+    memory = asyncio.run(noisy("rate limiting (memory)", True, "memory", args))
+    mongo = asyncio.run(noisy("rate limiting (mongo)", True, "mongo", args))
+    ok = memory["p95"] < off["p95"] / 2 and mongo["p95"] < off["p95"] / 2
+    print("image:")
+    ok &= asyncio.run(image_budget())
+    print("admit:")
+    ok &= asyncio.run(admission(args))
+    print("OK" if ok else "FAIL")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,120 @@
+"""
+Model calls and chat latency with and without the response cache.
+
+Replays a stream of anonymous chat requests in which a share of the image
+uploads (sent without text, i.e. the default description prompt) and text
+prompts are duplicates, first with RESPONSE_CACHE_ENABLED=False, then with the
+memory tier, then with an empty memory tier backed by the MongoDB tier (as seen
+by a second worker process). Also checks that `no_cache=true` forces a model call.
+
+Usage (from Backend/):
+    python -m benchmarks.bench_response_cache --requests 200 --duplicates 0.6 --latency 0.2
+"""
+import argparse
+import asyncio
+import random
+import sys
+import time
+
+import httpx
+
+from benchmarks.fakes import FakeGenaiClient, FakeUploader, make_test_image, percentile, use_mongomock
+
+
+def _traffic(requests: int, duplicates: float, seed: int = 11) -> list:
+    """List of (text, image_bytes) requests; `duplicates` of them repeat an earlier one."""
+    rng = random.Random(seed)
+    seen, traffic = [], []
+    for i in range(requests):
+        if seen and rng.random() < duplicates:
+            traffic.append(rng.choice(seen))
+            continue
+        if rng.random() < 0.7:
+            request = ("", make_test_image(64 + i % 50, 48 + i // 50))  # image, default prompt
+        else:
+            request = (f"Explain  topic   number {i}", None)
+        seen.append(request)
+        traffic.append(request)
+    return traffic
+
+
+async def _replay(http: httpx.AsyncClient, traffic: list, concurrency: int = 8, no_cache: bool = False) -> list:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(text: str, image: bytes) -> None:
+        data = {"user_input_text": text, "no_cache": str(no_cache).lower()}
+        files = {"image_file": ("upload.png", image, "image/png")} if image else None
+        async with semaphore:
+            start = time.perf_counter()
+            response = await http.post("/api/v1/chat/", data=data, files=files)
+            latencies.append(time.perf_counter() - start)
+        assert response.status_code == 200, (response.status_code, response.text)
+
+    # Sequential duplicates matter (answered "seconds earlier"), so run in order-preserving waves
+    for start in range(0, len(traffic), concurrency):
+        await asyncio.gather(*(one(text, image) for text, image in traffic[start:start + concurrency]))
+    return latencies
+
+
+async def run(requests: int, duplicates: float, latency: float) -> bool:
+    from app.agents import image_handler, multimodal_agent, response_cache
+    from app.core.concurrency import ConcurrencyLimiter
+    from app.core.config import settings
+    from main import app
+
+    use_mongomock()
+    image_handler.set_image_uploader(FakeUploader(latency=0.0))
+    multimodal_agent.model_limiter = ConcurrencyLimiter("model_calls", limit=settings.MODEL_MAX_CONCURRENCY)
+    traffic = _traffic(requests, duplicates)
+    unique = len({(text, image) for text, image in traffic})
+
+    transport = httpx.ASGITransport(app=app)
+    results = {}
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as http:
+        for label, enabled, mongo in (("cache off", False, False), ("memory tier", True, False), ("mongo tier", True, True)):
+            settings.RESPONSE_CACHE_ENABLED = enabled
+            settings.RESPONSE_CACHE_MONGO_ENABLED = mongo
+            fake = FakeGenaiClient(latency=latency)
+            multimodal_agent.set_model_client(fake)
+            response_cache.clear()
+            if mongo:
+                # Fill the shared tier, then drop this worker's memory tier
+                await _replay(http, traffic)
+                response_cache.clear()
+                fake.calls = 0
+            latencies = await _replay(http, traffic)
+            results[label] = fake.calls
+            print(f"  {label:<12} model calls {fake.calls:4d}/{requests}   "
+                  f"p50 {percentile(latencies, 50) * 1000:6.0f} ms   mean {sum(latencies) / len(latencies) * 1000:6.0f} ms")
+
+        fake = FakeGenaiClient(latency=latency)
+        multimodal_agent.set_model_client(fake)
+        await _replay(http, traffic[:10], no_cache=True)
+        bypassed = fake.calls == 10
+
+    print(f"{requests} requests, {unique} unique, model latency {latency:.3f}s")
+    print(f"  cache stats        : {response_cache.stats()}")
+    print(f"  no_cache=true      : {'forces model calls' if bypassed else 'served from cache (FAIL)'}")
+    return (
+        bypassed
+        and results["cache off"] == requests
+        and results["memory tier"] == unique
+        and results["mongo tier"] == 0
+    )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--duplicates", type=float, default=0.6, help="Share of requests repeating an earlier one.")
+    parser.add_argument("--latency", type=float, default=0.2)
+    args = parser.parse_args()
+
+    ok = asyncio.run(run(args.requests, args.duplicates, args.latency))
+    print("OK" if ok else "FAIL")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,218 @@
+"""
+Storage and history-read latency before and after retention.
+
+Seeds --users logged-in users with --turns-per-day turns over each of the last
+--days days (Markdown-ish answers of a few hundred words), plus --anonymous
+anonymous turns over the last three days. Then:
+
+  - ttl     : applies the anonymous TTL index the way MongoDB's TTL monitor does
+              (its expireAfterSeconds and partialFilterExpression) -> anonymous turns removed,
+              logged-in turns untouched
+  - compact : python -m app.database.retention's compact() with HISTORY_ARCHIVE_AFTER_DAYS
+              -> turns moved, BSON bytes of conversation_history + conversation_archives
+              before vs after, compression ratio, job time
+  - reads   : one user's whole history walked through GET /api/v1/history/ (older via
+              X-Next-Cursor, then newer via X-Prev-Cursor), the context load (latest turns)
+              and a delta-sync lookup of an old turn id, before vs after -> identical
+              results; page latency of live vs archived pages
+
+Usage (from Backend/):
+    python -m benchmarks.bench_retention --users 8 --days 90 --turns-per-day 6
+"""
+import argparse
+import asyncio
+import calendar
+import random
+import struct
+import sys
+import time
+from datetime import datetime, timedelta
+
+import bson
+import httpx
+from bson import ObjectId
+
+from benchmarks.fakes import use_mongomock
+
+_WORDS = (
+    "the model request response image upload cache token user session history page cursor index query latency "
+    "function return value error retry timeout python async await database document field schema validate config "
+    "setting worker process thread memory buffer batch stream json result example explain because therefore however "
+    "first second finally note step install run test check file path class method import module package version"
+).split()
+
+
+def _answer(rng: random.Random) -> str:
+    paragraphs = []
+    for _ in range(rng.randint(2, 5)):
+        sentences = [" ".join(rng.choice(_WORDS) for _ in range(rng.randint(8, 20))).capitalize() + "."
+                     for _ in range(rng.randint(2, 5))]
+        paragraphs.append(" ".join(sentences))
+    if rng.random() < 0.4:
+        paragraphs.append("```python\n" + "\n".join(f"{rng.choice(_WORDS)}_{i} = {rng.choice(_WORDS)}({rng.randint(0, 99)})"
+                                                  for i in range(rng.randint(3, 10))) + "\n```")
+    if rng.random() < 0.5:
+        paragraphs.append("\n".join(f"- **{rng.choice(_WORDS)}**: {' '.join(rng.choice(_WORDS) for _ in range(6))}"
+                                    for _ in range(rng.randint(2, 6))))
+    return "\n\n".join(paragraphs)
+
+
+def _object_id(timestamp: datetime, rng: random.Random) -> ObjectId:
+    """An ObjectId created at `timestamp` (like the ones the history writer assigns)."""
+    return ObjectId(struct.pack(">I", calendar.timegm(timestamp.utctimetuple())) + rng.randbytes(8))
+
+
+def _seed(database, args: argparse.Namespace, now: datetime) -> list:
+    from app.database.models import ConversationHistory
+
+    rng = random.Random(7)
+    users = database["users"]
+    user_ids = [str(users.insert_one({"email": f"retention{u}@example.com", "username": f"retention{u}",
+                                      "hashed_password": "x", "is_active": True}).inserted_id) for u in range(args.users)]
+    turns = []
+    for user_id in user_ids:
+        for day in range(args.days):
+            for _ in range(args.turns_per_day):
+                timestamp = (now - timedelta(days=day, seconds=rng.randint(0, 86_399))).replace(microsecond=rng.randint(0, 999) * 1000)
+                turns.append({"_id": _object_id(timestamp, rng), "session_id": user_id, "user_id": user_id,
+                              "is_anonymous": False, "user_input_text": " ".join(rng.choice(_WORDS) for _ in range(12)) + "?",
+                              "ai_response_text": _answer(rng), "model_used": "gemini-2.5-flash", "timestamp": timestamp})
+    for a in range(args.anonymous):
+        timestamp = now - timedelta(seconds=rng.randint(0, 3 * 86_400))
+        turns.append({"_id": _object_id(timestamp, rng), "session_id": f"anon-{a % 50}", "user_id": None, "is_anonymous": True,
+                      "user_input_text": "hello?", "ai_response_text": _answer(rng), "model_used": "gemini-2.5-flash",
+                      "timestamp": timestamp})
+    database[ConversationHistory._meta["collection"]].insert_many(turns)
+    return user_ids
+
+
+def _stored_bytes(database) -> tuple:
+    from app.database.models import ConversationArchive, ConversationHistory
+
+    live = list(database[ConversationHistory._meta["collection"]].find())
+    archives = list(database[ConversationArchive._meta["collection"]].find())
+    return (len(live), sum(len(bson.encode(doc)) for doc in live),
+            len(archives), sum(len(bson.encode(doc)) for doc in archives))
+
+
+async def _walk(http: httpx.AsyncClient, headers: dict, page_size: int, cutoff: datetime) -> dict:
+    """Walks the whole history back in time, then forward again; times live and archived pages."""
+    older, newer, live_times, archived_times = [], [], [], []
+    cursor, prev = None, None
+    while True:
+        params = {"limit": page_size, **({"before": cursor} if cursor else {})}
+        start = time.perf_counter()
+        response = await http.get("/api/v1/history/", params=params, headers=headers)
+        elapsed = time.perf_counter() - start
+        page = response.json()
+        older.extend(page)
+        (archived_times if page and page[0]["timestamp"] < cutoff.isoformat() else live_times).append(elapsed)
+        cursor = response.headers.get("x-next-cursor")
+        prev = response.headers.get("x-prev-cursor")
+        if not cursor:
+            break
+    while prev:
+        response = await http.get("/api/v1/history/", params={"limit": page_size, "after": prev}, headers=headers)
+        newer[:0] = response.json()
+        prev = response.headers.get("x-prev-cursor")
+    return {"older": older, "newer": newer, "live": live_times, "archived": archived_times}
+
+
+async def _reads(user_id: str, old_turn_id: str, args: argparse.Namespace, cutoff: datetime) -> dict:
+    from app.core.security import create_access_token
+    from app.database.repositories import conversations
+    from main import app
+
+    headers = {"Authorization": f"Bearer {create_access_token({'user_id': user_id})}"}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as http:
+        result = await _walk(http, headers, args.page_size, cutoff)
+    start = time.perf_counter()
+    result["context"] = [doc["_id"] for doc in await conversations.recent_for_user(user_id, 50)]
+    result["context_time"] = time.perf_counter() - start
+    start = time.perf_counter()
+    result["lookup"] = await conversations.get_for_user(user_id, old_turn_id, projection={"timestamp": 1})
+    result["lookup_time"] = time.perf_counter() - start
+    return result
+
+
+def _print_reads(label: str, reads: dict) -> None:
+    def mean(times: list) -> float:
+        return sum(times) / len(times) * 1000 if times else 0.0
+
+    print(f"  {label}: walked {len(reads['older'])} turns back, {len(reads['newer'])} forward;"
+          f" live pages {mean(reads['live']):6.2f} ms ({len(reads['live'])}), archived pages {mean(reads['archived']):6.2f} ms"
+          f" ({len(reads['archived'])});  context load {reads['context_time'] * 1000:5.2f} ms;"
+          f"  old turn lookup {reads['lookup_time'] * 1000:5.2f} ms ({'found' if reads['lookup'] else 'missing'})")
+
+
+async def run(args: argparse.Namespace) -> bool:
+    from app.core.config import settings
+    from app.database import connection
+    from app.database.models import ConversationHistory
+    from app.database.retention import archive_cutoff, compact
+
+    database = use_mongomock(latency=args.db_latency)
+    connection.ensure_indexes()
+    settings.HISTORY_ARCHIVE_AFTER_DAYS = args.archive_after_days
+    now = datetime.utcnow()
+    user_ids = _seed(database, args, now)
+    history = database[ConversationHistory._meta["collection"]]
+    user_id = user_ids[0]
+    old_turn = history.find_one({"user_id": user_id, "timestamp": {"$lt": now - timedelta(days=args.days - 1)}})
+    cutoff = archive_cutoff(now)
+
+    print(f"{args.users} users x {args.days} days x {args.turns_per_day} turns + {args.anonymous} anonymous turns")
+    ttl = history.index_information()["anonymous_turns_ttl"]
+    expired = {**ttl["partialFilterExpression"], "timestamp": {"$lt": now - timedelta(seconds=ttl["expireAfterSeconds"])}}
+    removed = history.delete_many(expired).deleted_count
+    left = history.count_documents({"is_anonymous": True})
+    print(f"ttl: index expires anonymous turns after {ttl['expireAfterSeconds']} s -> {removed} removed, {left} recent kept, "
+          f"{history.count_documents({'is_anonymous': False})} logged-in turns untouched")
+
+    before_bytes = _stored_bytes(database)
+    before = await _reads(user_id, str(old_turn["_id"]), args, cutoff)
+    report = await compact()
+    after_bytes = _stored_bytes(database)
+    after = await _reads(user_id, str(old_turn["_id"]), args, cutoff)
+
+    live_docs, live_size, _, _ = before_bytes
+    after_live_docs, after_live_size, archive_docs, archive_size = after_bytes
+    total_after = after_live_size + archive_size
+    print(f"compact: {report.turns} turns of {report.users} users -> {report.archives} archives in {report.seconds:.2f} s "
+          f"(payload {report.raw_bytes / 2**20:.1f} MiB -> {report.compressed_bytes / 2**20:.1f} MiB, {report.ratio:.1f}x)")
+    print(f"  stored before: {live_docs} turn documents, {live_size / 2**20:7.1f} MiB")
+    print(f"  stored after : {after_live_docs} turn documents + {archive_docs} archives, "
+          f"{after_live_size / 2**20:.1f} + {archive_size / 2**20:.1f} = {total_after / 2**20:7.1f} MiB "
+          f"({1 - total_after / live_size:.0%} less)")
+    print("reads:")
+    _print_reads("before", before)
+    _print_reads("after ", after)
+
+    same = all(before[key] == after[key] for key in ("older", "newer", "context")) and after["lookup"] == before["lookup"]
+    complete = len(after["older"]) == args.days * args.turns_per_day and after["newer"] == after["older"][:len(after["newer"])]
+    print(f"  identical results before/after: {same}; walk complete and consistent both ways: {complete}")
+    return (
+        same and complete and before["lookup"] is not None and removed > 0 and left > 0
+        and report.ratio >= 3 and total_after < live_size * 0.7 and report.archives > 0
+    )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=8)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--turns-per-day", type=int, default=6)
+    parser.add_argument("--anonymous", type=int, default=1000)
+    parser.add_argument("--archive-after-days", type=int, default=30)
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--db-latency", type=float, default=0.0005, help="Simulated MongoDB round trip (seconds).")
+    args = parser.parse_args()
+
+    ok = asyncio.run(run(args))
+    print("OK" if ok else "FAIL")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
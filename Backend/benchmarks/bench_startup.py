@@ -0,0 +1,93 @@
+"""
+Cold-start time of a worker: import time and time to the first served requests.
+
+Each run starts a fresh interpreter that imports `main`, serves the app with
+uvicorn (lifespan on, MongoDB replaced by mongomock, fake model) and sends a
+health check and one chat. Times are measured from process spawn.
+
+  - lazy  : the app as shipped (clients created on first use / preloaded after startup)
+  - eager : the same, plus the module-level work the app used to do on import
+            (Gemini SDK and client, LangChain chat model, Cloudinary config)
+
+Usage (from Backend/):
+    python -m benchmarks.bench_startup --runs 3
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+HEAVY_MODULES = ("google.genai", "langchain_google_genai", "cloudinary")
+
+CHILD = r"""
+import sys, time, json, asyncio
+spawned = float(sys.argv[1])
+import benchmarks
+if sys.argv[2] == "eager":
+    from google import genai
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    import cloudinary, cloudinary.uploader
+    genai.Client(api_key="bench-fake-key")
+    ChatGoogleGenerativeAI(model="gemini-2.5-flash", google_api_key="bench-fake-key")
+    cloudinary.config(cloud_name="bench", api_key="bench", api_secret="bench")
+import main
+imported = time.time()
+loaded = [name for name in %(heavy)r if name in sys.modules]
+
+import httpx
+from benchmarks.fakes import FakeGenaiClient, serve_app, use_mongomock
+from app.agents import multimodal_agent
+
+main.connect_db = use_mongomock # The lifespan runs, against mongomock
+multimodal_agent.set_model_client(FakeGenaiClient(latency=0.0))
+
+async def run():
+    async with serve_app(main.app, lifespan="on") as base_url:
+        ready = time.time()
+        async with httpx.AsyncClient(base_url=base_url) as http:
+            (await http.get("/")).raise_for_status()
+            first_get = time.time()
+            (await http.post("/api/v1/chat/", data={"user_input_text": "hello"})).raise_for_status()
+            first_chat = time.time()
+    return ready, first_get, first_chat
+
+ready, first_get, first_chat = asyncio.run(run())
+print(json.dumps({
+    "import": imported - spawned, "ready": ready - spawned,
+    "first_get": first_get - spawned, "first_chat": first_chat - spawned, "loaded": loaded,
+}))
+""" % {"heavy": HEAVY_MODULES}
+
+
+def _run_child(mode: str) -> dict:
+    output = subprocess.run(
+        [sys.executable, "-c", CHILD, repr(time.time()), mode],
+        capture_output=True, text=True, check=True, timeout=120,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    results = {}
+    for mode in ("eager", "lazy"):
+        runs = [_run_child(mode) for _ in range(args.runs)]
+        median = {key: statistics.median(run[key] for run in runs) for key in ("import", "ready", "first_get", "first_chat")}
+        results[mode] = median
+        print(f"  {mode:<6} import {median['import'] * 1000:6.0f} ms   listening {median['ready'] * 1000:6.0f} ms   "
+              f"first GET / {median['first_get'] * 1000:6.0f} ms   first chat {median['first_chat'] * 1000:6.0f} ms   "
+              f"heavy modules after import: {runs[-1]['loaded'] or 'none'}")
+        results[mode]["loaded"] = runs[-1]["loaded"]
+
+    ok = results["lazy"]["first_get"] < results["eager"]["first_get"] and not results["lazy"]["loaded"]
+    print("OK" if ok else "FAIL")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,72 @@
+"""
+Checks that the Cloudinary upload overlaps with the model call on image chats.
+
+With a fake uploader taking U seconds and a fake model taking M seconds, an
+image POST /api/v1/chat/ should take about max(U, M), not U + M.
+
+Usage (from Backend/):
+    python -m benchmarks.bench_upload_overlap --upload-latency 0.4 --model-latency 0.5
+"""
+import argparse
+import asyncio
+import sys
+import time
+
+import httpx
+
+from benchmarks.fakes import FakeGenaiClient, FakeUploader, make_test_image, use_mongomock
+
+
+async def run(upload_latency: float, model_latency: float, requests: int) -> float:
+    from app.agents import image_handler, multimodal_agent
+    from app.core.concurrency import ConcurrencyLimiter
+    from app.database.models import ConversationHistory
+    from main import app
+
+    multimodal_agent.set_model_client(FakeGenaiClient(latency=model_latency))
+    multimodal_agent.model_limiter = ConcurrencyLimiter("model_calls", limit=16)
+    uploader = FakeUploader(latency=upload_latency)
+    image_handler.set_image_uploader(uploader)
+    image = make_test_image()
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=30) as http:
+        timings = []
+        for i in range(requests):
+            start = time.perf_counter()
+            response = await http.post(
+                "/api/v1/chat/",
+                data={"user_input_text": f"describe {i}"},
+                files={"image_file": ("photo.png", image, "image/png")},
+            )
+            response.raise_for_status()
+            timings.append(time.perf_counter() - start)
+
+    saved = ConversationHistory.objects(image_url__ne=None).count()
+    mean = sum(timings) / len(timings)
+    serial = upload_latency + model_latency
+    overlapped = max(upload_latency, model_latency)
+    print(f"upload {upload_latency:.3f}s, model {model_latency:.3f}s, {requests} sequential image chats")
+    print(f"  mean request time : {mean * 1000:.1f} ms")
+    print(f"  serial would be   : {serial * 1000:.1f} ms, fully overlapped: {overlapped * 1000:.1f} ms")
+    print(f"  uploads           : {uploader.uploads}, turns saved with image_url: {saved}")
+    return mean / serial
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--upload-latency", type=float, default=0.4)
+    parser.add_argument("--model-latency", type=float, default=0.5)
+    parser.add_argument("--requests", type=int, default=5)
+    args = parser.parse_args()
+
+    use_mongomock()
+    ratio = asyncio.run(run(args.upload_latency, args.model_latency, args.requests))
+    # Anything clearly below the serial sum means the two stages overlapped
+    ok = ratio < 0.8
+    print("OK" if ok else f"FAIL: request took {ratio:.2f}x the serial upload+model time")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
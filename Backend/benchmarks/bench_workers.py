@@ -0,0 +1,202 @@
+"""
+Chat throughput with 1..N gunicorn workers, and graceful drain on SIGTERM.
+
+Each run starts the production server (gunicorn -c gunicorn.conf.py, uvicorn
+workers, preload on) with MongoDB replaced by mongomock and a fake model in
+every worker. Load comes from separate client processes.
+
+  - scaling : --clients closed-loop clients for --duration seconds against 1, 2, 4 ...
+              workers -> chat throughput and p50. Each worker caps its own in-flight
+              model calls (MODEL_MAX_CONCURRENCY), which is what a single process runs
+              into first; with more CPUs the request handling itself scales too.
+              Only steps up to the available CPU count are judged (>1.5x each);
+              beyond it the numbers are printed for information
+  - drain   : 2 workers, a slow model; SIGTERM to the master while requests are in
+              flight -> every in-flight chat completes, each worker runs its lifespan
+              shutdown, the server exits within SERVER_GRACEFUL_TIMEOUT_SECONDS
+
+Usage (from Backend/):
+    python -m benchmarks.bench_workers --workers 1,2,4 --clients 256 --duration 8
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+import httpx
+
+from benchmarks.fakes import FakeGenaiClient, percentile, use_mongomock
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def create_app():
+    """App factory gunicorn loads (in the master, with preload): main.app on local stand-ins."""
+    import main
+    from app.agents import multimodal_agent
+
+    main.connect_db = use_mongomock # Runs in each worker's lifespan
+    multimodal_agent.set_model_client(FakeGenaiClient(latency=float(os.environ["BENCH_MODEL_LATENCY"])))
+    return main.app
+
+
+@contextmanager
+def gunicorn(workers: int, model_latency: float, **settings: str) -> Iterator[tuple]:
+    """Runs the production server; yields (base URL, process)."""
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    env = {
+        **os.environ, "PORT": str(port), "SERVER_WORKERS": str(workers),
+        "BENCH_MODEL_LATENCY": str(model_latency), "PYTHONUNBUFFERED": "1", **settings,
+    }
+    process = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "--log-level", "warning",
+         "benchmarks.bench_workers:create_app()"],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.monotonic() + 60
+        while True:
+            try:
+                if httpx.get(f"{base_url}/", timeout=1).status_code == 200:
+                    break
+            except httpx.HTTPError:
+                pass
+            if process.poll() is not None or time.monotonic() > deadline:
+                raise RuntimeError(f"gunicorn did not start:\n{process.stdout.read()}")
+            time.sleep(0.1)
+        time.sleep(1.0) # Let every worker finish its lifespan startup
+        yield base_url, process
+    finally:
+        if process.poll() is None:
+            process.send_signal(signal.SIGTERM)
+            process.wait(timeout=60)
+
+
+def _load_process(base_url: str, clients: int, duration: float, start_at: float, queue: multiprocessing.Queue) -> None:
+    async def run() -> list:
+        latencies = []
+        # A new connection per chat: gunicorn balances connections, not requests, so a few long-lived
+        # keep-alive connections would pin the load to whichever workers accepted them
+        limits = httpx.Limits(max_connections=clients, max_keepalive_connections=0)
+        async with httpx.AsyncClient(base_url=base_url, timeout=60, limits=limits) as http:
+            await asyncio.sleep(max(0.0, start_at - time.time()))
+            deadline = time.perf_counter() + duration
+
+            async def client(c: int) -> None:
+                i = 0
+                while time.perf_counter() < deadline:
+                    start = time.perf_counter()
+                    response = await http.post("/api/v1/chat/", data={"user_input_text": f"{os.getpid()} {c} {i}"})
+                    response.raise_for_status()
+                    if time.perf_counter() <= deadline: # Only chats completed within the window count
+                        latencies.append(time.perf_counter() - start)
+                    i += 1
+
+            await asyncio.gather(*(client(c) for c in range(clients)))
+        return latencies
+
+    queue.put(asyncio.run(run()))
+
+
+def _drive(base_url: str, args: argparse.Namespace) -> list:
+    queue: multiprocessing.Queue = multiprocessing.Queue()
+    start_at = time.time() + 1.0 # All load processes start together
+    per_process = max(1, args.clients // args.load_processes)
+    processes = [
+        multiprocessing.Process(target=_load_process, args=(base_url, per_process, args.duration, start_at, queue))
+        for _ in range(args.load_processes)
+    ]
+    for process in processes:
+        process.start()
+    latencies = [latency for _ in processes for latency in queue.get()]
+    for process in processes:
+        process.join()
+    return latencies
+
+
+def scaling(args: argparse.Namespace, cpus: int) -> bool:
+    throughputs = []
+    for workers in args.workers:
+        with gunicorn(workers, args.latency) as (base_url, _):
+            latencies = _drive(base_url, args)
+        throughput = len(latencies) / args.duration
+        throughputs.append(throughput)
+        print(f"  {workers} worker(s): {throughput:7.1f} chats/s  p50 {percentile(latencies, 50) * 1000:6.0f} ms  "
+              f"p99 {percentile(latencies, 99) * 1000:6.0f} ms  ({throughput / throughputs[0]:.2f}x)")
+    steps = [
+        (earlier_workers, later_workers, later / earlier)
+        for (earlier_workers, earlier), (later_workers, later) in zip(
+            zip(args.workers, throughputs), zip(args.workers[1:], throughputs[1:])
+        )
+        if later_workers <= cpus
+    ]
+    for earlier_workers, later_workers, gain in steps:
+        print(f"  {earlier_workers} -> {later_workers} workers: {gain:.2f}x ({'ok' if gain > 1.5 else 'expected > 1.5x'})")
+    if len(steps) < len(args.workers) - 1:
+        print(f"  steps beyond {cpus} CPU(s) not judged")
+    return all(gain > 1.5 for _, _, gain in steps)
+
+
+def drain(args: argparse.Namespace) -> bool:
+    in_flight, graceful = 24, 10
+    with gunicorn(2, 2.0, SERVER_GRACEFUL_TIMEOUT_SECONDS=str(graceful), SERVER_REQUEST_DRAIN_SECONDS="6") as (base_url, process):
+        async def run() -> list:
+            async with httpx.AsyncClient(base_url=base_url, timeout=30) as http:
+                async def chat(i: int) -> int:
+                    try:
+                        return (await http.post("/api/v1/chat/", data={"user_input_text": f"in flight {i}"})).status_code
+                    except httpx.HTTPError as e:
+                        return type(e).__name__
+
+                requests = [asyncio.create_task(chat(i)) for i in range(in_flight)]
+                await asyncio.sleep(0.5) # All requests are now waiting on the model
+                process.send_signal(signal.SIGTERM)
+                return await asyncio.gather(*requests)
+
+        signalled = time.monotonic()
+        statuses = asyncio.run(run())
+        exit_code = process.wait(timeout=graceful + 10)
+        stopped = time.monotonic() - signalled
+        output = process.stdout.read()
+
+    completed = statuses.count(200)
+    shutdowns = output.count("MongoDB connection closed")
+    print(f"  SIGTERM with {in_flight} chats in flight: {completed}/{in_flight} completed with 200, "
+          f"{shutdowns}/2 workers ran their lifespan shutdown, server exited ({exit_code}) after {stopped:.1f} s")
+    return completed == in_flight and shutdowns == 2 and exit_code == 0 and stopped < graceful
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=lambda value: [int(n) for n in value.split(",")], default=[1, 2, 4])
+    parser.add_argument("--clients", type=int, default=256)
+    parser.add_argument("--load-processes", type=int, default=2)
+    parser.add_argument("--duration", type=float, default=8.0)
+    parser.add_argument("--latency", type=float, default=1.0, help="Fake model latency per call (seconds).")
+    args = parser.parse_args()
+
+    from app.core.serving import available_cpus
+
+    cpus = available_cpus()
+    print(f"scaling ({cpus} CPU(s) available):")
+    scaled = scaling(args, cpus)
+    print("drain:")
+    drained = drain(args)
+    print(f"scaling: {'OK' if scaled else 'FAIL'}  drain: {'OK' if drained else 'FAIL'}")
+    ok = scaled and drained
+    print("OK" if ok else "FAIL")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,142 @@
+"""
+Local HTTP stand-ins for the Gemini API and Cloudinary's upload API.
+
+Unlike the in-process fakes in fakes.py, these are real servers: the app talks to
+them through the real google-genai and Cloudinary SDKs, pointed here with
+MODEL_API_BASE_URL and CLOUDINARY_UPLOAD_PREFIX. So a load test covers the SDKs'
+request building, the shared HTTP connection pool and the upload thread pool too.
+
+  - POST /{version}/models/{model}:generateContent        -> one answer after --model-latency
+  - POST /{version}/models/{model}:streamGenerateContent  -> SSE, --stream-chunks chunks over --model-latency
+  - POST /v1_1/{cloud_name}/image/upload                  -> a deterministic secure_url after --upload-latency
+  - GET  /stats                                           -> calls served so far
+
+Answers echo the last user message ("[model] echo: ..."), like FakeGenaiClient.
+
+Usage (from Backend/):
+    python -m benchmarks.fake_services --port 8600 --model-latency 0.2 --stream-chunks 10
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+from typing import Any, Dict, List
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+def _last_user_text(body: Dict[str, Any]) -> str:
+    contents = body.get("contents") or []
+    parts = contents[-1].get("parts", []) if contents else []
+    texts = [part["text"] for part in parts if "text" in part]
+    return texts[-1] if texts else ""
+
+
+def _prompt_tokens(body: Dict[str, Any]) -> int:
+    """Token estimate over everything sent (history, system instruction, message); images count 258."""
+    total, images = 0, 0
+    sources: List[Any] = list(body.get("contents") or [])
+    if body.get("systemInstruction"):
+        sources.append(body["systemInstruction"])
+    for content in sources:
+        for part in content.get("parts", []):
+            total += len(part.get("text", ""))
+            images += "inlineData" in part
+    return total // 4 + 1 + images * 258
+
+
+def _answer(model: str, body: Dict[str, Any]) -> str:
+    return f"[{model}] echo: {_last_user_text(body)}"
+
+
+def _response(model: str, text: str, prompt_tokens: int, output_tokens: int, final: bool = True) -> Dict[str, Any]:
+    candidate: Dict[str, Any] = {"content": {"role": "model", "parts": [{"text": text}]}, "index": 0}
+    response: Dict[str, Any] = {"candidates": [candidate], "modelVersion": model}
+    if final:
+        candidate["finishReason"] = "STOP"
+        response["usageMetadata"] = {
+            "promptTokenCount": prompt_tokens,
+            "candidatesTokenCount": output_tokens,
+            "totalTokenCount": prompt_tokens + output_tokens,
+        }
+    return response
+
+
+def create_app(model_latency: float = 0.2, stream_chunks: int = 10, upload_latency: float = 0.3) -> Starlette:
+    """The fake services as one ASGI app (mounted on a single port)."""
+    stats = {"generate": 0, "stream": 0, "uploads": 0, "upload_bytes": 0}
+
+    async def model_call(request: Request) -> Response:
+        model, _, action = request.path_params["model_action"].partition(":")
+        body = await request.json()
+        text = _answer(model, body)
+        prompt_tokens, output_tokens = _prompt_tokens(body), len(text) // 4 + 1
+
+        if action == "generateContent":
+            stats["generate"] += 1
+            await asyncio.sleep(model_latency)
+            return JSONResponse(_response(model, text, prompt_tokens, output_tokens))
+        if action != "streamGenerateContent":
+            return JSONResponse({"error": {"code": 404, "message": f"unknown action {action}"}}, status_code=404)
+
+        stats["stream"] += 1
+        words = text.split(" ")
+        step = max(1, -(-len(words) // max(1, stream_chunks)))
+
+        async def events():
+            for i in range(0, len(words), step):
+                await asyncio.sleep(model_latency / max(1, stream_chunks))
+                piece = " ".join(words[i:i + step])
+                final = i + step >= len(words)
+                chunk = _response(model, piece if i == 0 else " " + piece, prompt_tokens, output_tokens, final)
+                yield f"data: {json.dumps(chunk)}\r\n\r\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    async def upload(request: Request) -> Response:
+        form = await request.form()
+        upload_file = form.get("file")
+        content = await upload_file.read() if hasattr(upload_file, "read") else str(upload_file or "").encode()
+        await asyncio.sleep(upload_latency)
+        stats["uploads"] += 1
+        stats["upload_bytes"] += len(content)
+        digest = hashlib.sha256(content).hexdigest()[:16]
+        folder = form.get("folder") or ""
+        public_id = f"{folder}/{digest}" if folder else digest
+        return JSONResponse({
+            "public_id": public_id,
+            "format": "jpg",
+            "resource_type": "image",
+            "bytes": len(content),
+            "secure_url": f"https://fake-cloudinary.local/{public_id}.jpg",
+        })
+
+    async def get_stats(request: Request) -> Response:
+        return JSONResponse(stats)
+
+    return Starlette(routes=[
+        Route("/{version}/models/{model_action}", model_call, methods=["POST"]),
+        Route("/v1_1/{cloud_name}/image/upload", upload, methods=["POST"]),
+        Route("/stats", get_stats, methods=["GET"]),
+    ])
+
+
+def main() -> None:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8600)
+    parser.add_argument("--model-latency", type=float, default=0.2, help="Seconds per model answer (whole stream).")
+    parser.add_argument("--stream-chunks", type=int, default=10)
+    parser.add_argument("--upload-latency", type=float, default=0.3)
+    args = parser.parse_args()
+
+    app = create_app(args.model_latency, args.stream_chunks, args.upload_latency)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,464 @@
+"""
+Local stand-ins for the external services used by the backend.
+
+Nothing in here talks to the network: the fake model client sleeps for a
+configurable latency and echoes the prompt back, and the fake uploader sleeps
+and returns a deterministic URL.
+"""
+import asyncio
+import hashlib
+import random
+import socket
+import threading
+import time
+from contextlib import asynccontextmanager, nullcontext
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, List
+
+
+class FakeGenerateContentResponse:
+    """Mimics the fields of google.genai's GenerateContentResponse that the app reads."""
+
+    def __init__(self, text: str, prompt_tokens: int = 0, output_tokens: int = 0):
+        self.text = text
+        self.usage_metadata = SimpleNamespace(
+            prompt_token_count=prompt_tokens,
+            candidates_token_count=output_tokens,
+            total_token_count=prompt_tokens + output_tokens,
+        )
+
+
+def _texts(item: Any) -> List[str]:
+    """Text pieces of a str, Part, Content or list of them."""
+    if isinstance(item, str):
+        return [item]
+    if isinstance(item, (list, tuple)):
+        return [text for element in item for text in _texts(element)]
+    if getattr(item, "parts", None):
+        return _texts(item.parts)
+    text = getattr(item, "text", None)
+    return [text] if isinstance(text, str) else []
+
+
+def _prompt_text(contents: Any) -> str:
+    """Text of the current message (the last user turn)."""
+    if isinstance(contents, (list, tuple)) and contents and getattr(contents[-1], "parts", None):
+        contents = contents[-1].parts
+    texts = _texts(contents)
+    return texts[-1] if texts else ""
+
+
+def _prompt_tokens(contents: Any, config: Any) -> int:
+    """Token estimate over everything sent: history, system instruction and message."""
+    texts = _texts(contents) + _texts(getattr(config, "system_instruction", None) or [])
+    return sum(len(text) for text in texts) // 4 + 1
+
+
+class _FakeAsyncModels:
+    def __init__(self, owner: "FakeGenaiClient"):
+        self._owner = owner
+
+    async def generate_content(self, *, model: str, contents: Any, config: Any = None) -> FakeGenerateContentResponse:
+        async with self._owner._capacity():
+            self._owner._enter()
+            try:
+                await asyncio.sleep(self._owner.latency)
+                return self._owner._reply(model, contents, config)
+            finally:
+                self._owner._exit()
+
+    async def generate_content_stream(self, *, model: str, contents: Any, config: Any = None):
+        owner = self._owner
+        owner._enter()
+        owner.open_streams += 1
+
+        async def chunks():
+            finished = False
+            try:
+                reply = owner._reply(model, contents, config)
+                words = reply.text.split(" ")
+                per_chunk = owner.latency / max(1, owner.stream_chunks)
+                step = max(1, -(-len(words) // max(1, owner.stream_chunks)))
+                for i in range(0, len(words), step):
+                    await asyncio.sleep(per_chunk)
+                    piece = " ".join(words[i:i + step])
+                    # Like the real API, the final chunk carries the usage totals
+                    last = i + step >= len(words)
+                    yield FakeGenerateContentResponse(
+                        piece if i == 0 else " " + piece,
+                        prompt_tokens=reply.usage_metadata.prompt_token_count if last else 0,
+                        output_tokens=reply.usage_metadata.candidates_token_count if last else 0,
+                    )
+                finished = True
+            finally:
+                owner.open_streams -= 1
+                if not finished:
+                    owner.aborted_streams += 1
+                owner._exit()
+
+        return chunks()
+
+
+class _FakeSyncModels:
+    def __init__(self, owner: "FakeGenaiClient"):
+        self._owner = owner
+
+    def generate_content(self, *, model: str, contents: Any, config: Any = None) -> FakeGenerateContentResponse:
+        self._owner._enter()
+        try:
+            time.sleep(self._owner.latency)
+            return self._owner._reply(model, contents, config)
+        finally:
+            self._owner._exit()
+
+
+class FakeGenaiClient:
+    """
+    Drop-in replacement for `google.genai.Client` exposing `.models` and `.aio.models`.
+
+    Args:
+        latency: Seconds every generate_content call takes (whole stream for streaming calls).
+        with_async: When False, `.aio` is omitted so the agent's executor fallback is used.
+        stream_chunks: Number of chunks a streamed answer is split into.
+        server_concurrency: Calls the fake server handles at once (async calls only); the rest queue.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.5,
+        with_async: bool = True,
+        stream_chunks: int = 10,
+        server_concurrency: int = 0,
+    ):
+        self.latency = latency
+        self.stream_chunks = stream_chunks
+        self.server_concurrency = server_concurrency
+        self._server_slots = None
+        self.open_streams = 0
+        self.aborted_streams = 0
+        self.calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.last_prompt_tokens = 0
+        self.models = _FakeSyncModels(self)
+        if with_async:
+            self.aio = SimpleNamespace(models=_FakeAsyncModels(self))
+
+    def _enter(self) -> None:
+        self.calls += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    def _exit(self) -> None:
+        self.in_flight -= 1
+
+    def _capacity(self) -> Any:
+        if not self.server_concurrency:
+            return nullcontext()
+        if self._server_slots is None:
+            self._server_slots = asyncio.Semaphore(self.server_concurrency)
+        return self._server_slots
+
+    def _reply(self, model: str, contents: Any, config: Any = None) -> FakeGenerateContentResponse:
+        text = f"[{model}] echo: {_prompt_text(contents)}"
+        self.last_prompt_tokens = _prompt_tokens(contents, config)
+        return FakeGenerateContentResponse(text, prompt_tokens=self.last_prompt_tokens, output_tokens=len(text) // 4 + 1)
+
+
+class FakeAPIError(Exception):
+    """Mimics google.genai.errors.APIError (only the HTTP status `code` is read)."""
+
+    def __init__(self, code: int, message: str = "fake model error"):
+        super().__init__(f"{code} {message}")
+        self.code = code
+
+
+class ModelProfile:
+    """Behaviour of one model of a FakeModelFleet; attributes may be changed mid-run."""
+
+    def __init__(self, latency: float = 0.05, slow_rate: float = 0.0, slow_latency: float = 1.0, error_rate: float = 0.0):
+        self.latency = latency
+        self.slow_rate = slow_rate # Share of calls taking slow_latency instead (tail latency)
+        self.slow_latency = slow_latency
+        self.error_rate = error_rate # Share of calls failing with a 503
+
+
+class FakeModelFleet:
+    """
+    Async-only fake client whose models behave independently (see bench_model_routing).
+
+    Unknown model names fail with a 404 so misrouted calls show up.
+    """
+
+    def __init__(self, profiles: dict, seed: int = 7):
+        self.profiles = profiles
+        self.calls: dict = {name: 0 for name in profiles}
+        self.errors: dict = {name: 0 for name in profiles}
+        self._random = random.Random(seed)
+        self.aio = SimpleNamespace(models=self)
+
+    async def generate_content(self, *, model: str, contents: Any, config: Any = None) -> FakeGenerateContentResponse:
+        profile = self.profiles.get(model)
+        if profile is None:
+            raise FakeAPIError(404, f"model {model} not found")
+        self.calls[model] += 1
+        roll = self._random.random()
+        if roll < profile.error_rate:
+            await asyncio.sleep(profile.latency / 2)
+            self.errors[model] += 1
+            raise FakeAPIError(503, "model overloaded")
+        slow = roll < profile.error_rate + profile.slow_rate
+        await asyncio.sleep(profile.slow_latency if slow else profile.latency)
+        text = f"[{model}] echo: {_prompt_text(contents)}"
+        return FakeGenerateContentResponse(text, prompt_tokens=_prompt_tokens(contents, config), output_tokens=len(text) // 4 + 1)
+
+
+class FakeUploader:
+    """
+    Blocking stand-in for `cloudinary.uploader.upload` (see image_handler.set_image_uploader).
+
+    Records when each upload ran so benchmarks can measure overlap with the model call.
+    """
+
+    def __init__(self, latency: float = 0.5):
+        self.latency = latency
+        self.uploads = 0
+        self.bytes_uploaded = 0
+        self.intervals: List[tuple] = []
+        self._lock = threading.Lock()
+
+    def __call__(self, file_content: bytes) -> dict:
+        start = time.perf_counter()
+        time.sleep(self.latency)
+        digest = hashlib.sha256(bytes(file_content)).hexdigest()[:16]
+        with self._lock:
+            self.uploads += 1
+            self.bytes_uploaded += len(file_content)
+            self.intervals.append((start, time.perf_counter()))
+        return {"secure_url": f"https://fake-cloudinary.local/ai_agent_uploads/{digest}.jpg"}
+
+
+def make_test_image(width: int = 64, height: int = 48, fmt: str = "PNG") -> bytes:
+    """Generates a small gradient image with Pillow."""
+    from io import BytesIO
+    from PIL import Image
+
+    image = Image.new("RGB", (width, height))
+    image.putdata([((x * 255) // max(1, width - 1), (y * 255) // max(1, height - 1), 128)
+                   for y in range(height) for x in range(width)])
+    buffer = BytesIO()
+    image.save(buffer, format=fmt)
+    return buffer.getvalue()
+
+
+def make_photo(width: int = 4032, height: int = 3024, quality: int = 92) -> bytes:
+    """Generates a camera-sized JPEG with EXIF metadata (orientation, camera model)."""
+    from io import BytesIO
+    from PIL import Image
+
+    # Smooth gradient plus noise compresses like a real photo rather than a flat fill
+    base = Image.linear_gradient("L").resize((width, height))
+    noise = Image.effect_noise((width, height), 40)
+    image = Image.merge("RGB", (base, noise, base.transpose(Image.Transpose.FLIP_LEFT_RIGHT)))
+    exif = Image.Exif()
+    exif[0x0112] = 6  # Orientation: rotate 90 CW
+    exif[0x0110] = "Bench Phone 12"  # Camera model
+    buffer = BytesIO()
+    image.save(buffer, format="JPEG", quality=quality, exif=exif)
+    return buffer.getvalue()
+
+
+async def _round_trip(latency: float, blocking: bool) -> None:
+    if blocking:
+        time.sleep(latency)  # what a synchronous driver call does to the event loop
+    else:
+        await asyncio.sleep(latency)
+
+
+class _AsyncCursor:
+    """
+    Async view of a (mongomock) cursor: chainable modifiers, to_list() and async iteration.
+
+    Iteration pays one round trip up front, then one per `batch_size()` documents if set.
+    """
+
+    def __init__(self, cursor: Any, latency: float, blocking: bool = False):
+        self._cursor = cursor
+        self._latency = latency
+        self._blocking = blocking
+        self._first_batch = True
+        self._batch_size = 0
+        self._left_in_batch = 0
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self._cursor, name)
+
+        def chain(*args, **kwargs):
+            attr(*args, **kwargs)
+            return self
+
+        return chain if callable(attr) else attr
+
+    def batch_size(self, batch_size: int) -> "_AsyncCursor":
+        self._batch_size = batch_size
+        return self
+
+    async def to_list(self, length: Any = None) -> list:
+        await _round_trip(self._latency, self._blocking)
+        items = list(self._cursor)
+        return items if length is None else items[:length]
+
+    def __aiter__(self) -> "_AsyncCursor":
+        return self
+
+    async def __anext__(self) -> Any:
+        if self._first_batch or (self._batch_size and not self._left_in_batch):
+            self._first_batch = False
+            self._left_in_batch = self._batch_size
+            await _round_trip(self._latency, self._blocking)
+        self._left_in_batch -= 1
+        try:
+            return next(self._cursor)
+        except StopIteration:
+            raise StopAsyncIteration
+
+    async def close(self) -> None:
+        self._cursor.close()
+
+
+class AsyncCollectionShim:
+    """
+    Wraps a synchronous collection in the AsyncCollection API, adding `latency` per operation.
+
+    With `blocking=True` the latency is spent in time.sleep(), reproducing a
+    synchronous driver called from an `async def` handler.
+    """
+
+    def __init__(self, collection: Any, latency: float = 0.0, blocking: bool = False):
+        self._collection = collection
+        self._latency = latency
+        self._blocking = blocking
+
+    def find(self, *args, **kwargs) -> _AsyncCursor:
+        return _AsyncCursor(self._collection.find(*args, **kwargs), self._latency, self._blocking)
+
+    async def aggregate(self, *args, **kwargs) -> _AsyncCursor:
+        return _AsyncCursor(self._collection.aggregate(*args, **kwargs), self._latency, self._blocking)
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self._collection, name)
+        if not callable(attr):
+            return attr
+
+        async def call(*args, **kwargs):
+            await _round_trip(self._latency, self._blocking)
+            return attr(*args, **kwargs)
+
+        return call
+
+
+class AsyncDatabaseShim:
+    """Wraps a synchronous database so `db[name]` returns AsyncCollectionShim objects."""
+
+    def __init__(self, database: Any, latency: float = 0.0, blocking: bool = False):
+        self._database = database
+        self.latency = latency
+        self.blocking = blocking
+
+    def __getitem__(self, name: str) -> AsyncCollectionShim:
+        return AsyncCollectionShim(self._database[name], self.latency, self.blocking)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._database, name)
+
+
+def _stream_unbounded_cursors(cursor_class: Any) -> None:
+    """
+    Makes mongomock cursors without skip/limit copy documents as they are iterated.
+
+    mongomock copies the whole result set on the first next(), where MongoDB streams
+    it in batches; that would charge the fake's memory to code that streams a cursor.
+    """
+    if getattr(cursor_class, "_streams", False):
+        return
+    materializing_next = cursor_class.__next__
+
+    def streaming_next(cursor: Any) -> Any:
+        if cursor._skip or cursor._limit or cursor.collection.codec_options.tz_aware:
+            return materializing_next(cursor)
+        if getattr(cursor, "_stream", None) is None or cursor._stream_factory is not cursor._factory:
+            cursor._stream, cursor._stream_factory = cursor._factory(), cursor._factory
+        document = next(cursor._stream)
+        cursor._emitted += 1
+        return document
+
+    cursor_class.__next__ = streaming_next
+    cursor_class._streams = True
+
+
+def use_mongomock(latency: float = 0.0) -> Any:
+    """
+    Points MongoEngine and the async repositories at one in-memory mongomock database.
+
+    Args:
+        latency: Simulated network round trip added to every async operation.
+
+    Returns:
+        The underlying (synchronous) mongomock database.
+    """
+    try:
+        import mongomock
+    except ImportError:
+        raise SystemExit("This benchmark needs mongomock: pip install mongomock")
+    from mongoengine import connect, disconnect_all, get_db
+    from mongomock.collection import Cursor
+    from mongomock.store import CollectionStore
+    from app.database.connection import set_async_db
+
+    # mongomock expires TTL-indexed documents on every read and ignores partialFilterExpression
+    # (it would drop every old logged-in turn); MongoDB's TTL monitor runs in the background instead
+    CollectionStore._remove_expired_documents = lambda self: None
+    _stream_unbounded_cursors(Cursor)
+    disconnect_all()
+    connect("bench", host="mongodb://localhost", mongo_client_class=mongomock.MongoClient, alias="default")
+    database = get_db()
+    set_async_db(AsyncDatabaseShim(database, latency))
+    return database
+
+
+@asynccontextmanager
+async def serve_app(app: Any, lifespan: str = "off") -> AsyncIterator[str]:
+    """
+    Serves an ASGI app with uvicorn on a free loopback port for the duration of the block.
+
+    Needed wherever response streaming matters: httpx's ASGITransport buffers the
+    whole body before returning it. The app's lifespan only runs with lifespan="on".
+
+    Yields:
+        The base URL of the running server.
+    """
+    import uvicorn
+
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+
+    config = uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", lifespan=lifespan)
+    server = uvicorn.Server(config)
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+    try:
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        server.should_exit = True
+        await task
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    """Nearest-rank percentile of `samples` (pct in 0..100)."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
@@ -0,0 +1,41 @@
+"""
+Gunicorn settings for production: `gunicorn main:app -c gunicorn.conf.py` (see Procfile).
+
+Everything comes from Settings (SERVER_* in app/core/config.py):
+- SERVER_WORKERS uvicorn worker processes, one per available CPU when 0. The
+  resolved count is written back into the settings before any worker starts,
+  so each worker sizes its share of the deployment-wide connection budgets
+  (see app/core/serving.py).
+- SERVER_PRELOAD_APP imports the app once in the master and forks the workers
+  from it. Nothing fork-unsafe is created on import: database clients, the
+  history writer and the model client preload start in each worker's lifespan,
+  thread pools and model clients on first use.
+- On SIGTERM a worker stops accepting connections and gives in-flight requests
+  (and the model calls they wait on) SERVER_REQUEST_DRAIN_SECONDS. Its lifespan
+  shutdown then waits SERVER_MODEL_DRAIN_SECONDS for background model calls,
+  flushes buffered history turns and closes the clients. Gunicorn kills workers
+  still running after SERVER_GRACEFUL_TIMEOUT_SECONDS.
+"""
+import os
+
+# Bundled with uvicorn (the standalone uvicorn-worker package is not a dependency)
+from uvicorn.workers import UvicornWorker
+
+from app.core.config import settings
+from app.core.serving import resolve_worker_count
+
+settings.SERVER_WORKERS = resolve_worker_count()
+
+
+class DrainingUvicornWorker(UvicornWorker):
+    """Uvicorn worker that stops waiting for in-flight requests in time for the lifespan shutdown to run."""
+
+    CONFIG_KWARGS = {**UvicornWorker.CONFIG_KWARGS, "timeout_graceful_shutdown": settings.SERVER_REQUEST_DRAIN_SECONDS}
+
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = settings.SERVER_WORKERS
+worker_class = DrainingUvicornWorker
+preload_app = settings.SERVER_PRELOAD_APP
+keepalive = settings.SERVER_KEEPALIVE_SECONDS
+graceful_timeout = settings.SERVER_GRACEFUL_TIMEOUT_SECONDS
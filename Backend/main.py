@@ -1,34 +1,60 @@
-import os
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from app.api.v1.chat_router import router as chat_router
 from app.api.v1.auth_router import router as auth_router 
 from app.api.v1.history_router import router as history_router 
-from app.database.connection import connect_db, close_db
+from app.database.connection import connect_db, close_db, close_async_db
+from app.database.history_writer import history_writer
+from app.agents import llm_clients, multimodal_agent
+from app.core.config import settings
+from app.core.http_metrics import MetricsMiddleware
+from app.core.rate_limit import ChatAdmissionMiddleware
+from app.core.metrics import registry, PROMETHEUS_CONTENT_TYPE
 from fastapi.middleware.cors import CORSMiddleware
 
+# --- Startup and Shutdown ---
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    connect_db()
+    await history_writer.start()
+    if settings.MODEL_CLIENT_PRELOAD:
+        # Not awaited: the worker serves requests while the Gemini SDK loads on a thread
+        asyncio.get_running_loop().run_in_executor(None, llm_clients.preload)
+    yield
+    # The server has stopped accepting connections and in-flight requests have finished
+    # (SERVER_REQUEST_DRAIN_SECONDS under gunicorn); background model calls may still run
+    await multimodal_agent.drain(settings.SERVER_MODEL_DRAIN_SECONDS)
+    await history_writer.close() # Flush buffered turns (or spill them) before the client goes away
+    await llm_clients.close()
+    await close_async_db()
+    close_db()
+
+
 app = FastAPI(
     title="Gemini Multimodal Agent Backend",
     description="FastAPI application using Gemini and MongoDB for history and auth.",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
 )
 
+# Added first so it sits inside CORS: shed requests (503) still carry the CORS headers
+app.add_middleware(ChatAdmissionMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=True,
     allow_methods=["*"],  # Allows all methods (POST, GET, etc.)
     allow_headers=["*"],  # Allows all headers (including Content-Type)
+    expose_headers=["X-Next-Cursor", "X-Prev-Cursor"],  # History pagination cursors
 )
 
-# --- Startup and Shutdown Events ---
-@app.on_event("startup")
-def startup_event():
-    connect_db()
+# Added last so it wraps everything else: timings include CORS and error handling
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
 
-@app.on_event("shutdown")
-def shutdown_event():
-    close_db()
-    
 # --- Include Routers ---
 app.include_router(chat_router, prefix="/api/v1")
 app.include_router(auth_router, prefix="/api/v1") 
@@ -38,5 +64,11 @@ app.include_router(history_router, prefix="/api/v1")
 async def read_root():
     return {"message": "Gemini Multimodal Agent Backend is running."}
 
+if settings.METRICS_ENABLED:
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics():
+        """Every metric of this process in the Prometheus text format."""
+        return PlainTextResponse(registry.render_prometheus(), media_type=PROMETHEUS_CONTENT_TYPE)
+
 # To Run locally: uvicorn main:app --reload --port 8001
-# For Render/production: uvicorn main:app --host 0.0.0.0 --port $PORT (uses PORT env var)
\ No newline at end of file
+# For Render/production: gunicorn main:app -c gunicorn.conf.py (uses PORT and the SERVER_* settings)
\ No newline at end of file